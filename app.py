@@ -1,121 +1,288 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import (Flask, render_template, request, jsonify, send_from_directory, make_response, g, Response,
+                   stream_with_context)
 from config.config import Config
-import logging
-from logging.handlers import RotatingFileHandler
 import os
-from werkzeug.utils import secure_filename
+import atexit
+import hmac
 import time
-from utils.csv_parser import parse_emoji_csv, CSVValidationError
+import hashlib
 from utils.build_manager import BuildManager
-from utils.color_utils import color_distance
-from PIL import Image
+from utils.color_utils import color_distance, unique_colors
+from utils.sampler import sample_cells, request_draft
+from utils.animation import is_animated, iter_frames, IncrementalGrid
+from utils.palette import PaletteManager, PaletteRegistry, PaletteUnavailableError
+from utils.startup import StartupTimer
+from utils.log_config import configure_logging
+from utils.metrics import REGISTRY, server_timing_header
+from utils.profiling import RequestProfiler
+from utils.upload_stream import StreamingUploadRequest, UnsupportedImageError
+from utils.upload_store import UploadStore, InvalidUploadError, image_size
+from utils.storage_manager import StorageManager
+from utils.admission import AdmissionController, AdmissionError, estimate_cost
+from utils.lanes import HeavyLane
+from utils.mosaics import MosaicStore
+from utils.text_export import encode_rows
+from functools import wraps
+from contextlib import ExitStack
+from io import BytesIO
+import numpy as np
 from typing import List, Dict
 import re
 
 def create_app():
     """Application factory function."""
+    startup = StartupTimer()
     app = Flask(__name__)
     app.config.from_object(Config)
+    app.request_class = StreamingUploadRequest
 
-    # Global variable to store emoji data
+    # Versioned palette snapshots; app.emoji_db mirrors the current entries of the default palette.
+    # Named palettes live next to it in app.palettes and are built on first use
+    app.palette_manager = PaletteManager()
+    app.palettes = PaletteRegistry(default=app.palette_manager)
     app.emoji_db = []
 
     # Configure upload settings
     UPLOAD_FOLDER = 'uploads'
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+    ALLOWED_IMAGE_TYPES = {'png', 'jpeg'}
     MAX_CONTENT_LENGTH = 10 * 1024 * 1024  # 10MB limit
 
     app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
     app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
+    # /upload stops receiving a body as soon as its first bytes are not PNG or JPEG
+    app.config['UPLOAD_SNIFFED_ENDPOINTS'] = {'upload_file': ALLOWED_IMAGE_TYPES}
 
     # Ensure upload directory exists
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    app.upload_store = UploadStore(app.config['UPLOAD_FOLDER'])
+    app.storage_manager = StorageManager(app.upload_store)
+    app.mosaic_store = MosaicStore(app.config['UPLOAD_FOLDER'])
+    app.admission = AdmissionController()
+    app.heavy_lane = HeavyLane()
 
     # Configure logging
     if not app.debug:
-        if not os.path.exists('logs'):
-            os.mkdir('logs')
-        file_handler = RotatingFileHandler('logs/emojiart.log', maxBytes=10240, backupCount=10)
-        file_handler.setFormatter(logging.Formatter(
-            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-        ))
-        file_handler.setLevel(logging.INFO)
-        app.logger.addHandler(file_handler)
-        app.logger.setLevel(logging.INFO)
+        # Records are queued and written by a background thread, off the request path
+        log_writer = configure_logging(app)
+        atexit.register(log_writer.stop)
         app.logger.info('EmojiArt startup')
 
     def allowed_file(filename):
         return '.' in filename and \
                filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+    def on_palette_swap(palette):
+        app.emoji_db = list(palette.entries)
+        REGISTRY.set_gauge('emojiart_palette_entries', len(palette))
+        REGISTRY.set_gauge('emojiart_palette_version', palette.version)
+
     def load_emoji_data():
-        """Load emoji data from CSV file."""
-        try:
-            app.logger.info(f"Loading emoji data from {Config.EMOJI_CSV_PATH}")
-            app.emoji_db = parse_emoji_csv()
-            app.logger.info(f"Successfully loaded {len(app.emoji_db)} emoji entries")
-        except (FileNotFoundError, CSVValidationError) as e:
-            app.logger.error(f"Failed to load emoji data: {str(e)}")
-            app.emoji_db = []  # Initialize with empty list on error
-        except Exception as e:
-            app.logger.error(f"Unexpected error loading emoji data: {str(e)}")
-            app.emoji_db = []
+        """Load emoji data from CSV file and start watching it for changes."""
+        app.logger.info('Loading emoji data', extra={'path': app.palette_manager.csv_path})
+        app.palette_manager.add_listener(on_palette_swap)
+        if app.palette_manager.reload(force=True):
+            app.logger.info('Successfully loaded emoji entries', extra={'entries': len(app.emoji_db)})
+        else:
+            app.logger.error("Failed to load emoji data")
+
+    @app.before_request
+    def ensure_background_threads():
+        # Started lazily so a preloading gunicorn master never forks with live threads
+        app.palettes.start()
+        app.storage_manager.start()
+        REGISTRY.start()
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.get('request_started')
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        endpoint = request.endpoint or 'unknown'
+        REGISTRY.observe('emojiart_request_seconds', elapsed, endpoint=endpoint)
+        REGISTRY.inc('emojiart_requests_total', endpoint=endpoint, status=response.status_code)
+        response.headers['Server-Timing'] = server_timing_header(g.get('server_timing', []) + [('total', elapsed)])
+        return response
+
+    def is_admin_request():
+        token = app.config.get('ADMIN_TOKEN')
+        supplied = request.headers.get('X-Admin-Token', '')
+        return bool(token) and hmac.compare_digest(supplied.encode(), token.encode())
+
+    def admin_only(view):
+        """Hide a route unless ADMIN_TOKEN is configured and require it in X-Admin-Token."""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not app.config.get('ADMIN_TOKEN'):
+                return jsonify({'status': 'error', 'message': 'Not found'}), 404
+            if not is_admin_request():
+                return jsonify({'status': 'error', 'message': 'Forbidden'}), 403
+            return view(*args, **kwargs)
+        return wrapper
+
+    # Profiling hooks are only registered when enabled, so they cost nothing otherwise
+    app.profiler = None
+    if app.config['PROFILING_ENABLED']:
+        app.profiler = RequestProfiler(app.config['PROFILE_DIR'], app.config['PROFILING_SAMPLE_RATE'],
+                                       app.config['PROFILE_KEEP'])
+
+        @app.before_request
+        def start_profile():
+            requested = request.headers.get('X-Profile') and is_admin_request()
+            if requested or app.profiler.should_sample():
+                g.profile = app.profiler.begin()
+
+        @app.after_request
+        def save_profile(response):
+            profile = g.pop('profile', None)
+            if profile is not None:
+                params = {k: v for k, v in request.values.items()}
+                name = app.profiler.end(profile, {
+                    'endpoint': request.endpoint,
+                    'method': request.method,
+                    'path': request.path,
+                    'params': params,
+                    'status': response.status_code,
+                    'duration_ms': round((time.perf_counter() - g.request_started) * 1000, 2),
+                })
+                if name:
+                    response.headers['X-Profile-Name'] = name
+            return response
+
+        @app.teardown_request
+        def discard_profile(exc):
+            # after_request is skipped on unhandled errors; never leave the profiler running
+            profile = g.pop('profile', None)
+            if profile is not None:
+                app.profiler.end(profile, {'endpoint': request.endpoint, 'path': request.path,
+                                           'error': str(exc)})
+
+    # Rendered homepage for the current build: (build key, html, etag)
+    app.homepage_cache = (None, None, None)
 
     @app.route('/')
     def index():
-        build_info = BuildManager.get_build_info()
-        app.logger.info('Homepage accessed')
-        app.logger.info(f'Build info: {build_info}')
-        return render_template('index.html', build_info=build_info, default_width=Config.DEFAULT_WIDTH)
+        key, build_info = BuildManager.get_build()
+        app.logger.info('Homepage accessed', extra={'route': 'index', 'build_number': build_info.get('build_number')})
+
+        cached_key, html, etag = app.homepage_cache
+        if cached_key != key:
+            html = render_template('index.html', build_info=build_info, default_width=Config.DEFAULT_WIDTH)
+            etag = hashlib.sha1(html.encode('utf-8')).hexdigest()
+            app.homepage_cache = (key, html, etag)
+
+        response = make_response(html)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
 
     @app.route('/upload', methods=['POST'])
     def upload_file():
-        if 'file' not in request.files:
-            app.logger.warning('No file part in request')
+        try:
+            files = request.files
+        except UnsupportedImageError:
+            app.logger.warning('File content is not a supported image', extra={'route': 'upload'})
+            return jsonify({'error': 'Invalid file type. Allowed types: png, jpg, jpeg'}), 400
+
+        if 'file' not in files:
+            app.logger.warning('No file part in request', extra={'route': 'upload'})
             return jsonify({'error': 'No file part'}), 400
         
-        file = request.files['file']
+        file = files['file']
         if file.filename == '':
-            app.logger.warning('No selected file')
+            app.logger.warning('No selected file', extra={'route': 'upload'})
             return jsonify({'error': 'No selected file'}), 400
         
         if not allowed_file(file.filename):
-            app.logger.warning(f'Invalid file type: {file.filename}')
+            app.logger.warning('Invalid file type', extra={'route': 'upload', 'upload_name': file.filename})
             return jsonify({'error': 'Invalid file type. Allowed types: png, jpg, jpeg'}), 400
         
+        # Uploads shorter than the sniffed prefix are only checked here, once fully received
+        if file.stream.kind not in ALLOWED_IMAGE_TYPES:
+            app.logger.warning('File content is not a supported image', extra={'route': 'upload', 'upload_name': file.filename})
+            return jsonify({'error': 'Invalid file type. Allowed types: png, jpg, jpeg'}), 400
+
         try:
             if file and allowed_file(file.filename):
-                # Secure the filename and add timestamp
-                filename = secure_filename(file.filename)
-                timestamp = str(int(time.time()))
-                filename = f"{timestamp}_{filename}"
-                
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(file_path)
-                
-                app.logger.info(f'File uploaded successfully: {filename}')
+                # Decoding and downscaling a new upload is heavy work, admitted and queued like a conversion
+                width, height = image_size(file.stream)
+                cost = estimate_cost(0, 0, width * height)
+
+                def store():
+                    # Stored under its content hash, so re-uploads of the same image are detected
+                    return app.upload_store.put(file.stream, file.stream.hexdigest(), file.stream.kind)
+
+                with app.admission.admit(cost):
+                    upload_id, duplicate = app.heavy_lane.run(store)
+                filename = os.path.basename(app.upload_store.original_path(upload_id, file.stream.kind))
+
+                app.logger.info('File uploaded successfully', extra={
+                    'route': 'upload', 'upload_id': upload_id, 'duplicate': duplicate, 'size': file.stream.size
+                })
                 return jsonify({
                     'message': 'File uploaded successfully',
-                    'filename': filename
+                    'filename': filename,
+                    'upload_id': upload_id,
+                    'duplicate': duplicate,
+                    'sha256': file.stream.hexdigest(),
+                    'size': file.stream.size
                 }), 200
-                
+
+        except AdmissionError as e:
+            return refused(e, 'upload')
+        except InvalidUploadError as e:
+            app.logger.warning('Rejected upload: %s', e, extra={'route': 'upload', 'upload_name': file.filename})
+            return jsonify({'error': 'Invalid image file'}), 400
         except Exception as e:
-            app.logger.error(f'Error uploading file: {str(e)}')
+            app.logger.error('Error uploading file: %s', e, extra={'route': 'upload'})
             return jsonify({'error': 'Error uploading file'}), 500
 
+    def select_palette(args):
+        """
+        The palette a request asks for: the one named by 'palette', restricted by the
+        comma-separated emoji and category names in 'include' and 'exclude'.
+        Raises ValueError for unknown names.
+        """
+        def items(field):
+            return [item.strip() for item in args.get(field, '').split(',') if item.strip()]
+
+        palette = app.palettes.get(args.get('palette'))
+        return app.palettes.select(palette, items('include'), items('exclude'))
+
+    def invalid_palette(e):
+        # A configured palette whose file is missing or broken is the server's fault, not the request's
+        return jsonify({
+            'status': 'error',
+            'message': str(e),
+            'palettes': app.palettes.names()
+        }), 503 if isinstance(e, PaletteUnavailableError) else 400
+
     @app.route('/emojis', methods=['GET'])
     def get_emojis():
-        """Return the list of loaded emojis."""
-        return jsonify(app.emoji_db)
+        """Return the list of loaded emojis (of the palette named by 'palette', if given)."""
+        try:
+            palette = app.palettes.get(request.args.get('palette'))
+        except (ValueError, PaletteUnavailableError) as e:
+            return invalid_palette(e)
+        return jsonify(list(palette.entries))
 
     @app.route('/get-emojis')
     def get_emojis_filtered():
         """Get emojis based on name and color filters."""
         name = request.args.get('name', '')
         color = request.args.get('color', '')
+        try:
+            palette = app.palettes.get(request.args.get('palette'))
+        except (ValueError, PaletteUnavailableError) as e:
+            return invalid_palette(e)
 
         try:
-            filtered_emojis = app.emoji_db
+            filtered_emojis = list(palette.entries)
             if name:
                 filtered_emojis = [e for e in filtered_emojis if name.lower() in e['Emoji'].lower()]
             if color:
@@ -131,7 +298,7 @@ def create_app():
                 'data': filtered_emojis
             })
         except Exception as e:
-            app.logger.error(f'Error processing request: {str(e)}')
+            app.logger.error('Error processing request: %s', e, extra={'route': 'get_emojis'})
             return jsonify({
                 'status': 'error',
                 'message': 'Internal server error'
@@ -142,96 +309,241 @@ def create_app():
         try:
             if ':' in ratio_str:
                 width, height = map(float, ratio_str.split(':'))
-                return width / height
-            return float(ratio_str)
+                ratio = width / height
+            else:
+                ratio = float(ratio_str)
         except (ValueError, ZeroDivisionError):
+            ratio = None
+        if ratio is None or not 0 < ratio < float('inf'):
             raise ValueError('Invalid aspect ratio format. Use width:height (e.g., 16:9) or decimal (e.g., 1.78)')
+        return ratio
 
-    def process_image_to_grid(image, grid_size, aspect_ratio_str):
-        """Process the image and return a grid of emoji data."""
+    def resolve_aspect_ratio(ratio_str):
+        """Parse the requested aspect ratio, falling back to 1:1 if it is invalid."""
         try:
-            # Parse aspect ratio
-            try:
-                aspect_ratio = parse_aspect_ratio(aspect_ratio_str)
-            except ValueError:
-                app.logger.warning(f'Invalid aspect ratio {aspect_ratio_str}, using 1:1')
-                aspect_ratio = 1.0
-
-            # Resize image to grid size while maintaining aspect ratio
-            width, height = image.size
-            if width / height > aspect_ratio:
-                new_width = int(height * aspect_ratio)
-                new_height = height
-            else:
-                new_width = width
-                new_height = int(width / aspect_ratio)
-            
-            image = image.resize((grid_size, int(grid_size / aspect_ratio)))
-            
-            # Convert to RGB if necessary
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # Create grid
-            grid = []
-            for y in range(image.height):
-                row = []
-                for x in range(image.width):
-                    # Get pixel color
-                    r, g, b = image.getpixel((x, y))
-                    pixel_color = f"#{r:02x}{g:02x}{b:02x}"
-                    
-                    # Find closest emoji
-                    closest_emoji = None
-                    min_distance = float('inf')
-                    
-                    for emoji_data in app.emoji_db:
-                        emoji_color = emoji_data['Hex Color']
-                        distance = color_distance(pixel_color, emoji_color)
-                        
-                        if distance < min_distance:
-                            min_distance = distance
-                            closest_emoji = emoji_data
-                    
-                    if closest_emoji:
-                        row.append({
-                            'emoji': closest_emoji['Emoji'],
-                            'color': closest_emoji['Hex Color']
-                        })
-                    else:
-                        # Fallback emoji if no match found
-                        row.append({
-                            'emoji': '⬜',
-                            'color': '#FFFFFF'
-                        })
-                
-                grid.append(row)
-            
-            return grid
+            return parse_aspect_ratio(ratio_str)
+        except ValueError:
+            app.logger.warning('Invalid aspect ratio, using 1:1', extra={'aspect_ratio': ratio_str})
+            return 1.0
+
+    def grid_rows(grid_size, aspect_ratio):
+        """Number of grid rows for a grid grid_size cells wide."""
+        return max(1, int(grid_size / aspect_ratio))
+
+    def palette_cells(palette):
+        """Emoji and color of each palette entry, by index, for building responses."""
+        if not len(palette):
+            # Fallback emoji if no palette is loaded
+            return [{'emoji': '⬜', 'color': '#FFFFFF'}]
+        return [{'emoji': e['Emoji'], 'color': e['Hex Color']} for e in palette.entries]
+
+    def match_grid(image, grid_size, aspect_ratio, palette, engine='cie76', quantize_bits=0, linear=False):
+        """
+        Sample the image and return a (rows, cols) array of palette indices, one per cell.
+        The image is center-cropped to aspect_ratio and each cell takes the average color of its
+        area (in linear light if linear is set).
+        engine selects the color distance: 'cie76', 'cie94', 'ciede2000' or 'hsv'.
+        quantize_bits drops low bits of each channel before matching, trading color accuracy
+        for fewer distinct colors to match.
+        """
+        with REGISTRY.timer('sample'):
+            pixels = sample_cells(image, grid_size, grid_rows(grid_size, aspect_ratio), aspect_ratio, linear)
+
+        if not len(palette):
+            # Every cell gets palette_cells' fallback emoji
+            return np.zeros(pixels.shape[:2], dtype=np.intp)
+
+        # Only distinct colors are matched; flat regions and graphics repeat a handful of colors
+        with REGISTRY.timer('dedup'):
+            colors, inverse = unique_colors(pixels, quantize_bits)
+
+        # Find closest emoji for every distinct color in one pass, then scatter back to the grid
+        with REGISTRY.timer('match'):
+            indices = palette.nearest_indices(colors, engine)[inverse].reshape(pixels.shape[:2])
+        REGISTRY.inc('emojiart_cells_matched_total', indices.size)
+        REGISTRY.inc('emojiart_colors_matched_total', len(colors))
+        return indices
+
+    def assemble_grid(indices, palette):
+        """Turn a grid of palette indices into rows of emoji data for the JSON response."""
+        with REGISTRY.timer('assemble'):
+            cells = palette_cells(palette)
+            return [[cells[i] for i in row] for row in indices.tolist()]
+
+    def process_image_to_grid(image, grid_size, aspect_ratio, palette, engine='cie76', quantize_bits=0,
+                              linear=False):
+        """
+        Process the image and return a grid of emoji data matched against the given palette snapshot.
+        Takes the same arguments as match_grid.
+        """
+        try:
+            indices = match_grid(image, grid_size, aspect_ratio, palette, engine, quantize_bits, linear)
+            return assemble_grid(indices, palette)
             
         except Exception as e:
-            app.logger.error(f"Error processing image: {str(e)}")
+            app.logger.error('Error processing image: %s', e)
             raise
 
+    def progressive_levels(grid_size, engine):
+        """
+        (grid_size, engine) steps from a small preview with the fastest engine
+        up to the requested grid and engine.
+        """
+        preview = min(grid_size, app.config['PROGRESSIVE_PREVIEW_GRID'])
+        levels = [(preview, 'cie76'), (grid_size, 'cie76'), (grid_size, engine)]
+        return [level for i, level in enumerate(levels) if level not in levels[:i]]
+
+    # Seconds per unit of estimated cost, as measured by the last progressive level that ran
+    match_speed = {'seconds_per_cost': None}
+
+    def process_image_progressive(image, grid_size, aspect_ratio, palette, deadline, engine='cie76',
+                                  quantize_bits=0, linear=False):
+        """
+        Coarse-to-fine conversion against a deadline (a time.perf_counter() value).
+        Each step runs the finest remaining level predicted, at the measured speed, to finish
+        before the deadline, so when the requested grid and engine fit they run straight away.
+        The preview runs first when no level is predicted to fit or no speed is known yet.
+        Returns (indices, final) with the match_grid result of the last level that ran, final
+        being whether the requested grid and engine were reached.
+        """
+        levels = progressive_levels(grid_size, engine)
+        costs = [estimate_cost(size * grid_rows(size, aspect_ratio), len(palette), image.width * image.height,
+                               level_engine)
+                 for size, level_engine in levels]
+        indices = None
+        position = 0
+        while position < len(levels):
+            seconds_per_cost = match_speed['seconds_per_cost']
+            fitting = [i for i in range(position, len(levels)) if seconds_per_cost is not None
+                       and time.perf_counter() + costs[i] * seconds_per_cost <= deadline]
+            if fitting:
+                chosen = fitting[-1]
+            elif indices is None:
+                chosen = 0
+            else:
+                break
+            size, level_engine = levels[chosen]
+            started = time.perf_counter()
+            indices = match_grid(image, size, aspect_ratio, palette, level_engine, quantize_bits, linear)
+            match_speed['seconds_per_cost'] = (time.perf_counter() - started) / costs[chosen]
+            position = chosen + 1
+        final = position == len(levels)
+        REGISTRY.inc('emojiart_progressive_results_total', final=str(final).lower())
+        return indices, final
+
+    def stream_animation(image, grid_size, aspect_ratio, palette, engine, quantize_bits, linear, threshold):
+        """
+        Convert an animated image as NDJSON: a header line, the first frame's full grid,
+        then for each later frame only the cells whose emoji changed, and an end line.
+        Frames are decoded, sampled and matched one at a time on the heavy lane.
+        """
+        rows = grid_rows(grid_size, aspect_ratio)
+        cells = palette_cells(palette)
+        if len(palette):
+            match = lambda colors: palette.nearest_indices(colors, engine)
+        else:
+            match = lambda colors: np.zeros(len(colors), dtype=np.intp)
+        grid = IncrementalGrid(match, threshold, quantize_bits)
+        frames = iter_frames(image)
+        totals = {'frames': 0, 'cells_matched': 0}
+
+        def line(payload):
+            return app.json.dumps(payload) + '\n'
+
+        def step():
+            item = next(frames, None)
+            if item is None:
+                return None
+            index, duration, frame = item
+            started = time.perf_counter()
+            changed, matched = grid.update(sample_cells(frame, grid_size, rows, aspect_ratio, linear))
+            REGISTRY.observe('emojiart_stage_seconds', time.perf_counter() - started, stage='frame')
+            REGISTRY.inc('emojiart_cells_matched_total', matched)
+            totals['frames'] += 1
+            totals['cells_matched'] += matched
+            payload = {'type': 'frame', 'index': index, 'duration': duration}
+            if index == 0:
+                payload['grid'] = [[cells[i] for i in row] for row in grid.indices.tolist()]
+            else:
+                payload['changes'] = [[r, c, cells[i]['emoji'], cells[i]['color']]
+                                      for (r, c), i in zip(changed.tolist(), grid.indices[tuple(changed.T)].tolist())]
+            return line(payload)
+
+        # The first frame is converted before responding, so a full lane still gets a 429
+        first = app.heavy_lane.run(step)
+
+        def generate():
+            yield line({'type': 'header', 'width': grid_size, 'height': rows,
+                        'frames': getattr(image, 'n_frames', 1), 'loop': image.info.get('loop')})
+            yield first
+            try:
+                while True:
+                    # Later frames queue for the lane like any other job rather than fail mid-stream
+                    chunk = app.heavy_lane.run(step, wait=None)
+                    if chunk is None:
+                        break
+                    yield chunk
+            except Exception as e:
+                app.logger.error('Error processing animation: %s', e, extra={'route': 'process_image'})
+                yield line({'type': 'error', 'message': 'Error processing image'})
+                return
+            yield line({'type': 'end', **totals})
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    def refused(e, route):
+        """Error response for a request turned away by admission control or the heavy lane."""
+        app.logger.warning('Heavy request refused: %s', e, extra={'route': route, 'cost': e.cost})
+        response = jsonify({
+            'status': 'error',
+            'message': str(e)
+        })
+        response.status_code = e.status_code
+        if e.retry_after is not None:
+            response.headers['Retry-After'] = str(e.retry_after)
+        return response
+
     @app.route('/process-image', methods=['POST'])
     def process_image():
-        """Process uploaded image and convert to emoji art."""
-        if 'image' not in request.files:
+        """
+        Process an image and convert to emoji art.
+        The image is either sent as the 'image' file or referenced by the
+        'uploadId' returned from /upload, which skips re-sending and re-decoding it.
+        With format=text the result is streamed as plain text, one line per grid row.
+        """
+        file = None
+        upload_id = request.form.get('uploadId', '')
+        if 'image' in request.files:
+            file = request.files['image']
+            if file.filename == '':
+                return jsonify({
+                    'status': 'error',
+                    'message': 'No selected file'
+                }), 400
+        elif upload_id:
+            if not app.upload_store.is_valid_id(upload_id):
+                return jsonify({
+                    'status': 'error',
+                    'message': 'Invalid upload id'
+                }), 400
+        else:
             return jsonify({
                 'status': 'error',
                 'message': 'No image file provided'
             }), 400
 
-        file = request.files['image']
-        if file.filename == '':
-            return jsonify({
-                'status': 'error',
-                'message': 'No selected file'
-            }), 400
-
         # Validate required parameters
         grid_size = request.form.get('gridSize')
         aspect_ratio = request.form.get('aspectRatio')
+        engine = request.form.get('engine', 'cie76')
+        quantize_bits = request.form.get('quantize', app.config['MATCH_QUANTIZE_BITS'])
+        linear = request.form.get('linear', str(app.config['SAMPLE_LINEAR_LIGHT'])).lower() in ('1', 'true', 'yes')
+        animate = request.form.get('animate', '').lower() in ('1', 'true', 'yes')
+        threshold = request.form.get('frameThreshold', app.config['ANIMATION_CHANGE_THRESHOLD'])
+        deadline_ms = request.form.get('deadlineMs')
+        mosaic = request.form.get('mosaic', '').lower() in ('1', 'true', 'yes')
+        output = request.form.get('format', 'json')
+        rle = request.form.get('rle', '').lower() in ('1', 'true', 'yes')
         
         if not grid_size:
             return jsonify({
@@ -259,37 +571,334 @@ def create_app():
             }), 400
 
         try:
-            # Process the image
-            image = Image.open(file)
-            processed_grid = process_image_to_grid(image, grid_size, aspect_ratio)
-            
+            threshold = int(threshold)
+            if not 0 <= threshold <= 255:
+                raise ValueError
+        except ValueError:
             return jsonify({
-                'status': 'success',
-                'grid': processed_grid
-            })
+                'status': 'error',
+                'message': 'frameThreshold must be an integer from 0 to 255'
+            }), 400
+
+        try:
+            # Built on first use; afterwards a snapshot and cached mask lookup
+            palette = select_palette(request.form)
+        except (ValueError, PaletteUnavailableError) as e:
+            return invalid_palette(e)
+
+        if output not in ('json', 'text'):
+            return jsonify({
+                'status': 'error',
+                'message': "format must be 'json' or 'text'"
+            }), 400
+
+        # Animations always stream NDJSON, which none of these options apply to
+        conflicting = [name for name, given in [('format=text', output == 'text'), ('mosaic', mosaic),
+                                                ('deadlineMs', deadline_ms is not None)] if given]
+        if animate and conflicting:
+            return jsonify({
+                'status': 'error',
+                'message': f"animate can't be combined with {', '.join(conflicting)}"
+            }), 400
+
+        if deadline_ms is not None:
+            try:
+                deadline_ms = int(deadline_ms)
+                if deadline_ms <= 0:
+                    raise ValueError
+            except ValueError:
+                return jsonify({
+                    'status': 'error',
+                    'message': 'deadlineMs must be a positive integer'
+                }), 400
+
+        try:
+            quantize_bits = int(quantize_bits)
+            if not 0 <= quantize_bits < 8:
+                raise ValueError
+        except ValueError:
+            return jsonify({
+                'status': 'error',
+                'message': 'quantize must be an integer from 0 to 7'
+            }), 400
+
+        try:
+            # Deferred so processes that never convert images don't pay for the import
+            from PIL import Image
+
+            if file is None:
+                with REGISTRY.timer('decode'):
+                    pixels = app.upload_store.load_normalized(upload_id)
+                    if pixels is None:
+                        return jsonify({
+                            'status': 'error',
+                            'message': 'Upload not found'
+                        }), 404
+                    image = Image.fromarray(np.asarray(pixels))
+            else:
+                # Process the image straight from the spooled upload.
+                # Only the header is read here; pixels are decoded once the request is admitted.
+                app.logger.debug('Processing image', extra={
+                    'route': 'process_image', 'sha256': file.stream.hexdigest(), 'size': file.stream.size
+                })
+                image = Image.open(file.stream)
+
+            ratio = resolve_aspect_ratio(aspect_ratio)
+
+            if animate and is_animated(image):
+                # Budgeted as if every cell of every frame were matched
+                frames = image.n_frames
+                cost = estimate_cost(grid_size * grid_rows(grid_size, ratio) * frames, len(palette),
+                                     image.width * image.height * frames, engine)
+                stack = ExitStack()
+                stack.enter_context(app.admission.admit(cost))
+                if file is not None:
+                    # Request teardown closes uploaded files before the stream is consumed,
+                    # so the stream takes over the spooled upload and closes it itself
+                    stack.callback(file.stream.close)
+                    file.stream = BytesIO()
+                try:
+                    response = stream_animation(image, grid_size, ratio, palette, engine, quantize_bits, linear,
+                                                threshold)
+                except BaseException:
+                    stack.close()
+                    raise
+                # Held until the stream finishes or the client goes away
+                response.call_on_close(stack.close)
+                return response
+
+            if mosaic:
+                # Stored mosaics are only sampled here; tiles are matched when they are fetched
+                if grid_size * grid_rows(grid_size, ratio) > app.config['MOSAIC_MAX_CELLS']:
+                    return jsonify({
+                        'status': 'error',
+                        'message': f"Mosaic too large: at most {app.config['MOSAIC_MAX_CELLS']} cells"
+                    }), 413
+                cost = estimate_cost(0, len(palette), image.width * image.height, engine)
+            else:
+                # A request with a deadline may run every level of the coarse-to-fine ladder
+                levels = [(grid_size, engine)] if deadline_ms is None else progressive_levels(grid_size, engine)
+                cost = sum(estimate_cost(size * grid_rows(size, ratio), len(palette), image.width * image.height,
+                                         level_engine)
+                           for size, level_engine in levels)
+
+            def convert():
+                if file is not None:
+                    with REGISTRY.timer('decode'):
+                        # JPEGs can decode straight to a smaller scale when the grid is coarse
+                        request_draft(image, grid_size, grid_rows(grid_size, ratio), ratio)
+                        image.load()
+                if mosaic:
+                    rows = grid_rows(grid_size, ratio)
+                    with REGISTRY.timer('sample'):
+                        pixels = sample_cells(image, grid_size, rows, ratio, linear)
+                    result = {
+                        'status': 'success',
+                        'mosaic': app.mosaic_store.put(pixels),
+                        'width': grid_size,
+                        'height': rows,
+                        'tileSize': app.mosaic_store.tile_size
+                    }
+                elif output == 'json' and deadline_ms is None:
+                    processed_grid = process_image_to_grid(image, grid_size, ratio, palette, engine,
+                                                           quantize_bits, linear)
+                    result = {'status': 'success', 'grid': processed_grid}
+                else:
+                    final = None
+                    if deadline_ms is None:
+                        indices = match_grid(image, grid_size, ratio, palette, engine, quantize_bits, linear)
+                    else:
+                        # The deadline runs from when the request arrived, queueing and decoding included
+                        deadline = g.get('request_started', time.perf_counter()) + deadline_ms / 1000
+                        indices, final = process_image_progressive(image, grid_size, ratio, palette, deadline,
+                                                                   engine, quantize_bits, linear)
+                    if output == 'text':
+                        # Rows are encoded as the response is sent, skipping the JSON grid altogether
+                        emojis = [cell['emoji'] for cell in palette_cells(palette)]
+                        response = Response(encode_rows(indices, emojis, rle), mimetype='text/plain')
+                        if final is not None:
+                            response.headers['X-Emoji-Art-Final'] = 'true' if final else 'false'
+                        return response
+                    result = {'status': 'success', 'grid': assemble_grid(indices, palette), 'final': final}
+
+                with REGISTRY.timer('encode'):
+                    return jsonify(result)
+
+            with app.admission.admit(cost):
+                # A profiled request runs on its own thread, where the profiler can see it
+                return app.heavy_lane.run(convert, inline=g.get('profile') is not None)
+        except AdmissionError as e:
+            return refused(e, 'process_image')
         except ValueError as e:
-            app.logger.error(f'Error processing image: {str(e)}')
+            app.logger.error('Error processing image: %s', e, extra={'route': 'process_image'})
             return jsonify({
                 'status': 'error',
                 'message': str(e)
             }), 400
         except Exception as e:
-            app.logger.error(f'Error processing image: {str(e)}')
+            app.logger.error('Error processing image: %s', e, extra={'route': 'process_image'})
             return jsonify({
                 'status': 'error',
                 'message': 'Error processing image'
             }), 500
 
+    @app.route('/mosaics/<mosaic_id>')
+    def mosaic_window(mosaic_id):
+        """
+        Return the window of a stored mosaic starting at cell (x, y), w cells wide and h high.
+        Only the tiles the window overlaps are matched, and matched tiles are cached.
+        """
+        if not app.mosaic_store.is_valid_id(mosaic_id):
+            return jsonify({
+                'status': 'error',
+                'message': 'Invalid mosaic id'
+            }), 400
+
+        tile_size = app.mosaic_store.tile_size
+        engine = request.args.get('engine', 'cie76')
+        try:
+            x = int(request.args.get('x', 0))
+            y = int(request.args.get('y', 0))
+            width = int(request.args.get('w', tile_size))
+            height = int(request.args.get('h', tile_size))
+            quantize_bits = int(request.args.get('quantize', app.config['MATCH_QUANTIZE_BITS']))
+            if x < 0 or y < 0 or width <= 0 or height <= 0 or not 0 <= quantize_bits < 8:
+                raise ValueError
+        except ValueError:
+            return jsonify({
+                'status': 'error',
+                'message': 'x and y must be non-negative integers, w and h positive integers, quantize 0 to 7'
+            }), 400
+        if width * height > app.config['MOSAIC_MAX_WINDOW']:
+            return jsonify({
+                'status': 'error',
+                'message': f"Window too large: at most {app.config['MOSAIC_MAX_WINDOW']} cells"
+            }), 400
+
+        try:
+            palette = select_palette(request.args)
+        except (ValueError, PaletteUnavailableError) as e:
+            return invalid_palette(e)
+
+        try:
+            cost = estimate_cost(width * height, len(palette), 0, engine)
+
+            def window():
+                return app.mosaic_store.window(mosaic_id, x, y, width, height, palette, engine, quantize_bits)
+
+            with app.admission.admit(cost):
+                indices = app.heavy_lane.run(window)
+        except AdmissionError as e:
+            return refused(e, 'mosaic_window')
+        except ValueError as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 400
+
+        if indices is None:
+            return jsonify({
+                'status': 'error',
+                'message': 'Mosaic not found'
+            }), 404
+
+        cells = palette_cells(palette)
+        with REGISTRY.timer('encode'):
+            return jsonify({
+                'status': 'success',
+                'x': x,
+                'y': y,
+                'width': indices.shape[1],
+                'height': indices.shape[0],
+                'grid': [[cells[i] for i in row] for row in indices.tolist()]
+            })
+
     @app.route('/data/emoji_data.csv')
     def serve_emoji_data():
         try:
             return send_from_directory(os.path.join(os.path.dirname(__file__), 'data'), 'emoji_data.csv', mimetype='text/csv')
         except Exception as e:
-            app.logger.error(f'Error serving emoji data: {str(e)}')
+            app.logger.error('Error serving emoji data: %s', e)
             return jsonify({'error': 'Error serving emoji data'}), 500
 
+    @app.route('/admin/reload-palette', methods=['POST'])
+    @admin_only
+    def reload_palette():
+        """Trigger a background rebuild of every loaded palette; new snapshots are swapped in when ready."""
+        app.palettes.request_reload()
+        return jsonify({
+            'status': 'accepted',
+            'version': app.palette_manager.current.version
+        }), 202
+
+    @app.route('/admin/storage')
+    @admin_only
+    def storage_stats():
+        """Report upload storage usage and eviction counters from the last sweep."""
+        return jsonify({
+            'status': 'success',
+            'quota_bytes': app.storage_manager.quota_bytes,
+            'ttl_seconds': app.storage_manager.ttl_seconds,
+            'storage': app.storage_manager.stats()
+        })
+
+    @app.route('/admin/profiles')
+    @admin_only
+    def list_profiles():
+        """List recent request profiles with their hottest functions."""
+        if app.profiler is None:
+            return jsonify({'status': 'error', 'message': 'Profiling is disabled'}), 404
+        limit = request.args.get('limit', 20, type=int)
+        return jsonify({'status': 'success', 'profiles': app.profiler.recent(limit=limit)})
+
+    @app.route('/admin/profiles/<name>')
+    @admin_only
+    def download_profile(name):
+        """Download a saved .prof file for offline analysis."""
+        path = app.profiler.path_for(name) if app.profiler else None
+        if path is None:
+            return jsonify({'status': 'error', 'message': 'Profile not found'}), 404
+        return send_from_directory(os.path.abspath(app.profiler.directory), name,
+                                   mimetype='application/octet-stream', as_attachment=True)
+
+    def health_report():
+        palette = app.palette_manager.current
+        return {
+            'pid': os.getpid(),
+            'palette': {'version': palette.version, 'entries': len(palette)},
+            'palettes': app.palettes.stats(),
+            'heavy_lane': app.heavy_lane.stats(),
+            'admission': app.admission.stats(),
+            'mosaic_tiles': app.mosaic_store.cache_info(),
+        }
+
+    @app.route('/healthz')
+    def healthz():
+        """Liveness: the worker is up and serving requests."""
+        return jsonify({'status': 'ok', **health_report()})
+
+    @app.route('/readyz')
+    def readyz():
+        """Readiness: 503 once the heavy lane is saturated, so load balancers can route elsewhere."""
+        report = health_report()
+        ready = report['heavy_lane']['saturation'] < app.config['READY_MAX_SATURATION']
+        return jsonify({'status': 'ready' if ready else 'saturated', **report}), 200 if ready else 503
+
+    @app.route('/metrics')
+    def metrics():
+        """Expose counters and latency histograms in Prometheus text format."""
+        return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
     # Load emoji data during app initialization
-    load_emoji_data()
+    with startup.phase('palette'):
+        load_emoji_data()
+
+    app.startup_stats = startup.summary()
+    REGISTRY.set_gauge('emojiart_startup_seconds', app.startup_stats['total_seconds'])
+    app.logger.info('App created', extra={
+        'startup_seconds': round(app.startup_stats['total_seconds'], 3),
+        'rss_bytes': app.startup_stats['memory']['rss']
+    })
 
     return app
 
@@ -297,7 +906,5 @@ def create_app():
 app = create_app()
 
 if __name__ == '__main__':
-    # Load emoji data when the app starts
-    app.emoji_db = parse_emoji_csv()
     # Run the app on all network interfaces
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Offline performance benchmarks for the emoji matching pipeline.
+
+Everything runs against synthetic images and palettes, so no network or data
+files are needed. Results are written as JSON; when a baseline file is given,
+the run fails if any benchmark got slower than the baseline by more than the
+tolerance.
+
+    python benchmarks/run_benchmarks.py --output results.json
+    python benchmarks/run_benchmarks.py --baseline benchmarks/baseline.json --tolerance 0.25
+    python benchmarks/run_benchmarks.py --quick --save-baseline benchmarks/baseline.json
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from io import BytesIO
+from typing import Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import numpy as np
+from PIL import Image
+
+from config.config import Config
+from utils.color_utils import hex_to_rgb, color_distance, rgb_array_to_lab
+from utils.csv_parser import parse_emoji_csv
+from utils.palette import EmojiPalette, ENGINES
+
+GRID_SIZES = [10, 50, 100, 250, 500]
+PALETTE_SIZES = [30, 1000, 5000, 20000]
+QUICK_GRID_SIZES = [10, 100]
+QUICK_PALETTE_SIZES = [30, 1000]
+
+def measure(func: Callable[[], object], repeats: int, warmup: int = 1) -> Dict:
+    """Run func repeatedly and return timing statistics in seconds."""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return {
+        'median_s': statistics.median(samples),
+        'min_s': min(samples),
+        'repeats': repeats,
+    }
+
+def synthetic_palette_rows(size: int, seed: int = 0) -> List[List[str]]:
+    rng = np.random.default_rng(seed)
+    colors = rng.integers(0, 256, size=(size, 3))
+    rows = []
+    for i, (r, g, b) in enumerate(colors):
+        code = 0x1F300 + i
+        rows.append([chr(code), str(code), f'#{r:02x}{g:02x}{b:02x}'])
+    return rows
+
+def write_palette_csv(path: str, size: int):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(Config.EMOJI_CSV_HEADERS)
+        writer.writerows(synthetic_palette_rows(size))
+
+def synthetic_image(width: int, height: int, seed: int = 0) -> Image.Image:
+    """A smooth gradient with noise, closer to a photo than uniform noise."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([x * 255 / max(width - 1, 1), y * 255 / max(height - 1, 1),
+                     (x + y) * 127 / max(width + height - 2, 1)], axis=-1)
+    noise = rng.normal(0, 12, size=base.shape)
+    return Image.fromarray(np.clip(base + noise, 0, 255).astype(np.uint8), 'RGB')
+
+def bench_color_conversion(results: Dict, repeats: int):
+    rng = np.random.default_rng(1)
+    pixels = rng.integers(0, 256, size=(100_000, 3), dtype=np.uint8)
+    hex_colors = [f'#{r:02x}{g:02x}{b:02x}' for r, g, b in pixels[:1000]]
+
+    results['color.hex_to_rgb_x1000'] = measure(lambda: [hex_to_rgb(c) for c in hex_colors], repeats)
+    results['color.color_distance_x1000'] = measure(
+        lambda: [color_distance(c, '#808080') for c in hex_colors], repeats)
+    results['color.rgb_array_to_lab_100k'] = measure(lambda: rgb_array_to_lab(pixels), repeats)
+
+def bench_csv_load(results: Dict, repeats: int, palette_sizes: List[int], workdir: str):
+    for size in palette_sizes:
+        path = os.path.join(workdir, f'palette_{size}.csv')
+        write_palette_csv(path, size)
+        results[f'csv.parse_emoji_csv_{size}'] = measure(lambda: parse_emoji_csv(path), repeats)
+        results[f'palette.build_{size}'] = measure(lambda: EmojiPalette.from_csv(path), repeats)
+
+def bench_matching(results: Dict, repeats: int, grid_sizes: List[int], palette_sizes: List[int]):
+    for palette_size in palette_sizes:
+        palette = EmojiPalette([{'Emoji': e, 'ASCII Code': a, 'Hex Color': h}
+                                for e, a, h in synthetic_palette_rows(palette_size)])
+        for grid_size in grid_sizes:
+            pixels = np.asarray(synthetic_image(grid_size, grid_size))
+            # The largest combinations are slow; fewer repeats keep the suite usable
+            runs = repeats if grid_size * grid_size * palette_size <= 50_000_000 else 1
+            for engine in ENGINES:
+                results[f'match.{engine}_grid{grid_size}_palette{palette_size}'] = measure(
+                    lambda: palette.nearest_indices(pixels, engine), runs)
+
+def bench_end_to_end(results: Dict, repeats: int, grid_sizes: List[int], workdir: str):
+    path = os.path.join(workdir, 'palette_e2e.csv')
+    write_palette_csv(path, 1000)
+    original_path = Config.EMOJI_CSV_PATH
+    Config.EMOJI_CSV_PATH = path
+    try:
+        from app import create_app
+        app = create_app()
+    finally:
+        Config.EMOJI_CSV_PATH = original_path
+    app.config['TESTING'] = True
+    app.logger.setLevel(logging.WARNING)
+    client = app.test_client()
+
+    photo = synthetic_image(1024, 768)
+    # Few distinct colors, like a screenshot or logo
+    flat = photo.quantize(16).convert('RGB')
+    for name, image in [('process_image', photo), ('process_image_flat', flat)]:
+        buffer = BytesIO()
+        image.save(buffer, 'PNG')
+        payload = buffer.getvalue()
+
+        for grid_size in grid_sizes:
+            def request():
+                response = client.post('/process-image', content_type='multipart/form-data', data={
+                    'image': (BytesIO(payload), 'bench.png'),
+                    'gridSize': str(grid_size),
+                    'aspectRatio': '4:3',
+                })
+                assert response.status_code == 200, response.data[:200]
+            results[f'e2e.{name}_grid{grid_size}'] = measure(request, repeats)
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Return a description of every benchmark whose median regressed beyond the tolerance."""
+    regressions = []
+    for name, base in baseline.get('results', {}).items():
+        current = results.get(name)
+        if current is None:
+            continue
+        limit = base['median_s'] * (1 + tolerance)
+        if current['median_s'] > limit:
+            regressions.append(f"{name}: {current['median_s']:.6f}s vs baseline {base['median_s']:.6f}s "
+                               f"(+{(current['median_s'] / base['median_s'] - 1) * 100:.0f}%)")
+    return regressions
+
+def run(quick: bool, repeats: int) -> Dict:
+    grid_sizes = QUICK_GRID_SIZES if quick else GRID_SIZES
+    palette_sizes = QUICK_PALETTE_SIZES if quick else PALETTE_SIZES
+    results: Dict[str, Dict] = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        bench_color_conversion(results, repeats)
+        bench_csv_load(results, repeats, palette_sizes, workdir)
+        bench_matching(results, repeats, grid_sizes, palette_sizes)
+        bench_end_to_end(results, repeats, grid_sizes, workdir)
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'quick': quick,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Run EmojiArt performance benchmarks.')
+    parser.add_argument('--output', help='write results JSON to this file')
+    parser.add_argument('--baseline', help='baseline JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown relative to the baseline (0.25 = 25%%)')
+    parser.add_argument('--save-baseline', help='write results as a new baseline to this file')
+    parser.add_argument('--quick', action='store_true', help='only the small grid and palette sizes')
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    report = run(args.quick, args.repeats)
+    for name, stats in sorted(report['results'].items()):
+        print(f"{name:50s} {stats['median_s'] * 1000:10.3f} ms")
+
+    for path in filter(None, [args.output, args.save_baseline]):
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report['results'], baseline, args.tolerance)
+        if regressions:
+            print('\nRegressions beyond tolerance:')
+            for line in regressions:
+                print(f'  {line}')
+            return 1
+        print(f'\nNo regressions beyond {args.tolerance:.0%} of baseline')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,9 +7,87 @@ class Config:
     HOST = '127.0.0.1'
 
     # CSV Configuration
-    EMOJI_CSV_PATH = os.path.join('data', 'emoji_data.csv')
+    EMOJI_CSV_PATH = os.environ.get('EMOJI_CSV_PATH', os.path.join('data', 'emoji_data.csv'))
     EMOJI_CSV_HEADERS = ['Emoji', 'ASCII Code', 'Hex Color']
+
+    # More palettes selectable per request by name, as comma-separated name=path pairs.
+    # The palette at EMOJI_CSV_PATH is always available as 'default'; the others are loaded on first use
+    EMOJI_PALETTES = os.environ.get('EMOJI_PALETTES', ','.join([
+        'full=static/data/emoji_data.csv',
+        'squares=static/data/palettes/squares.csv',
+        'hearts=static/data/palettes/hearts.csv',
+        'food=static/data/palettes/food.csv',
+    ]))
+
+    # Seconds between checks of the CSV file for a new palette (0 disables polling)
+    EMOJI_PALETTE_POLL_INTERVAL = float(os.environ.get('EMOJI_PALETTE_POLL_INTERVAL', 5))
+
+    # Token required in the X-Admin-Token header for /admin routes (unset disables them)
+    ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
     
+    # Uploads are hashed as they arrive and spooled to disk past this many bytes
+    UPLOAD_SPOOL_THRESHOLD = 512 * 1024
+    UPLOAD_CHUNK_SIZE = 64 * 1024
+
+    # Longest side of the normalized RGB copy stored with each upload
+    UPLOAD_NORMALIZED_MAX_SIDE = 1024
+
+    # Upload storage limits enforced by the background sweeper (0 disables a limit)
+    UPLOAD_QUOTA_BYTES = int(os.environ.get('UPLOAD_QUOTA_BYTES', 512 * 1024 * 1024))
+    UPLOAD_TTL_SECONDS = float(os.environ.get('UPLOAD_TTL_SECONDS', 7 * 24 * 3600))
+    UPLOAD_SWEEP_INTERVAL = float(os.environ.get('UPLOAD_SWEEP_INTERVAL', 60))
+
+    # Logging: written by a background thread, rotated at LOG_MAX_BYTES
+    LOG_DIR = 'logs'
+    LOG_MAX_BYTES = 10 * 1024 * 1024
+    LOG_BACKUP_COUNT = 10
+    # Fraction of INFO records kept per route, for high-volume lines
+    LOG_SAMPLE_RATES = {'index': 0.01}
+
+    # Directory shared by gunicorn workers so /metrics reports server-wide totals
+    METRICS_DIR = os.environ.get('METRICS_DIR')
+
+    # Per-request CPU profiling; nothing is hooked in unless enabled.
+    # Profiled requests are sampled at PROFILING_SAMPLE_RATE or asked for by
+    # admins with an X-Profile header.
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '').lower() in ('1', 'true', 'yes')
+    PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+    PROFILE_KEEP = 50
+
+    # Admission control for /process-image, in cell/palette comparisons (0 disables a limit).
+    # A 500x500 grid against a 4000-emoji palette costs about 1e9.
+    ADMISSION_REQUEST_BUDGET = float(os.environ.get('ADMISSION_REQUEST_BUDGET', 2e9))
+    ADMISSION_CONCURRENT_BUDGET = float(os.environ.get('ADMISSION_CONCURRENT_BUDGET', 4e9))
+    # Seconds clients are asked to wait when the concurrent budget is exhausted
+    ADMISSION_RETRY_AFTER = int(os.environ.get('ADMISSION_RETRY_AFTER', 2))
+
+    # Heavy lane: image conversions run on this many threads per worker, with this many
+    # more waiting; gunicorn threads beyond that stay free for the light endpoints
+    HEAVY_LANE_WORKERS = int(os.environ.get('HEAVY_LANE_WORKERS', 2))
+    HEAVY_LANE_QUEUE = int(os.environ.get('HEAVY_LANE_QUEUE', 2))
+    # /readyz reports not ready once this fraction of the lane's slots is taken
+    READY_MAX_SATURATION = float(os.environ.get('READY_MAX_SATURATION', 0.75))
+
+    # Low bits dropped per channel before matching, unless a request sets 'quantize'
+    MATCH_QUANTIZE_BITS = int(os.environ.get('MATCH_QUANTIZE_BITS', 0))
+
+    # Average each cell's colors in linear light, unless a request sets 'linear'
+    SAMPLE_LINEAR_LIGHT = os.environ.get('SAMPLE_LINEAR_LIGHT', '').lower() in ('1', 'true', 'yes')
+
+    # Animated conversions re-match a cell only when its color moved more than this on some channel
+    ANIMATION_CHANGE_THRESHOLD = int(os.environ.get('ANIMATION_CHANGE_THRESHOLD', 6))
+
+    # Width of the quick preview grid a request with a deadline always gets first
+    PROGRESSIVE_PREVIEW_GRID = int(os.environ.get('PROGRESSIVE_PREVIEW_GRID', 16))
+
+    # Stored mosaics: matched in square tiles of this many cells a side, with this many
+    # tiles cached per worker; a single window request may cover at most MOSAIC_MAX_WINDOW cells
+    MOSAIC_TILE_SIZE = int(os.environ.get('MOSAIC_TILE_SIZE', 64))
+    MOSAIC_TILE_CACHE = int(os.environ.get('MOSAIC_TILE_CACHE', 1024))
+    MOSAIC_MAX_WINDOW = int(os.environ.get('MOSAIC_MAX_WINDOW', 256 * 256))
+    MOSAIC_MAX_CELLS = int(os.environ.get('MOSAIC_MAX_CELLS', 4000 * 4000))
+
     # Default dimensions
     DEFAULT_WIDTH = 100
     
@@ -0,0 +1,64 @@
+"""
+Production gunicorn settings.
+
+The app (including the parsed palette and its numpy arrays) is loaded once in
+the master and forked into the workers, so those pages are shared
+copy-on-write instead of being rebuilt and duplicated per worker.
+"""
+import gc
+import os
+import shutil
+import tempfile
+import time
+
+from utils.startup import memory_usage
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+# Keep this above HEAVY_LANE_WORKERS + HEAVY_LANE_QUEUE so light endpoints always get a thread
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+preload_app = True
+
+_master_started = time.perf_counter()
+
+# Workers write their metrics here so /metrics can report server-wide totals.
+# Set before the app is loaded, so Config picks it up.
+os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), f'emojiart-metrics-{os.getpid()}'))
+
+def on_starting(server):
+    # Drop files left behind by a previous master using the same directory
+    shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
+
+def when_ready(server):
+    # The master reports what it recorded while loading the app (palette build, startup) itself
+    from utils.metrics import REGISTRY
+    REGISTRY.flush()
+
+    # Import what the first request would otherwise import in every worker
+    import PIL.Image  # noqa: F401
+
+    # Move everything allocated so far out of the collector's view, so GC passes
+    # in the workers don't touch (and un-share) the preloaded objects
+    gc.freeze()
+
+    usage = memory_usage()
+    server.log.info("Master ready in %.3fs, rss=%d KiB",
+                    time.perf_counter() - _master_started, usage['rss'] // 1024)
+
+def post_fork(server, worker):
+    # Start empty, or every worker would report the master's counters and timers again
+    from utils.metrics import REGISTRY
+    REGISTRY.reset()
+
+def child_exit(server, worker):
+    # Keep the exited worker's totals without leaving its file behind
+    from utils.metrics import REGISTRY
+    REGISTRY.retire(worker.pid)
+
+def post_worker_init(worker):
+    usage = memory_usage()
+    worker.log.info("Worker %s ready, rss=%d KiB pss=%s KiB private=%s KiB",
+                    worker.pid, usage['rss'] // 1024,
+                    usage.get('pss', 0) // 1024, usage.get('private', 0) // 1024)
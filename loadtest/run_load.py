@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Local load-testing harness for the HTTP endpoints.
+
+Starts the app under gunicorn (or targets an already running server), drives
+/process-image, /get-emojis, /emojis and /upload with a configurable request
+mix and concurrency, and reports throughput, latency percentiles, error rates
+and per-worker CPU/RSS. Several worker classes and counts can be run back to
+back to compare them:
+
+    python loadtest/run_load.py --duration 30 --concurrency 16
+    python loadtest/run_load.py --workers 1,2,4 --worker-class sync,gthread --output capacity.json
+    python loadtest/run_load.py --target http://127.0.0.1:5000 --mix process-image=1
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from config.config import Config
+
+# gthread threads per worker beyond the heavy lane's workers and queue, left for light endpoints
+SPARE_THREADS = 4
+
+DEFAULT_MIX = 'process-image=4,get-emojis=3,emojis=2,upload=1'
+GRID_SIZES = ['16', '32', '64', '100']
+
+def parse_mix(spec: str) -> List[Tuple[str, float]]:
+    """Parse 'name=weight,...' into (name, weight) pairs."""
+    mix = []
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        mix.append((name.strip(), float(weight or 1)))
+    return mix
+
+def multipart(fields: Dict[str, str], files: Dict[str, Tuple[str, bytes]]) -> Tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    body = BytesIO()
+    for name, value in fields.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, data) in files.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                   f'Content-Type: application/octet-stream\r\n\r\n'.encode())
+        body.write(data)
+        body.write(b'\r\n')
+    body.write(f'--{boundary}--\r\n'.encode())
+    return body.getvalue(), f'multipart/form-data; boundary={boundary}'
+
+def load_corpus(directory: Optional[str], count: int) -> List[Tuple[str, bytes]]:
+    """Read images from a directory, or generate synthetic ones."""
+    if directory:
+        corpus = []
+        for name in sorted(os.listdir(directory)):
+            if name.lower().endswith(('.png', '.jpg', '.jpeg')):
+                with open(os.path.join(directory, name), 'rb') as f:
+                    corpus.append((name, f.read()))
+        if not corpus:
+            raise SystemExit(f'No images found in {directory}')
+        return corpus
+
+    from benchmarks.run_benchmarks import synthetic_image
+    corpus = []
+    for i in range(count):
+        buffer = BytesIO()
+        synthetic_image(640 + 64 * i, 480, seed=i).save(buffer, 'PNG')
+        corpus.append((f'synthetic{i}.png', buffer.getvalue()))
+    return corpus
+
+def build_request(base_url: str, kind: str, corpus: List[Tuple[str, bytes]], rng: random.Random):
+    if kind == 'process-image':
+        filename, data = rng.choice(corpus)
+        body, content_type = multipart(
+            {'gridSize': rng.choice(GRID_SIZES), 'aspectRatio': rng.choice(['1:1', '4:3', '16:9'])},
+            {'image': (filename, data)})
+        return urllib.request.Request(f'{base_url}/process-image', body, {'Content-Type': content_type})
+    if kind == 'upload':
+        filename, data = rng.choice(corpus)
+        body, content_type = multipart({}, {'file': (filename, data)})
+        return urllib.request.Request(f'{base_url}/upload', body, {'Content-Type': content_type})
+    if kind == 'get-emojis':
+        query = rng.choice(['?name=heart', '?color=%23ff0000', '?color=%2333aa55&name=face', ''])
+        return urllib.request.Request(f'{base_url}/get-emojis{query}')
+    if kind == 'emojis':
+        return urllib.request.Request(f'{base_url}/emojis')
+    raise SystemExit(f'Unknown request kind: {kind}')
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def summarize(samples: List[Tuple[float, bool]], elapsed: float) -> Dict:
+    latencies = sorted(latency for latency, _ in samples)
+    errors = sum(1 for _, ok in samples if not ok)
+    return {
+        'requests': len(samples),
+        'throughput_rps': len(samples) / elapsed if elapsed else 0.0,
+        'error_rate': errors / len(samples) if samples else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+    }
+
+class WorkerSampler:
+    """Samples CPU time and RSS of the gunicorn workers from /proc (Linux only)."""
+
+    def __init__(self, master_pid: int, interval: float = 0.5):
+        self.master_pid = master_pid
+        self.interval = interval
+        self.start_cpu: Dict[int, float] = {}
+        self.last_cpu: Dict[int, float] = {}
+        self.peak_rss: Dict[int, int] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._ticks = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+        self._page = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+    def workers(self) -> List[int]:
+        try:
+            with open(f'/proc/{self.master_pid}/task/{self.master_pid}/children') as f:
+                return [int(pid) for pid in f.read().split()]
+        except OSError:
+            return []
+
+    def _sample(self):
+        for pid in self.workers():
+            try:
+                with open(f'/proc/{pid}/stat') as f:
+                    fields = f.read().rsplit(')', 1)[1].split()
+                with open(f'/proc/{pid}/statm') as f:
+                    rss = int(f.read().split()[1]) * self._page
+            except OSError:
+                continue
+            cpu = (int(fields[11]) + int(fields[12])) / self._ticks
+            self.start_cpu.setdefault(pid, cpu)
+            self.last_cpu[pid] = cpu
+            self.peak_rss[pid] = max(rss, self.peak_rss.get(pid, 0))
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._sample()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+    def report(self, elapsed: float) -> List[Dict]:
+        return [{
+            'pid': pid,
+            'cpu_seconds': round(self.last_cpu[pid] - self.start_cpu[pid], 3),
+            'cpu_utilization': round((self.last_cpu[pid] - self.start_cpu[pid]) / elapsed, 3) if elapsed else 0.0,
+            'peak_rss_mb': round(self.peak_rss[pid] / (1024 * 1024), 1),
+        } for pid in sorted(self.last_cpu)]
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_server(workers: int, worker_class: str, threads: int, palette: str) -> Tuple[subprocess.Popen, str]:
+    heavy = Config.HEAVY_LANE_WORKERS + Config.HEAVY_LANE_QUEUE
+    if worker_class == 'gthread' and threads <= heavy:
+        # Conversions could hold every thread, starving /healthz, /emojis and /metrics
+        raise SystemExit(f'--threads must be above HEAVY_LANE_WORKERS + HEAVY_LANE_QUEUE ({heavy})')
+    port = free_port()
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), GUNICORN_WORKER_CLASS=worker_class,
+               GUNICORN_THREADS=str(threads), PORT=str(port), EMOJI_CSV_PATH=os.path.abspath(palette))
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}', 'app:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit('gunicorn exited during startup')
+        try:
+            urllib.request.urlopen(f'{base_url}/emojis', timeout=1).read()
+            return process, base_url
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            time.sleep(0.2)
+    process.terminate()
+    raise SystemExit('gunicorn did not become ready in time')
+
+def drive(base_url: str, mix: List[Tuple[str, float]], corpus, concurrency: int, duration: float,
+          seed: int) -> Tuple[Dict[str, List[Tuple[float, bool]]], float]:
+    samples: Dict[str, List[Tuple[float, bool]]] = {kind: [] for kind, _ in mix}
+    lock = threading.Lock()
+    kinds = [kind for kind, _ in mix]
+    weights = [weight for _, weight in mix]
+    stop_at = time.perf_counter() + duration
+
+    def client(index: int):
+        rng = random.Random(seed + index)
+        while time.perf_counter() < stop_at:
+            kind = rng.choices(kinds, weights)[0]
+            req = build_request(base_url, kind, corpus, rng)
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(req, timeout=60) as response:
+                    response.read()
+                    ok = response.status < 400
+            except urllib.error.HTTPError as e:
+                e.read()
+                ok = False
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                ok = False
+            latency = time.perf_counter() - start
+            with lock:
+                samples[kind].append((latency, ok))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(client, range(concurrency)))
+    return samples, time.perf_counter() - started
+
+def run_scenario(args, workers: Optional[int], worker_class: Optional[str], corpus) -> Dict:
+    mix = parse_mix(args.mix)
+    process = None
+    base_url = args.target
+    if base_url is None:
+        process, base_url = start_server(workers, worker_class, args.threads, args.palette)
+    try:
+        sampler = WorkerSampler(process.pid) if process else None
+        if sampler:
+            with sampler:
+                samples, elapsed = drive(base_url, mix, corpus, args.concurrency, args.duration, args.seed)
+        else:
+            samples, elapsed = drive(base_url, mix, corpus, args.concurrency, args.duration, args.seed)
+    finally:
+        if process:
+            process.terminate()
+            process.wait(timeout=30)
+
+    all_samples = [s for kind_samples in samples.values() for s in kind_samples]
+    return {
+        'config': {
+            'target': args.target,
+            'workers': workers,
+            'worker_class': worker_class,
+            'threads': args.threads,
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'mix': args.mix,
+            'palette': None if args.target else args.palette,
+        },
+        'overall': summarize(all_samples, elapsed),
+        'endpoints': {kind: summarize(kind_samples, elapsed) for kind, kind_samples in samples.items()},
+        'workers': sampler.report(elapsed) if sampler else [],
+    }
+
+def print_report(report: Dict):
+    config = report['config']
+    title = config['target'] or f"{config['workers']} x {config['worker_class']} (threads={config['threads']})"
+    print(f"\n== {title}, concurrency={config['concurrency']}, {config['duration']}s")
+    print(f"{'endpoint':16s} {'reqs':>7s} {'rps':>8s} {'err%':>6s} {'p50ms':>8s} {'p95ms':>8s} {'p99ms':>8s}")
+    rows = list(report['endpoints'].items()) + [('ALL', report['overall'])]
+    for name, stats in rows:
+        print(f"{name:16s} {stats['requests']:7d} {stats['throughput_rps']:8.1f} {stats['error_rate'] * 100:6.1f} "
+              f"{stats['p50_ms']:8.1f} {stats['p95_ms']:8.1f} {stats['p99_ms']:8.1f}")
+    for worker in report['workers']:
+        print(f"  worker {worker['pid']}: cpu {worker['cpu_seconds']:.2f}s "
+              f"({worker['cpu_utilization'] * 100:.0f}%), peak rss {worker['peak_rss_mb']} MB")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Load-test the EmojiArt HTTP endpoints.')
+    parser.add_argument('--target', help='URL of a running server; by default gunicorn is started locally')
+    parser.add_argument('--workers', default='2', help='comma-separated worker counts to compare')
+    parser.add_argument('--worker-class', default='gthread', help='comma-separated gunicorn worker classes')
+    parser.add_argument('--threads', type=int, default=Config.HEAVY_LANE_WORKERS + Config.HEAVY_LANE_QUEUE + SPARE_THREADS,
+                        help='threads per gthread worker (must exceed the heavy lane workers plus queue)')
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent client connections')
+    parser.add_argument('--duration', type=float, default=20, help='seconds to drive load per scenario')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'request mix as name=weight (default {DEFAULT_MIX})')
+    parser.add_argument('--palette', default=os.path.join(ROOT, 'static', 'data', 'emoji_data.csv'),
+                        help='palette CSV the local server loads')
+    parser.add_argument('--corpus', help='directory of PNG/JPEG images (synthetic images by default)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write all reports as JSON to this file')
+    args = parser.parse_args(argv)
+
+    corpus = load_corpus(args.corpus, count=4)
+    if args.target:
+        scenarios = [(None, None)]
+    else:
+        scenarios = list(itertools.product([int(w) for w in args.workers.split(',')], args.worker_class.split(',')))
+
+    reports = []
+    for workers, worker_class in scenarios:
+        report = run_scenario(args, workers, worker_class, corpus)
+        print_report(report)
+        reports.append(report)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'reports': reports}, f, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+import threading
+import pytest
+from utils.admission import (AdmissionController, OverBudgetError, OverloadedError,
+                             estimate_cost, SOURCE_PIXEL_WEIGHT)
+
+def test_estimate_cost_scales_with_cells_and_palette():
+    """Test that the cost grows with grid cells, palette size and source pixels."""
+    base = estimate_cost(100, 10)
+    assert base == 1000
+    assert estimate_cost(200, 10) == 2 * base
+    assert estimate_cost(100, 20) == 2 * base
+    assert estimate_cost(100, 10, source_pixels=50) == base + 50 * SOURCE_PIXEL_WEIGHT
+
+def test_estimate_cost_empty_palette():
+    """Test that an empty palette still costs one comparison per cell."""
+    assert estimate_cost(100, 0) == 100
+
+def test_estimate_cost_unknown_engine():
+    """Test that an unknown engine is rejected."""
+    with pytest.raises(ValueError):
+        estimate_cost(100, 10, engine='nope')
+
+def test_request_over_budget():
+    """Test that a single request above the per-request budget is refused."""
+    controller = AdmissionController(request_budget=100, concurrent_budget=1000, retry_after=1)
+    with pytest.raises(OverBudgetError) as info:
+        with controller.admit(101):
+            pass
+    assert info.value.status_code == 413
+    assert controller.stats()['in_flight_requests'] == 0
+
+def test_concurrent_budget():
+    """Test that in-flight work is limited and released when requests finish."""
+    controller = AdmissionController(request_budget=100, concurrent_budget=150, retry_after=3)
+    with controller.admit(100):
+        assert controller.stats()['in_flight_cost'] == 100
+        with pytest.raises(OverloadedError) as info:
+            with controller.admit(60):
+                pass
+        assert info.value.status_code == 429
+        assert info.value.retry_after == 3
+        with controller.admit(50):
+            assert controller.stats()['in_flight_requests'] == 2
+    assert controller.stats() == {
+        'in_flight_cost': 0, 'in_flight_requests': 0, 'request_budget': 100, 'concurrent_budget': 150
+    }
+
+def test_lone_request_always_admitted():
+    """Test that a request within its own budget is never starved by the concurrent budget."""
+    controller = AdmissionController(request_budget=100, concurrent_budget=50)
+    with controller.admit(100):
+        pass
+
+def test_released_on_error():
+    """Test that cost is released when the admitted work raises."""
+    controller = AdmissionController(request_budget=100, concurrent_budget=100)
+    with pytest.raises(RuntimeError):
+        with controller.admit(80):
+            raise RuntimeError('boom')
+    assert controller.stats()['in_flight_cost'] == 0
+
+def test_disabled_limits():
+    """Test that zero budgets disable the limits."""
+    controller = AdmissionController(request_budget=0, concurrent_budget=0)
+    with controller.admit(1e12):
+        with controller.admit(1e12):
+            pass
+
+def test_thread_safety():
+    """Test that concurrent admissions never exceed the budget."""
+    controller = AdmissionController(request_budget=10, concurrent_budget=30)
+    peak = []
+    lock = threading.Lock()
+
+    def worker():
+        for _ in range(200):
+            try:
+                with controller.admit(10):
+                    with lock:
+                        peak.append(controller.stats()['in_flight_cost'])
+            except OverloadedError:
+                pass
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert max(peak) <= 30
+    assert controller.stats()['in_flight_cost'] == 0
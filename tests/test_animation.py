@@ -0,0 +1,69 @@
+import numpy as np
+from io import BytesIO
+from PIL import Image
+from utils.animation import is_animated, iter_frames, IncrementalGrid
+
+def make_gif(colors, size=(40, 40), duration=80):
+    frames = [Image.new('RGB', size, color) for color in colors]
+    buffer = BytesIO()
+    frames[0].save(buffer, 'GIF', save_all=True, append_images=frames[1:], duration=duration, loop=0)
+    buffer.seek(0)
+    return Image.open(buffer)
+
+def brightness_match(colors):
+    """Index 0 for dark colors, 1 for light ones."""
+    return (colors.astype(int).sum(axis=1) > 382).astype(np.intp)
+
+def test_is_animated():
+    """Test that only multi-frame images count as animated."""
+    assert is_animated(make_gif(['red', 'blue']))
+    assert not is_animated(Image.new('RGB', (4, 4)))
+
+def test_iter_frames_durations():
+    """Test that frames come out in order with their durations."""
+    frames = [(index, duration, np.asarray(frame.convert('RGB'))[0, 0].tolist())
+              for index, duration, frame in iter_frames(make_gif(['red', 'blue', 'white']))]
+    assert [f[0] for f in frames] == [0, 1, 2]
+    assert all(f[1] == 80 for f in frames)
+    assert frames[1][2] == [0, 0, 255]
+
+def test_first_update_matches_everything():
+    """Test that the first frame matches and reports every cell."""
+    grid = IncrementalGrid(brightness_match)
+    changed, matched = grid.update(np.zeros((3, 4, 3), dtype=np.uint8))
+    assert matched == 12
+    assert len(changed) == 12
+    assert (grid.indices == 0).all()
+
+def test_only_changed_cells_rematched():
+    """Test that cells within the threshold keep their match and are not re-matched."""
+    calls = []
+
+    def match(colors):
+        calls.append(len(colors))
+        return brightness_match(colors)
+
+    grid = IncrementalGrid(match, threshold=10)
+    frame = np.zeros((4, 4, 3), dtype=np.uint8)
+    grid.update(frame)
+
+    frame = frame.copy()
+    frame[0, 0] = 255      # changes emoji
+    frame[1, 1] = 5        # within threshold, ignored
+    frame[2, 2] = 100      # re-matched, same emoji
+    changed, matched = grid.update(frame)
+    assert matched == 2
+    assert changed.tolist() == [[0, 0]]
+    assert grid.indices[0, 0] == 1
+    assert calls == [1, 2]
+
+def test_slow_drift_is_caught():
+    """Test that many small steps eventually trigger a re-match."""
+    grid = IncrementalGrid(brightness_match, threshold=10)
+    grid.update(np.full((1, 1, 3), 120, dtype=np.uint8))
+    total = 0
+    for value in range(126, 240, 6):
+        _, matched = grid.update(np.full((1, 1, 3), value, dtype=np.uint8))
+        total += matched
+    assert total > 0
+    assert grid.indices[0, 0] == 1
@@ -147,3 +147,70 @@ def test_get_emojis_no_matches(client):
     assert 'data' in result
     assert isinstance(result['data'], list)
     assert len(result['data']) == 0
+
+def test_index_etag_conditional_get(client):
+    """Test that the homepage carries an ETag and honours If-None-Match."""
+    response = client.get('/')
+    etag = response.headers.get('ETag')
+    assert etag
+
+    cached = client.get('/', headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.data == b''
+
+    stale = client.get('/', headers={'If-None-Match': '"stale"'})
+    assert stale.status_code == 200
+    assert stale.headers['ETag'] == etag
+
+def test_index_rendered_once_per_build(app, client, monkeypatch):
+    """Test that the homepage is only re-rendered when the build changes."""
+    import app as app_module
+    calls = []
+    original = app_module.render_template
+    monkeypatch.setattr(app_module, 'render_template', lambda *a, **kw: calls.append(1) or original(*a, **kw))
+
+    client.get('/')
+    client.get('/')
+    assert len(calls) == 1
+
+def test_index_rerendered_on_any_build_edit(client, monkeypatch, tmp_path):
+    """Test that the homepage follows every build.json edit and is cached without one."""
+    import app as app_module
+    from utils.build_manager import BuildManager
+    calls = []
+    original = app_module.render_template
+    monkeypatch.setattr(app_module, 'render_template', lambda *a, **kw: calls.append(1) or original(*a, **kw))
+    build_file = tmp_path / 'build.json'
+    build_file.write_text(json.dumps({'build_number': 7, 'last_updated': '2024-01-01T00:00:00'}))
+    monkeypatch.setattr(BuildManager, 'BUILD_FILE', str(build_file))
+
+    client.get('/')
+    build_file.write_text(json.dumps({'build_number': 7, 'last_updated': '2024-01-01T00:00:00', 'commit': 'abc123'}))
+    client.get('/')
+    assert len(calls) == 2
+
+    build_file.unlink()
+    client.get('/')
+    client.get('/')
+    assert len(calls) == 3
+
+def test_healthz(client):
+    """Test that /healthz reports heavy lane and admission state."""
+    response = client.get('/healthz')
+    assert response.status_code == 200
+    result = json.loads(response.data)
+    assert result['status'] == 'ok'
+    assert {'queued', 'in_flight', 'saturation'} <= set(result['heavy_lane'])
+    assert 'in_flight_cost' in result['admission']
+
+def test_readyz_reports_saturation(app, client, monkeypatch):
+    """Test that /readyz turns 503 once the heavy lane is saturated."""
+    response = client.get('/readyz')
+    assert response.status_code == 200
+    assert json.loads(response.data)['status'] == 'ready'
+
+    stats = dict(app.heavy_lane.stats(), saturation=1.0)
+    monkeypatch.setattr(app.heavy_lane, 'stats', lambda: stats)
+    response = client.get('/readyz')
+    assert response.status_code == 503
+    assert json.loads(response.data)['status'] == 'saturated'
@@ -0,0 +1,25 @@
+import json
+from benchmarks.run_benchmarks import compare, measure, main
+
+def test_measure_reports_median():
+    """Test that measure returns timing statistics."""
+    stats = measure(lambda: None, repeats=3)
+    assert stats['repeats'] == 3
+    assert 0 <= stats['min_s'] <= stats['median_s']
+
+def test_compare_flags_regressions():
+    """Test that only slowdowns beyond the tolerance are reported."""
+    baseline = {'results': {'fast': {'median_s': 1.0}, 'slow': {'median_s': 1.0}, 'gone': {'median_s': 1.0}}}
+    results = {'fast': {'median_s': 1.2}, 'slow': {'median_s': 1.3}}
+    regressions = compare(results, baseline, tolerance=0.25)
+    assert len(regressions) == 1
+    assert regressions[0].startswith('slow:')
+
+def test_baseline_regression_fails_run(tmp_path, monkeypatch):
+    """Test that the runner exits non-zero when the baseline is beaten."""
+    import benchmarks.run_benchmarks as runner
+    monkeypatch.setattr(runner, 'run', lambda quick, repeats: {'meta': {}, 'results': {'x': {'median_s': 2.0}}})
+    baseline = tmp_path / 'baseline.json'
+    baseline.write_text(json.dumps({'results': {'x': {'median_s': 1.0}}}))
+    assert main(['--baseline', str(baseline)]) == 1
+    assert main(['--baseline', str(baseline), '--tolerance', '1.5']) == 0
@@ -73,3 +73,29 @@ def test_multiple_increments(temp_build_file):
     # Verify final state
     final_info = BuildManager.get_build_info()
     assert final_info["build_number"] == initial_number + 3
+
+def test_get_build_info_is_memoized(temp_build_file, monkeypatch):
+    """Test that an unchanged build file is not parsed again."""
+    with open(temp_build_file, 'w') as f:
+        json.dump({"build_number": 7, "last_updated": "2025-01-24T11:48:37+02:00"}, f)
+    assert BuildManager.get_build_info()["build_number"] == 7
+
+    def fail(*args, **kwargs):
+        raise AssertionError("build file parsed again")
+    monkeypatch.setattr(json, 'load', fail)
+    info = BuildManager.get_build_info()
+    assert info["build_number"] == 7
+
+    # Returned dicts are copies
+    info["build_number"] = 99
+    assert BuildManager.get_build_info()["build_number"] == 7
+
+def test_get_build_info_reloads_on_change(temp_build_file):
+    """Test that a rewritten build file is picked up."""
+    with open(temp_build_file, 'w') as f:
+        json.dump({"build_number": 7, "last_updated": "a"}, f)
+    assert BuildManager.get_build_info()["build_number"] == 7
+
+    with open(temp_build_file, 'w') as f:
+        json.dump({"build_number": 8, "last_updated": "bb"}, f)
+    assert BuildManager.get_build_info()["build_number"] == 8
@@ -139,3 +139,82 @@ def test_color_distance_invalid():
     assert color_distance('#FF0000', 'invalid') is None
     assert color_distance('invalid', '#FF0000') is None
     assert color_distance('invalid', 'invalid') is None
+
+def test_rgb_array_to_hsv_matches_colorsys():
+    """Test that the vectorized HSV conversion matches colorsys exactly."""
+    import colorsys
+    import numpy as np
+    from utils.color_utils import rgb_array_to_hsv
+
+    colors = [(0, 0, 0), (255, 255, 255), (128, 128, 128), (255, 0, 0), (0, 255, 0),
+              (0, 0, 255), (255, 0, 128), (12, 200, 99), (250, 240, 10)]
+    hsv = rgb_array_to_hsv(np.array(colors, dtype=np.uint8))
+    expected = [colorsys.rgb_to_hsv(r / 255, g / 255, b / 255) for r, g, b in colors]
+    assert hsv.tolist() == [list(e) for e in expected]
+
+def test_unique_colors_round_trip():
+    """Test that unique colors and inverse indices rebuild the pixels."""
+    import numpy as np
+    from utils.color_utils import unique_colors
+
+    pixels = np.array([[[255, 0, 0], [0, 0, 255]], [[255, 0, 0], [255, 0, 0]]], dtype=np.uint8)
+    colors, inverse = unique_colors(pixels)
+    assert len(colors) == 2
+    assert inverse.shape == (4,)
+    assert np.array_equal(colors[inverse].reshape(pixels.shape), pixels)
+
+def test_unique_colors_quantized():
+    """Test that quantization merges nearby colors within a bounded error."""
+    import numpy as np
+    from utils.color_utils import unique_colors
+
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, size=(64, 64, 3), dtype=np.uint8)
+    exact, _ = unique_colors(pixels)
+    colors, inverse = unique_colors(pixels, quantize_bits=3)
+    assert len(colors) < len(exact)
+    error = np.abs(colors[inverse].reshape(pixels.shape).astype(int) - pixels)
+    assert error.max() <= 4
+
+def test_delta_e_ciede2000_reference_pairs():
+    """Test CIEDE2000 against published reference pairs (Sharma, Wu and Dalal)."""
+    import numpy as np
+    from utils.color_utils import delta_e_ciede2000
+
+    pairs = [
+        ((50.0, 2.6772, -79.7751), (50.0, 0.0, -82.7485), 2.0425),
+        ((50.0, 0.0, 0.0), (50.0, -1.0, 2.0), 2.3669),
+        ((50.0, 2.49, -0.001), (50.0, -2.49, 0.0009), 7.1792),
+        ((50.0, -0.001, 2.49), (50.0, 0.0011, -2.49), 4.7461),
+        ((50.0, 2.5, 0.0), (73.0, 25.0, -18.0), 27.1492),
+        ((60.2574, -34.0099, 36.2677), (60.4626, -34.1751, 39.4387), 1.2644),
+        ((2.0776, 0.0795, -1.135), (0.9033, -0.0636, -0.5514), 0.9082),
+    ]
+    lab1 = np.array([p[0] for p in pairs])
+    lab2 = np.array([p[1] for p in pairs])
+    expected = np.array([p[2] for p in pairs])
+    assert np.allclose(delta_e_ciede2000(lab1, lab2), expected, atol=1e-4)
+    assert np.allclose(delta_e_ciede2000(lab2, lab1), expected, atol=1e-4)
+    assert delta_e_ciede2000(lab1, lab1).max() == 0
+
+def test_delta_e_cie94():
+    """Test CIE94 on hand-computed differences."""
+    import numpy as np
+    from utils.color_utils import delta_e_cie94
+
+    # Pure lightness difference is unweighted
+    assert delta_e_cie94([50, 0, 0], [40, 0, 0]) == 10
+    # Chroma difference is scaled by 1 + 0.045 * C of the reference color
+    assert np.isclose(delta_e_cie94([50, 10, 0], [50, 0, 0]), 10 / 1.45)
+    assert delta_e_cie94([50, 10, 20], [50, 10, 20]) == 0
+
+def test_hex_array_to_rgb():
+    """Test that bulk hex conversion matches hex_to_rgb and rejects other spellings."""
+    import numpy as np
+    from utils.color_utils import hex_array_to_rgb
+    colors = ['#FF0000', '#00ff00', '#0000Ff', '#3c3c3c', '#000000']
+    assert hex_array_to_rgb(colors).tolist() == [list(hex_to_rgb(c)) for c in colors]
+    assert hex_array_to_rgb([]).shape == (0, 3)
+    for bad in (['FF0000F'], ['#FF00'], ['#GG0000'], ['#FF0000', '#FF00000'], ['#ff00é0']):
+        with pytest.raises(ValueError):
+            hex_array_to_rgb(bad)
@@ -1,7 +1,8 @@
 import pytest
 import os
 import csv
-from utils.csv_parser import parse_emoji_csv, CSVValidationError, validate_row, is_valid_emoji, is_valid_hex_color
+from utils.csv_parser import (parse_emoji_csv, iter_emoji_csv, CSVValidationError, LoadReport, validate_row,
+                              is_valid_emoji, is_valid_hex_color)
 from config.config import Config
 
 @pytest.fixture
@@ -154,3 +155,56 @@ def test_validate_row():
         'Hex Color': 'invalid'
     }
     assert validate_row(invalid_color, 1) is None
+
+def test_invalid_rows_summarized(test_csv_path, caplog):
+    """Test that invalid rows are counted per reason and logged in one warning."""
+    data = [['Emoji', 'ASCII Code', 'Hex Color']]
+    data += [['🟩', '129001', '#37c136']] * 3
+    data += [['abc', '1', '#37c136']] * 7
+    data += [['🟩', '-1', '#37c136'], ['🟩', '12', '#GGGGGG'], ['', '12', '#37c136'], ['🟩', '12']]
+    with open(test_csv_path, 'w', newline='', encoding='utf-8') as f:
+        csv.writer(f).writerows(data)
+
+    report = LoadReport()
+    with caplog.at_level('WARNING', logger='utils.csv_parser'):
+        emoji_data = parse_emoji_csv(test_csv_path, report)
+    assert len(emoji_data) == 3
+    assert report.to_dict()['errors'] == {
+        'ASCII-only emoji': 7, 'invalid ASCII code': 1, 'invalid hex color': 1,
+        'empty emoji': 1, 'missing field': 1,
+    }
+    assert (report.rows, report.loaded, report.invalid) == (14, 3, 11)
+    # Samples are capped and carry the CSV line number
+    assert len(report.samples['ASCII-only emoji']) == 5
+    assert report.samples['ASCII-only emoji'][0] == (5, 'abc')
+    assert report.samples['invalid hex color'] == [(13, '#GGGGGG')]
+    warnings = [r for r in caplog.records if r.levelname == 'WARNING']
+    assert len(warnings) == 1
+    assert 'Skipped 11 of 14 rows' in warnings[0].getMessage()
+
+def test_iter_emoji_csv_batches(test_csv_path):
+    """Test that large files are read in batches with the same result as a single pass."""
+    data = [['Emoji', 'ASCII Code', 'Hex Color']]
+    data += [[chr(0x1F300 + i), str(0x1F300 + i), f'#{i:06x}'] for i in range(1000)]
+    with open(test_csv_path, 'w', newline='', encoding='utf-8') as f:
+        csv.writer(f).writerows(data)
+
+    batches = list(iter_emoji_csv(test_csv_path, batch_rows=300))
+    assert [len(b) for b in batches] == [300, 300, 300, 100]
+    assert [row for batch in batches for row in batch] == parse_emoji_csv(test_csv_path)
+    assert parse_emoji_csv(test_csv_path)[999] == {'Emoji': chr(0x1F300 + 999), 'ASCII Code': str(0x1F300 + 999),
+                                                   'Hex Color': '#0003e7'}
+
+def test_bulk_validation_matches_validate_row(test_csv_path):
+    """Test that the bulk loader accepts exactly the rows validate_row accepts."""
+    rows = [
+        ['🟩', '129001', '#37c136'], ['🟩', ' 12 ', '#37c136'], ['🟩', '+7', '#37c136'], ['🟩', '²', '#37c136'],
+        ['🟩', '1_000', '#37c136'], [' 🟩 ', '0', '#ABCDEF'], ['🟩', '12', '#abcdef\n'], ['é', '1', '#000000'],
+        [' ', '1', '#000000'], ['🟩', '1', 'abcdef'],
+    ]
+    with open(test_csv_path, 'w', newline='', encoding='utf-8') as f:
+        csv.writer(f).writerows([['Emoji', 'ASCII Code', 'Hex Color']] + rows)
+
+    expected = [dict(zip(Config.EMOJI_CSV_HEADERS, row)) for i, row in enumerate(rows)
+                if validate_row(dict(zip(Config.EMOJI_CSV_HEADERS, row)), i + 2)]
+    assert parse_emoji_csv(test_csv_path) == expected
@@ -101,3 +101,103 @@ def test_similar_colors(emoji_matcher):
     if color3 != color4:
         distance = emoji_matcher.color_distance(color3['color'], color4['color'])
         assert distance < emoji_matcher.color_distance('#FF0000', '#00FF00')
+
+def test_cache_is_bounded():
+    """Test that the cache never holds more than cache_size colors and evicts the least recently used."""
+    matcher = EmojiMatcher(cache_size=2)
+    matcher.find_closest_emoji('#FF0000')
+    matcher.find_closest_emoji('#00FF00')
+    matcher.find_closest_emoji('#FF0000')  # Refresh red
+    matcher.find_closest_emoji('#0000FF')  # Evicts green
+
+    info = matcher.cache_info()
+    assert info['size'] == 2
+    assert info['evictions'] == 1
+    matcher.find_closest_emoji('#FF0000')
+    assert matcher.cache_info()['hits'] == 2
+    matcher.find_closest_emoji('#00FF00')
+    assert matcher.cache_info()['misses'] == 4
+
+def test_cache_info_hit_rate(emoji_matcher):
+    """Test hit/miss statistics."""
+    emoji_matcher.find_closest_emoji('#FF0000')
+    emoji_matcher.find_closest_emoji('#ff0000')
+    info = emoji_matcher.cache_info()
+    assert info['hits'] == 1
+    assert info['misses'] == 1
+    assert info['hit_rate'] == 0.5
+
+    emoji_matcher.clear_cache()
+    assert emoji_matcher.cache_info()['size'] == 0
+
+def test_quantized_keys_share_entries():
+    """Test that quantization maps nearby colors to one cache entry."""
+    matcher = EmojiMatcher(quantize_bits=4)
+    first = matcher.find_closest_emoji('#FF0000')
+    second = matcher.find_closest_emoji('#F30A05')
+    assert first == second
+    assert matcher.cache_info()['size'] == 1
+    assert matcher.cache_info()['hits'] == 1
+
+def test_invalid_quantize_bits():
+    """Test that quantization must leave at least one bit per channel."""
+    with pytest.raises(ValueError):
+        EmojiMatcher(quantize_bits=8)
+
+def test_find_closest_emojis_matches_single(emoji_matcher):
+    """Test that the batch method agrees with per-color matching."""
+    colors = ['#FF0000', '#0000FF', '#808080', '#FF0000', '#123456', '#FEDCBA']
+    batch = emoji_matcher.find_closest_emojis(colors)
+    reference = EmojiMatcher()
+    assert batch == [reference.find_closest_emoji(c) for c in colors]
+
+    info = emoji_matcher.cache_info()
+    assert info['misses'] == 5
+    assert info['hits'] == 1
+    assert emoji_matcher.find_closest_emojis(colors) == batch
+    assert emoji_matcher.cache_info()['hits'] == 7
+
+def test_find_closest_emojis_invalid(emoji_matcher):
+    """Test that one invalid color fails the whole batch."""
+    with pytest.raises(ValueError):
+        emoji_matcher.find_closest_emojis(['#FF0000', 'invalid'])
+    assert emoji_matcher.find_closest_emojis([]) == []
+
+def write_palette_csv(path):
+    path.write_text('Emoji,ASCII Code,Hex Color\n🟥,128997,#dd2e44\n🟦,128998,#3b80f5\n⬜,11036,#f5f5f5\n',
+                    encoding='utf-8')
+    return str(path)
+
+def test_from_csv(tmp_path):
+    """Test loading the matcher from a palette CSV."""
+    matcher = EmojiMatcher.from_csv(write_palette_csv(tmp_path / 'palette.csv'))
+    assert len(matcher) == 3
+    assert matcher.find_closest_emoji('#FF0000') == {'emoji': '🟥', 'color': '#dd2e44'}
+    assert matcher.find_closest_emoji('#0000FF')['emoji'] == '🟦'
+
+def test_from_palette(tmp_path):
+    """Test building the matcher from an EmojiPalette snapshot."""
+    from utils.palette import EmojiPalette
+    palette = EmojiPalette.from_csv(write_palette_csv(tmp_path / 'palette.csv'))
+    matcher = EmojiMatcher.from_palette(palette, cache_size=10)
+    assert len(matcher) == len(palette)
+    assert matcher.cache_size == 10
+    assert matcher.find_closest_emoji('#FFFFFF')['emoji'] == '⬜'
+
+def test_nearest_indices_matches_color_distance(emoji_matcher):
+    """Test that array matching picks the same emoji as the per-pair distance."""
+    import numpy as np
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, size=(20, 10, 3), dtype=np.uint8)
+    indices = emoji_matcher.nearest_indices(pixels)
+    assert indices.shape == (20, 10)
+    for (r, g, b), index in zip(pixels.reshape(-1, 3), indices.ravel()):
+        color = f'#{r:02X}{g:02X}{b:02X}'
+        distances = [emoji_matcher.color_distance(color, e['color']) for e in emoji_matcher.emoji_data]
+        assert index == distances.index(min(distances))
+
+def test_nearest_indices_empty():
+    """Test that matching against no emojis is an error."""
+    import numpy as np
+    with pytest.raises(ValueError):
+        EmojiMatcher([]).nearest_indices(np.zeros((1, 3), dtype=np.uint8))
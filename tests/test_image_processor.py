@@ -12,6 +12,33 @@ def client():
     with app.test_client() as client:
         yield client
 
+@pytest.fixture
+def app_with_palette(tmp_path, monkeypatch):
+    """
+    Factory for a fresh app whose palette holds the given (emoji, ascii code, hex color) rows.
+    Keyword arguments add named palettes the same way; None gives a palette whose file is missing.
+    """
+    from config.config import Config
+    from app import create_app
+
+    def write(name, rows):
+        csv_path = tmp_path / f'{name}.csv'
+        if rows is not None:
+            csv_path.write_text('Emoji,ASCII Code,Hex Color\n' + ''.join(f'{e},{c},{h}\n' for e, c, h in rows),
+                                encoding='utf-8')
+        return str(csv_path)
+
+    def make(rows, **palettes):
+        monkeypatch.setattr(Config, 'EMOJI_CSV_PATH', write('palette', rows))
+        if palettes:
+            monkeypatch.setattr(Config, 'EMOJI_PALETTES',
+                                ','.join(f'{name}={write(name, named)}' for name, named in palettes.items()))
+        test_app = create_app()
+        test_app.config['TESTING'] = True
+        return test_app
+
+    return make
+
 def create_test_image():
     """Create a test image for testing."""
     img = Image.new('RGB', (100, 100), color='blue')
@@ -183,3 +210,380 @@ def test_different_grid_sizes(client):
         assert 'grid' in result
         assert isinstance(result['grid'], list)
         assert len(result['grid']) > 0
+
+def test_process_by_upload_id(client):
+    """Test processing a previously uploaded image by reference."""
+    upload = client.post('/upload', data={'file': (create_test_image(), 'test.png')})
+    upload_id = json.loads(upload.data)['upload_id']
+
+    for size in ['8', '16']:
+        response = client.post('/process-image',
+                               content_type='multipart/form-data',
+                               data={'uploadId': upload_id, 'gridSize': size, 'aspectRatio': '1:1'})
+        assert response.status_code == 200
+        result = json.loads(response.data)
+        assert len(result['grid'][0]) == int(size)
+
+def test_process_unknown_upload_id(client):
+    """Test that unknown or malformed upload ids are rejected."""
+    data = {'uploadId': 'f' * 64, 'gridSize': '16', 'aspectRatio': '1:1'}
+    response = client.post('/process-image', content_type='multipart/form-data', data=data)
+    assert response.status_code == 404
+
+    data = {'uploadId': 'not-an-id', 'gridSize': '16', 'aspectRatio': '1:1'}
+    response = client.post('/process-image', content_type='multipart/form-data', data=data)
+    assert response.status_code == 400
+
+def test_process_image_over_budget(client):
+    """Test that a conversion costing more than the per-request budget gets 413."""
+    original = app.admission.request_budget
+    app.admission.request_budget = 1000
+    try:
+        response = client.post('/process-image',
+                               content_type='multipart/form-data',
+                               data={'image': (create_test_image(), 'test.png'),
+                                     'gridSize': '5000', 'aspectRatio': '1:1'})
+    finally:
+        app.admission.request_budget = original
+
+    assert response.status_code == 413
+    result = json.loads(response.data)
+    assert result['status'] == 'error'
+    assert 'too expensive' in result['message']
+
+def test_process_image_overloaded(client):
+    """Test that a conversion arriving while the server is at capacity gets 429 with Retry-After."""
+    admission = app.admission
+    original = admission.concurrent_budget
+    admission.concurrent_budget = 1
+    try:
+        with admission.admit(1):
+            response = client.post('/process-image',
+                                   content_type='multipart/form-data',
+                                   data={'image': (create_test_image(), 'test.png'),
+                                         'gridSize': '16', 'aspectRatio': '1:1'})
+    finally:
+        admission.concurrent_budget = original
+
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == str(admission.retry_after)
+    assert json.loads(response.data)['status'] == 'error'
+
+def test_process_image_lane_full(client, monkeypatch):
+    """Test that a conversion arriving while the heavy lane is full gets 429."""
+    from utils.lanes import LaneFullError
+
+    def full(func, inline=False):
+        raise LaneFullError('Server is busy, please retry shortly', 0, 3)
+
+    monkeypatch.setattr(app.heavy_lane, 'run', full)
+    response = client.post('/process-image',
+                           content_type='multipart/form-data',
+                           data={'image': (create_test_image(), 'test.png'),
+                                 'gridSize': '16', 'aspectRatio': '1:1'})
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '3'
+
+def test_process_image_engines(client):
+    """Test that the matching engine can be chosen per request."""
+    for engine in ['cie76', 'hsv', 'cie94', 'ciede2000']:
+        response = client.post('/process-image',
+                               content_type='multipart/form-data',
+                               data={'image': (create_test_image(), 'test.png'),
+                                     'gridSize': '8', 'aspectRatio': '1:1', 'engine': engine})
+        assert response.status_code == 200
+        assert len(json.loads(response.data)['grid']) == 8
+
+    response = client.post('/process-image',
+                           content_type='multipart/form-data',
+                           data={'image': (create_test_image(), 'test.png'),
+                                 'gridSize': '8', 'aspectRatio': '1:1', 'engine': 'nope'})
+    assert response.status_code == 400
+
+def test_process_image_dedup_matches_per_cell(app_with_palette):
+    """Test that matching distinct colors gives the same grid as matching every cell."""
+    import numpy as np
+    from utils.sampler import sample_cells
+
+    test_app = app_with_palette([('🟥', 128997, '#dd2e44'), ('🟩', 129001, '#37c136'),
+                                 ('🟦', 128998, '#3b80f5'), ('⬛', 11035, '#3c3c3c')])
+
+    rng = np.random.default_rng(1)
+    source = Image.fromarray(rng.integers(0, 256, size=(16, 16, 3), dtype=np.uint8).repeat(4, 0).repeat(4, 1))
+    img_io = BytesIO()
+    source.save(img_io, 'PNG')
+    payload = img_io.getvalue()
+
+    palette = test_app.palette_manager.current
+    expected = palette.nearest_indices(sample_cells(source, 32, 32, 1.0))
+    response = test_app.test_client().post('/process-image', content_type='multipart/form-data', data={
+        'image': (BytesIO(payload), 'test.png'), 'gridSize': '32', 'aspectRatio': '1:1'})
+    assert response.status_code == 200
+    grid = json.loads(response.data)['grid']
+    assert [[cell['emoji'] for cell in row] for row in grid] == \
+        [[palette.entries[i]['Emoji'] for i in row] for row in expected.tolist()]
+
+def test_process_image_quantize(client):
+    """Test that the quantize level is validated."""
+    for quantize, status in [('3', 200), ('8', 400), ('x', 400)]:
+        response = client.post('/process-image',
+                               content_type='multipart/form-data',
+                               data={'image': (create_test_image(), 'test.png'),
+                                     'gridSize': '8', 'aspectRatio': '1:1', 'quantize': quantize})
+        assert response.status_code == status
+
+def test_process_image_crops_to_aspect_ratio(client):
+    """Test that the image is center-cropped to the aspect ratio instead of squashed."""
+    source = Image.new('RGB', (300, 100), color='red')
+    source.paste((0, 0, 255), (100, 0, 200, 100))
+    img_io = BytesIO()
+    source.save(img_io, 'PNG')
+    img_io.seek(0)
+
+    response = client.post('/process-image',
+                           content_type='multipart/form-data',
+                           data={'image': (img_io, 'wide.png'), 'gridSize': '10', 'aspectRatio': '1:1'})
+    assert response.status_code == 200
+    grid = json.loads(response.data)['grid']
+    assert len(grid) == 10
+    assert all(len(row) == 10 for row in grid)
+
+def test_process_image_jpeg_draft(client):
+    """Test that large JPEGs decoded at reduced scale still produce the full grid."""
+    source = Image.new('RGB', (1600, 1200), color='green')
+    img_io = BytesIO()
+    source.save(img_io, 'JPEG')
+    img_io.seek(0)
+
+    response = client.post('/process-image',
+                           content_type='multipart/form-data',
+                           data={'image': (img_io, 'photo.jpg'), 'gridSize': '20', 'aspectRatio': '4:3',
+                                 'linear': 'true'})
+    assert response.status_code == 200
+    grid = json.loads(response.data)['grid']
+    assert len(grid) == 15
+    assert len(grid[0]) == 20
+
+def make_animation(frames):
+    img_io = BytesIO()
+    frames[0].save(img_io, 'GIF', save_all=True, append_images=frames[1:], duration=50, loop=0)
+    return img_io.getvalue()
+
+def test_process_image_animation_stream(app_with_palette):
+    """Test that animated GIFs stream a full first frame and then per-frame deltas."""
+    test_app = app_with_palette([('🟥', 128997, '#ff0000'), ('🟦', 128998, '#0000ff')])
+
+    frames = []
+    for step in range(4):
+        frame = Image.new('RGB', (80, 80), color='blue')
+        frame.paste((255, 0, 0), (step * 20, 0, step * 20 + 20, 20))
+        frames.append(frame)
+
+    response = test_app.test_client().post('/process-image', content_type='multipart/form-data', data={
+        'image': (BytesIO(make_animation(frames)), 'anim.gif'),
+        'gridSize': '4', 'aspectRatio': '1:1', 'animate': 'true'})
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    response.close()
+
+    assert lines[0] == {'type': 'header', 'width': 4, 'height': 4, 'frames': 4, 'loop': 0}
+    assert lines[1]['index'] == 0
+    assert lines[1]['grid'][0][0]['emoji'] == '🟥'
+    assert lines[1]['grid'][0][1]['emoji'] == '🟦'
+    # The red square moves one cell to the right per frame
+    assert sorted(lines[2]['changes']) == [[0, 0, '🟦', '#0000ff'], [0, 1, '🟥', '#ff0000']]
+    assert lines[-1]['type'] == 'end'
+    assert lines[-1]['frames'] == 4
+    assert lines[-1]['cells_matched'] < 16 * 4
+    assert test_app.admission.stats()['in_flight_requests'] == 0
+
+def test_process_animation_without_opt_in(client):
+    """Test that animated input without 'animate' converts its first frame as before."""
+    payload = make_animation([Image.new('RGB', (40, 40), color) for color in ('red', 'blue')])
+    response = client.post('/process-image',
+                           content_type='multipart/form-data',
+                           data={'image': (BytesIO(payload), 'anim.gif'), 'gridSize': '4', 'aspectRatio': '1:1'})
+    assert response.status_code == 200
+    assert len(json.loads(response.data)['grid']) == 4
+
+@pytest.mark.parametrize('option', [{'format': 'text'}, {'mosaic': 'true'}, {'deadlineMs': '1000'}])
+def test_process_animation_conflicting_options(client, option):
+    """Test that animate is refused with options its NDJSON stream can't honor."""
+    frames = [Image.new('RGB', (40, 40), color=color) for color in ('red', 'blue')]
+    response = client.post('/process-image', content_type='multipart/form-data', data={
+        'image': (BytesIO(make_animation(frames)), 'anim.gif'),
+        'gridSize': '4', 'aspectRatio': '1:1', 'animate': 'true', **option})
+    assert response.status_code == 400
+    assert next(iter(option)) in json.loads(response.data)['message']
+
+def test_process_animation_invalid_threshold(client):
+    """Test that the frame threshold is validated."""
+    response = client.post('/process-image',
+                           content_type='multipart/form-data',
+                           data={'image': (create_test_image(), 'test.png'), 'gridSize': '4',
+                                 'aspectRatio': '1:1', 'frameThreshold': '300'})
+    assert response.status_code == 400
+
+def test_process_image_deadline_final(client):
+    """Test that a generous deadline reaches the requested grid and says so."""
+    response = client.post('/process-image',
+                           content_type='multipart/form-data',
+                           data={'image': (create_test_image(), 'test.png'), 'gridSize': '32',
+                                 'aspectRatio': '1:1', 'engine': 'ciede2000', 'deadlineMs': '60000'})
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data['final'] is True
+    assert len(data['grid']) == 32
+
+def test_process_image_deadline_skips_preview(client):
+    """Test that once the speed is known, a deadline the final level fits in runs it alone."""
+    from utils.metrics import REGISTRY
+
+    def samples():
+        series = REGISTRY.snapshot()['histograms'].get('emojiart_stage_seconds', [])
+        return sum(sum(counts[:-1]) for key, counts in series if list(map(tuple, key)) == [('stage', 'sample')])
+
+    data = {'gridSize': '32', 'aspectRatio': '1:1', 'engine': 'ciede2000', 'deadlineMs': '60000'}
+    client.post('/process-image', content_type='multipart/form-data',
+                data={'image': (create_test_image(), 'test.png'), **data})
+    before = samples()
+    response = client.post('/process-image', content_type='multipart/form-data',
+                           data={'image': (create_test_image(), 'test.png'), **data})
+    assert json.loads(response.data)['final'] is True
+    assert samples() - before == 1
+
+def test_process_image_deadline_preview(client):
+    """Test that a missed deadline still returns the preview grid, marked as not final."""
+    img_io = BytesIO()
+    # Decoding alone outlasts the deadline
+    Image.effect_noise((1500, 1500), 64).convert('RGB').save(img_io, 'PNG')
+    img_io.seek(0)
+    response = client.post('/process-image',
+                           content_type='multipart/form-data',
+                           data={'image': (img_io, 'big.png'), 'gridSize': '64',
+                                 'aspectRatio': '1:1', 'deadlineMs': '1'})
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data['final'] is False
+    assert len(data['grid']) == 16
+    assert len(data['grid'][0]) == 16
+
+def test_process_image_without_deadline_has_no_flag(client):
+    """Test that the default response shape is unchanged."""
+    response = client.post('/process-image',
+                           content_type='multipart/form-data',
+                           data={'image': (create_test_image(), 'test.png'), 'gridSize': '8', 'aspectRatio': '1:1'})
+    assert 'final' not in json.loads(response.data)
+
+def test_process_image_invalid_deadline(client):
+    """Test that deadlineMs is validated."""
+    for deadline in ['0', '-5', 'soon']:
+        response = client.post('/process-image',
+                               content_type='multipart/form-data',
+                               data={'image': (create_test_image(), 'test.png'), 'gridSize': '8',
+                                     'aspectRatio': '1:1', 'deadlineMs': deadline})
+        assert response.status_code == 400
+
+def test_process_image_mosaic_windows(app_with_palette):
+    """Test that a stored mosaic is served window by window."""
+    test_app = app_with_palette([('🟥', 128997, '#ff0000'), ('🟦', 128998, '#0000ff')])
+    client = test_app.test_client()
+
+    img = Image.new('RGB', (200, 100), color='blue')
+    img.paste((255, 0, 0), (0, 0, 100, 50))
+    img_io = BytesIO()
+    img.save(img_io, 'PNG')
+    img_io.seek(0)
+    response = client.post('/process-image', content_type='multipart/form-data', data={
+        'image': (img_io, 'test.png'), 'gridSize': '200', 'aspectRatio': '2:1', 'mosaic': 'true'})
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert 'grid' not in data
+    assert (data['width'], data['height']) == (200, 100)
+    mosaic_id = data['mosaic']
+
+    response = client.get(f'/mosaics/{mosaic_id}?x=90&y=40&w=20&h=20')
+    assert response.status_code == 200
+    window = json.loads(response.data)
+    assert (window['x'], window['y'], window['width'], window['height']) == (90, 40, 20, 20)
+    assert window['grid'][0][0]['emoji'] == '🟥'
+    assert window['grid'][-1][-1]['emoji'] == '🟦'
+
+    # Windows are clipped to the mosaic
+    window = json.loads(client.get(f'/mosaics/{mosaic_id}?x=190&y=95&w=20&h=20').data)
+    assert (window['width'], window['height']) == (10, 5)
+    assert test_app.mosaic_store.cache_info()['misses'] == 3
+
+def test_mosaic_window_errors(client):
+    """Test validation of mosaic window requests."""
+    assert client.get('/mosaics/not-an-id').status_code == 400
+    assert client.get('/mosaics/' + '0' * 64).status_code == 404
+    assert client.get('/mosaics/' + '0' * 64 + '?x=-1').status_code == 400
+    assert client.get('/mosaics/' + '0' * 64 + '?w=10000&h=10000').status_code == 400
+    assert client.get('/mosaics/' + '0' * 64 + '?engine=bogus').status_code == 400
+
+def test_process_image_mosaic_too_large(client):
+    """Test that mosaics past the cell limit are refused."""
+    response = client.post('/process-image', content_type='multipart/form-data', data={
+        'image': (create_test_image(), 'test.png'), 'gridSize': '100000', 'aspectRatio': '1:1', 'mosaic': 'true'})
+    assert response.status_code == 413
+
+def test_process_image_text_format(client):
+    """Test that format=text streams one line of emoji per grid row."""
+    response = client.post('/process-image', content_type='multipart/form-data', data={
+        'image': (create_test_image(), 'test.png'), 'gridSize': '8', 'aspectRatio': '2:1', 'format': 'text'})
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    assert response.is_streamed
+    lines = response.get_data(as_text=True).splitlines()
+    assert len(lines) == 4
+    assert all(len(line) == 8 for line in lines)
+
+    response = client.post('/process-image', content_type='multipart/form-data', data={
+        'image': (create_test_image(), 'test.png'), 'gridSize': '8', 'aspectRatio': '1:1',
+        'format': 'text', 'rle': 'true', 'deadlineMs': '60000'})
+    assert response.get_data(as_text=True).splitlines() == ['{⬜|8}'] * 8
+    assert response.headers['X-Emoji-Art-Final'] == 'true'
+
+def test_process_image_invalid_format(client):
+    """Test that unknown output formats are rejected."""
+    response = client.post('/process-image', content_type='multipart/form-data', data={
+        'image': (create_test_image(), 'test.png'), 'gridSize': '8', 'aspectRatio': '1:1', 'format': 'xml'})
+    assert response.status_code == 400
+
+def test_process_image_named_palette(app_with_palette):
+    """Test that a request can pick a named palette, unknown names are rejected and broken ones fail."""
+    test_app = app_with_palette([('🟥', 128997, '#ff0000'), ('🟦', 128998, '#0000ff')],
+                                hearts=[('💙', 128153, '#0000ff')], broken=None)
+    client = test_app.test_client()
+
+    def convert(**fields):
+        return client.post('/process-image', content_type='multipart/form-data', data={
+            'image': (create_test_image(), 'test.png'), 'gridSize': '4', 'aspectRatio': '1:1', **fields})
+
+    assert json.loads(convert().data)['grid'][0][0]['emoji'] == '🟦'
+    assert json.loads(convert(palette='hearts').data)['grid'][0][0]['emoji'] == '💙'
+    assert json.loads(client.get('/emojis?palette=hearts').data)[0]['Emoji'] == '💙'
+
+    response = convert(palette='food')
+    assert response.status_code == 400
+    assert json.loads(response.data)['palettes'] == ['default', 'broken', 'hearts']
+    assert convert(palette='broken').status_code == 503
+
+def test_process_image_include_exclude(app_with_palette):
+    """Test that include/exclude restrict the emoji a conversion may use."""
+    test_app = app_with_palette([('🟦', 128998, '#0000ff'), ('🇪🇺', 127466, '#0000f0'), ('🟪', 129002, '#8000ff')])
+    client = test_app.test_client()
+
+    def first_emoji(**fields):
+        response = client.post('/process-image', content_type='multipart/form-data', data={
+            'image': (create_test_image(), 'test.png'), 'gridSize': '4', 'aspectRatio': '1:1', **fields})
+        return response.status_code, json.loads(response.data)
+
+    assert first_emoji()[1]['grid'][0][0]['emoji'] == '🟦'
+    assert first_emoji(exclude='🟦')[1]['grid'][0][0]['emoji'] == '🇪🇺'
+    assert first_emoji(exclude='🟦, flags')[1]['grid'][0][0]['emoji'] == '🟪'
+    assert first_emoji(include='🟪')[1]['grid'][0][0]['emoji'] == '🟪'
+    assert first_emoji(include='🍕')[0] == 400
+    assert first_emoji(exclude='animals')[0] == 400
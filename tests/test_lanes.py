@@ -0,0 +1,91 @@
+import threading
+import pytest
+from flask import Flask, g
+from utils.lanes import HeavyLane, LaneFullError
+
+def test_run_returns_result_on_worker_thread():
+    """Test that jobs run on the lane's threads and their result is returned."""
+    lane = HeavyLane(workers=1, queue_size=0)
+    name = lane.run(lambda: threading.current_thread().name)
+    assert name.startswith('heavy-lane')
+    assert lane.stats()['completed'] == 1
+
+def test_run_inline():
+    """Test that inline jobs run on the calling thread."""
+    lane = HeavyLane(workers=1, queue_size=0)
+    assert lane.run(threading.current_thread, inline=True) is threading.current_thread()
+
+def test_exceptions_propagate():
+    """Test that a failing job raises in the caller and frees its slot."""
+    lane = HeavyLane(workers=1, queue_size=0)
+
+    def fail():
+        raise ValueError('bad input')
+
+    with pytest.raises(ValueError):
+        lane.run(fail)
+    assert lane.run(lambda: 42) == 42
+
+def test_request_context_carried_over():
+    """Test that the job sees the caller's Flask g and request."""
+    app = Flask(__name__)
+    lane = HeavyLane(workers=1, queue_size=0)
+    with app.test_request_context('/process-image?x=1'):
+        g.marker = 'caller'
+        result = lane.run(lambda: (g.marker, g.server_timing[0][0]))
+        assert result == ('caller', 'queue')
+
+def test_full_lane_rejects():
+    """Test that jobs beyond workers + queue are refused and reported in the stats."""
+    lane = HeavyLane(workers=1, queue_size=1, retry_after=5)
+    release = threading.Event()
+    started = threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    threads = [threading.Thread(target=lane.run, args=(block,)) for _ in range(2)]
+    for t in threads:
+        t.start()
+    started.wait(5)
+    for _ in range(100):
+        if lane.stats()['queued'] == 1:
+            break
+        threading.Event().wait(0.01)
+
+    stats = lane.stats()
+    assert stats['in_flight'] == 1
+    assert stats['queued'] == 1
+    assert stats['saturation'] == 1.0
+    with pytest.raises(LaneFullError) as info:
+        lane.run(lambda: None)
+    assert info.value.status_code == 429
+    assert info.value.retry_after == 5
+
+    release.set()
+    for t in threads:
+        t.join()
+    stats = lane.stats()
+    assert stats['rejected'] == 1
+    assert stats['completed'] == 2
+    assert stats['saturation'] == 0
+
+def test_wait_for_slot():
+    """Test that a waiting job takes the slot once it frees up instead of being refused."""
+    lane = HeavyLane(workers=1, queue_size=0)
+    release = threading.Event()
+    started = threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    thread = threading.Thread(target=lane.run, args=(block,))
+    thread.start()
+    started.wait(5)
+    with pytest.raises(LaneFullError):
+        lane.run(lambda: 1, wait=0.01)
+    threading.Timer(0.05, release.set).start()
+    assert lane.run(lambda: 2, wait=None) == 2
+    thread.join(5)
@@ -0,0 +1,56 @@
+import logging
+from utils.log_config import StructuredFormatter, SamplingFilter, BackgroundLogWriter
+
+def make_record(level=logging.INFO, msg='hello %s', args=('world',), **extra):
+    record = logging.LogRecord('test', level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+def test_structured_formatter_appends_fields():
+    """Test that extra fields are rendered as key=value pairs."""
+    formatter = StructuredFormatter('%(levelname)s: %(message)s')
+    line = formatter.format(make_record(route='index', build_number=37))
+    assert line == 'INFO: hello world route=index build_number=37'
+
+def test_structured_formatter_without_fields():
+    """Test that plain records are formatted unchanged."""
+    formatter = StructuredFormatter('%(message)s')
+    assert formatter.format(make_record()) == 'hello world'
+
+def test_sampling_filter_per_route():
+    """Test that INFO records are sampled per route while others pass."""
+    sampler = SamplingFilter({'index': 0.25, 'silent': 0})
+    kept = sum(sampler.filter(make_record(route='index')) for _ in range(100))
+    assert kept == 25
+    assert not sampler.filter(make_record(route='silent'))
+    assert sampler.filter(make_record(route='upload'))
+    assert sampler.filter(make_record())
+    assert sampler.filter(make_record(level=logging.ERROR, route='silent'))
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+def test_background_writer_formats_off_thread():
+    """Test that queued records reach the handler with lazy arguments applied."""
+    target = ListHandler()
+    target.setFormatter(StructuredFormatter('%(message)s'))
+    writer = BackgroundLogWriter([target], {'index': 0.5})
+
+    logger = logging.getLogger('test_background_writer')
+    logger.propagate = False
+    logger.addHandler(writer.queue_handler)
+    logger.setLevel(logging.INFO)
+    try:
+        logger.info('loaded %d entries', 3, extra={'route': 'palette'})
+        logger.info('home', extra={'route': 'index'})
+        logger.info('home', extra={'route': 'index'})
+    finally:
+        writer.stop()
+        logger.removeHandler(writer.queue_handler)
+
+    assert target.lines == ['loaded 3 entries route=palette', 'home route=index']
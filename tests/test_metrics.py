@@ -0,0 +1,112 @@
+import json
+import os
+from io import BytesIO
+from PIL import Image
+from utils.metrics import MetricsRegistry, server_timing_header
+
+def test_counter_and_gauge_rendering():
+    """Test Prometheus text output for counters and gauges."""
+    registry = MetricsRegistry()
+    registry.inc('emojiart_cells_matched_total', 256)
+    registry.inc('emojiart_cells_matched_total', 44)
+    registry.set_gauge('emojiart_palette_entries', 1038)
+    text = registry.render()
+    assert '# TYPE emojiart_cells_matched_total counter' in text
+    assert 'emojiart_cells_matched_total 300' in text
+    assert 'emojiart_palette_entries 1038' in text
+
+def test_histogram_buckets():
+    """Test that histogram buckets are cumulative and carry sum and count."""
+    registry = MetricsRegistry(buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        registry.observe('emojiart_stage_seconds', value, stage='match')
+    text = registry.render()
+    assert 'emojiart_stage_seconds_bucket{stage="match",le="0.1"} 1' in text
+    assert 'emojiart_stage_seconds_bucket{stage="match",le="1.0"} 3' in text
+    assert 'emojiart_stage_seconds_bucket{stage="match",le="+Inf"} 4' in text
+    assert 'emojiart_stage_seconds_sum{stage="match"} 6.05' in text
+    assert 'emojiart_stage_seconds_count{stage="match"} 4' in text
+
+def test_timer_observes_stage():
+    """Test that the stage timer records one observation."""
+    registry = MetricsRegistry()
+    with registry.timer('decode'):
+        pass
+    assert 'emojiart_stage_seconds_count{stage="decode"} 1' in registry.render()
+
+def test_multiprocess_aggregation(tmp_path):
+    """Test that values written by other workers are merged into the scrape."""
+    registry = MetricsRegistry(directory=str(tmp_path), buckets=(1.0,))
+    registry.inc('emojiart_cells_matched_total', 10)
+    registry.observe('emojiart_stage_seconds', 0.5, stage='match')
+    registry.set_gauge('emojiart_palette_entries', 5)
+
+    other = {
+        'counters': {'emojiart_cells_matched_total': [[[], 32]]},
+        'gauges': {'emojiart_palette_entries': [[[], 7]]},
+        'histograms': {'emojiart_stage_seconds': [[[['stage', 'match']], [0, 1, 2.0]]]},
+    }
+    with open(tmp_path / 'metrics-1.json', 'w') as f:
+        json.dump(other, f)
+
+    text = registry.render()
+    assert 'emojiart_cells_matched_total 42' in text
+    assert 'emojiart_stage_seconds_count{stage="match"} 2' in text
+    assert 'emojiart_palette_entries{pid="1"} 7' in text
+    assert f'emojiart_palette_entries{{pid="{os.getpid()}"}} 5' in text
+
+def test_reset_keeps_gauges():
+    """Test that a forked worker starts without the parent's counters and timers."""
+    registry = MetricsRegistry()
+    registry.inc('emojiart_cells_matched_total', 10)
+    registry.observe('emojiart_stage_seconds', 0.5, stage='palette_load')
+    registry.set_gauge('emojiart_palette_entries', 5)
+    registry.reset()
+    text = registry.render()
+    assert 'emojiart_cells_matched_total' not in text
+    assert 'emojiart_stage_seconds' not in text
+    assert 'emojiart_palette_entries 5' in text
+
+def test_retire_dead_worker(tmp_path):
+    """Test that a dead worker's totals are kept after its file is removed."""
+    registry = MetricsRegistry(directory=str(tmp_path), buckets=(1.0,))
+    dead = {
+        'counters': {'emojiart_cells_matched_total': [[[], 32]]},
+        'gauges': {'emojiart_palette_entries': [[[], 7]]},
+        'histograms': {'emojiart_stage_seconds': [[[['stage', 'match']], [0, 1, 2.0]]]},
+    }
+    for pid in (1, 2):
+        with open(tmp_path / f'metrics-{pid}.json', 'w') as f:
+            json.dump(dead, f)
+    registry.retire(1)
+    registry.retire(2)
+
+    assert not (tmp_path / 'metrics-1.json').exists()
+    assert not (tmp_path / 'metrics-2.json').exists()
+    text = registry.render()
+    assert 'emojiart_cells_matched_total 64' in text
+    assert 'emojiart_stage_seconds_count{stage="match"} 2' in text
+    assert 'pid="1"' not in text and 'pid="2"' not in text
+
+def test_server_timing_header():
+    """Test the Server-Timing header format."""
+    assert server_timing_header([('decode', 0.0015), ('total', 0.01)]) == 'decode;dur=1.50, total;dur=10.00'
+
+def test_process_image_metrics(client):
+    """Test that a conversion reports its stages in Server-Timing and /metrics."""
+    img_io = BytesIO()
+    Image.new('RGB', (50, 50), color='blue').save(img_io, 'PNG')
+    img_io.seek(0)
+    response = client.post('/process-image', content_type='multipart/form-data',
+                           data={'image': (img_io, 'test.png'), 'gridSize': '8', 'aspectRatio': '1:1'})
+    assert response.status_code == 200
+    timing = response.headers['Server-Timing']
+    for stage in ('decode', 'sample', 'encode', 'total'):
+        assert f'{stage};dur=' in timing
+
+    metrics = client.get('/metrics')
+    assert metrics.status_code == 200
+    assert metrics.content_type.startswith('text/plain')
+    body = metrics.data.decode()
+    assert 'emojiart_stage_seconds_count{stage="decode"}' in body
+    assert 'emojiart_requests_total{endpoint="process_image",status="200"}' in body
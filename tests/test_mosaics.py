@@ -0,0 +1,66 @@
+import os
+import numpy as np
+import pytest
+from utils.mosaics import MosaicStore
+from utils.palette import EmojiPalette
+
+ENTRIES = [
+    {'Emoji': '🟥', 'ASCII Code': '128997', 'Hex Color': '#ff0000'},
+    {'Emoji': '🟩', 'ASCII Code': '129001', 'Hex Color': '#00ff00'},
+    {'Emoji': '🟦', 'ASCII Code': '128998', 'Hex Color': '#0000ff'},
+]
+
+@pytest.fixture
+def palette():
+    return EmojiPalette(ENTRIES, version=1)
+
+@pytest.fixture
+def cells():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, (50, 70, 3), dtype=np.uint8)
+
+def test_put_is_content_addressed(tmp_path, cells):
+    """Test that the same cells are stored once under the same id."""
+    store = MosaicStore(str(tmp_path), tile_size=16)
+    mosaic_id = store.put(cells)
+    assert store.put(cells) == mosaic_id
+    assert store.is_valid_id(mosaic_id)
+    assert os.path.exists(store.path(mosaic_id))
+    assert np.array_equal(store.load(mosaic_id), cells)
+    assert store.load('0' * 64) is None
+    assert store.load('../etc') is None
+
+def test_window_matches_whole_grid(tmp_path, cells, palette):
+    """Test that any window equals the same slice of the fully matched grid."""
+    store = MosaicStore(str(tmp_path), tile_size=16)
+    mosaic_id = store.put(cells)
+    expected = palette.nearest_indices(cells)
+    for x, y, w, h in [(0, 0, 70, 50), (5, 3, 20, 30), (60, 40, 50, 50), (15, 15, 2, 2)]:
+        window = store.window(mosaic_id, x, y, w, h, palette)
+        assert np.array_equal(window, expected[y:y + h, x:x + w])
+    assert store.window(mosaic_id, 100, 0, 10, 10, palette).size == 0
+    assert store.window('0' * 64, 0, 0, 10, 10, palette) is None
+
+def test_tiles_matched_once(tmp_path, cells, palette):
+    """Test that overlapping windows only match tiles that are not cached yet."""
+    store = MosaicStore(str(tmp_path), tile_size=16)
+    mosaic_id = store.put(cells)
+    store.window(mosaic_id, 0, 0, 16, 16, palette)
+    assert store.cache_info()['misses'] == 1
+    store.window(mosaic_id, 8, 0, 16, 16, palette)
+    info = store.cache_info()
+    assert (info['hits'], info['misses'], info['tiles']) == (1, 2, 2)
+
+    # Another engine or palette version has its own tiles
+    store.window(mosaic_id, 0, 0, 16, 16, palette, engine='cie94')
+    store.window(mosaic_id, 0, 0, 16, 16, EmojiPalette(ENTRIES, version=2))
+    assert store.cache_info()['misses'] == 4
+
+def test_tile_cache_bounded(tmp_path, cells, palette):
+    """Test that the least recently used tiles are evicted past the cache size."""
+    store = MosaicStore(str(tmp_path), tile_size=16, cache_tiles=3)
+    mosaic_id = store.put(cells)
+    store.window(mosaic_id, 0, 0, 70, 50, palette)
+    assert store.cache_info()['tiles'] == 3
+    expected = palette.nearest_indices(cells)
+    assert np.array_equal(store.window(mosaic_id, 0, 0, 70, 50, palette), expected)
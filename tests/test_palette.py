@@ -0,0 +1,317 @@
+import pytest
+import os
+import csv
+import json
+import numpy as np
+from utils.palette import EmojiPalette, PaletteManager, PaletteUnavailableError
+from utils.color_utils import color_distance
+
+PALETTE_ROWS = [
+    ['🟥', '128997', '#dd2e44'],
+    ['🟩', '129001', '#37c136'],
+    ['🟦', '128998', '#3b80f5'],
+    ['⬛', '11035', '#3c3c3c'],
+    ['⬜', '11036', '#f5f5f5'],
+]
+
+def write_palette(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Emoji', 'ASCII Code', 'Hex Color'])
+        writer.writerows(rows)
+
+@pytest.fixture
+def palette_csv(tmp_path):
+    path = str(tmp_path / 'palette.csv')
+    write_palette(path, PALETTE_ROWS)
+    return path
+
+def test_palette_snapshot_arrays(palette_csv):
+    """Test that a snapshot exposes read-only color arrays."""
+    palette = EmojiPalette.from_csv(palette_csv, version=3)
+    assert len(palette) == 5
+    assert palette.version == 3
+    assert palette.rgb.shape == (5, 3)
+    assert palette.lab.shape == (5, 3)
+    assert palette.digest is not None
+    with pytest.raises(ValueError):
+        palette.rgb[0, 0] = 1
+
+def test_palette_digest_from_single_read(palette_csv, monkeypatch):
+    """Test that the digest is taken from the same read the entries are parsed from."""
+    import builtins
+    import hashlib
+    with open(palette_csv, 'rb') as f:
+        expected = hashlib.sha256(f.read()).hexdigest()
+    opened = []
+    original_open = builtins.open
+
+    def counting_open(file, *args, **kwargs):
+        if file == palette_csv:
+            opened.append(file)
+        return original_open(file, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, 'open', counting_open)
+    palette = EmojiPalette.from_csv(palette_csv)
+    assert palette.digest == expected
+    assert len(opened) == 1
+
+def test_nearest_matches_color_distance(palette_csv):
+    """Test that vectorized matching agrees with the scalar CIE76 distance."""
+    palette = EmojiPalette.from_csv(palette_csv)
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, size=(200, 3), dtype=np.uint8)
+
+    indices = palette.nearest_indices(pixels)
+    for pixel, index in zip(pixels, indices):
+        hex_color = '#%02x%02x%02x' % tuple(pixel)
+        expected = min(palette.entries, key=lambda e: color_distance(hex_color, e['Hex Color']))
+        assert color_distance(hex_color, palette.entries[index]['Hex Color']) == pytest.approx(
+            color_distance(hex_color, expected['Hex Color']))
+
+def test_nearest_keeps_shape(palette_csv):
+    """Test that nearest_indices returns one index per pixel of an image array."""
+    palette = EmojiPalette.from_csv(palette_csv)
+    image = np.zeros((4, 7, 3), dtype=np.uint8)
+    assert palette.nearest_indices(image).shape == (4, 7)
+
+def test_manager_reloads_on_change(palette_csv):
+    """Test that a changed file produces a new version while old snapshots stay intact."""
+    manager = PaletteManager(palette_csv, poll_interval=0)
+    assert manager.reload(force=True)
+    first = manager.current
+    assert len(first) == 5
+
+    # Unchanged file does not swap
+    assert not manager.reload()
+    assert manager.current is first
+
+    write_palette(palette_csv, PALETTE_ROWS[:2])
+    os.utime(palette_csv, ns=(0, 1))
+    assert manager.reload()
+    assert manager.current.version == first.version + 1
+    assert len(manager.current) == 2
+    # In-flight holders of the old snapshot are unaffected
+    assert len(first) == 5
+
+def test_manager_keeps_snapshot_on_bad_file(palette_csv):
+    """Test that an invalid file keeps the previous palette."""
+    manager = PaletteManager(palette_csv, poll_interval=0)
+    manager.reload(force=True)
+    before = manager.current
+
+    with open(palette_csv, 'w', encoding='utf-8') as f:
+        f.write('wrong,headers\n')
+    os.utime(palette_csv, ns=(0, 1))
+    assert not manager.reload()
+    assert manager.current is before
+
+def test_manager_notifies_listeners(palette_csv):
+    """Test that listeners receive every new snapshot."""
+    manager = PaletteManager(palette_csv, poll_interval=0)
+    seen = []
+    manager.add_listener(lambda palette: seen.append(palette.version))
+    manager.reload(force=True)
+    manager.reload(force=True)
+    assert seen == [1, 2]
+
+def test_admin_reload_requires_token(app, client):
+    """Test that the admin reload route is hidden without a token and guarded with one."""
+    app.config['ADMIN_TOKEN'] = None
+    assert client.post('/admin/reload-palette').status_code == 404
+
+    app.config['ADMIN_TOKEN'] = 'secret'
+    assert client.post('/admin/reload-palette').status_code == 403
+
+    response = client.post('/admin/reload-palette', headers={'X-Admin-Token': 'secret'})
+    assert response.status_code == 202
+    assert json.loads(response.data)['status'] == 'accepted'
+
+def test_nearest_hsv_engine(palette_csv):
+    """Test that the HSV engine agrees with EmojiMatcher's per-color matching."""
+    palette = EmojiPalette.from_csv(palette_csv)
+    pixels = np.array([[[250, 10, 10], [20, 30, 200]], [[128, 128, 128], [40, 210, 40]]], dtype=np.uint8)
+    indices = palette.nearest_indices(pixels, engine='hsv')
+    assert indices.shape == (2, 2)
+
+    matcher = palette.matcher()
+    assert palette.matcher() is matcher
+    for (r, g, b), index in zip(pixels.reshape(-1, 3), indices.ravel()):
+        expected = matcher.find_closest_emoji(f'#{r:02x}{g:02x}{b:02x}')
+        assert palette.entries[index]['Emoji'] == expected['emoji']
+
+def test_nearest_unknown_engine(palette_csv):
+    """Test that an unknown engine is rejected."""
+    palette = EmojiPalette.from_csv(palette_csv)
+    with pytest.raises(ValueError):
+        palette.nearest_indices(np.zeros((1, 3), dtype=np.uint8), engine='nope')
+
+@pytest.mark.parametrize('engine, metric', [('cie94', 'delta_e_cie94'), ('ciede2000', 'delta_e_ciede2000')])
+def test_nearest_refined_engines(palette_csv, engine, metric):
+    """Test that the CIE94 and CIEDE2000 engines pick the entry with the smallest difference."""
+    import utils.color_utils as color_utils
+    palette = EmojiPalette.from_csv(palette_csv)
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, size=(30, 20, 3), dtype=np.uint8)
+    indices = palette.nearest_indices(pixels, engine=engine)
+    assert indices.shape == (30, 20)
+
+    lab = color_utils.rgb_array_to_lab(pixels.reshape(-1, 3))
+    distances = getattr(color_utils, metric)(lab[:, None, :], palette.lab[None, :, :])
+    assert np.array_equal(indices.ravel(), distances.argmin(axis=1))
+
+def test_ciede2000_shortlist(tmp_path, monkeypatch):
+    """Test that CIEDE2000 still finds the best entry when only a shortlist is re-ranked."""
+    import utils.palette as palette_module
+    from utils.color_utils import rgb_array_to_lab, delta_e_ciede2000
+    monkeypatch.setattr(palette_module, 'CIEDE2000_CANDIDATES', 3)
+    rows = [[chr(0x1F300 + i), str(0x1F300 + i), f'#{i * 30:02x}{255 - i * 30:02x}{i * 25:02x}'] for i in range(8)]
+    path = str(tmp_path / 'palette.csv')
+    write_palette(path, rows)
+    palette = EmojiPalette.from_csv(path)
+    assert len(palette) == 8
+
+    pixels = np.array([[i * 30 + 5, 250 - i * 30, i * 25] for i in range(8)], dtype=np.uint8)
+    expected = delta_e_ciede2000(rgb_array_to_lab(pixels)[:, None, :], palette.lab[None]).argmin(axis=1)
+    assert np.array_equal(palette.nearest_indices(pixels, engine='ciede2000'), expected)
+
+def test_parse_palette_paths():
+    """Test parsing of the EMOJI_PALETTES setting."""
+    from utils.palette import parse_palette_paths
+    assert parse_palette_paths('squares=a.csv, food = b.csv,') == {'squares': 'a.csv', 'food': 'b.csv'}
+    assert parse_palette_paths('') == {}
+    for spec in ('squares', 'Bad Name=a.csv', 'default=a.csv', 'squares='):
+        with pytest.raises(ValueError):
+            parse_palette_paths(spec)
+
+def test_registry_builds_palettes_lazily(tmp_path, palette_csv):
+    """Test that named palettes are only built when first requested."""
+    from utils.palette import PaletteRegistry
+    squares = str(tmp_path / 'squares.csv')
+    write_palette(squares, PALETTE_ROWS[:3])
+    registry = PaletteRegistry({'squares': squares, 'missing': str(tmp_path / 'missing.csv')},
+                               default=PaletteManager(palette_csv, poll_interval=0), poll_interval=0)
+    registry.default.reload(force=True)
+
+    assert registry.names() == ['default', 'missing', 'squares']
+    assert registry.stats()['squares'] == {'loaded': False}
+    assert len(registry.get()) == 5
+    assert len(registry.get('squares')) == 3
+    assert registry.get('squares') is registry.get('squares')
+    assert registry.stats()['squares'] == {'loaded': True, 'version': 1, 'entries': 3}
+    # A palette whose file is missing is an error, and is retried once the file appears
+    with pytest.raises(PaletteUnavailableError):
+        registry.get('missing')
+    assert registry.stats()['missing'] == {'loaded': False}
+    write_palette(str(tmp_path / 'missing.csv'), PALETTE_ROWS[:2])
+    assert len(registry.get('missing')) == 2
+    with pytest.raises(ValueError):
+        registry.get('hearts')
+
+def test_registry_shares_entries(tmp_path, palette_csv):
+    """Test that an entry in several palettes is held once."""
+    from utils.palette import PaletteRegistry
+    squares = str(tmp_path / 'squares.csv')
+    write_palette(squares, PALETTE_ROWS[1:3] + [['🟨', '129000', '#fdcb58']])
+    registry = PaletteRegistry({'squares': squares}, default=PaletteManager(palette_csv, poll_interval=0),
+                               poll_interval=0)
+    registry.default.reload(force=True)
+
+    full, subset = registry.get(), registry.get('squares')
+    assert subset.entries[0] is full.entries[1]
+    assert subset.entries[1] is full.entries[2]
+    assert subset.entries[2]['Emoji'] == '🟨'
+    # Each palette still matches against its own entries
+    assert subset.nearest_indices(np.array([[55, 193, 54], [253, 203, 88]])).tolist() == [0, 2]
+
+def test_registry_prunes_interned_entries(tmp_path, palette_csv):
+    """Test that entries dropped from every palette leave the intern table."""
+    from utils.palette import PaletteRegistry
+    registry = PaletteRegistry({}, default=PaletteManager(palette_csv, poll_interval=0), poll_interval=0)
+    registry.default.reload(force=True)
+    assert len(registry._interned) == 5
+
+    write_palette(palette_csv, PALETTE_ROWS[:2])
+    registry.default.reload(force=True)
+    assert sorted(key[0] for key in registry._interned) == sorted(['🟥', '🟩'])
+
+def test_registry_builds_outside_lock(tmp_path, palette_csv, monkeypatch):
+    """Test that building a palette doesn't hold up requests for palettes already loaded."""
+    import threading
+    from utils.palette import PaletteRegistry
+    squares = str(tmp_path / 'squares.csv')
+    write_palette(squares, PALETTE_ROWS[:3])
+    registry = PaletteRegistry({'squares': squares}, default=PaletteManager(palette_csv, poll_interval=0),
+                               poll_interval=0)
+    registry.default.reload(force=True)
+
+    started, release = threading.Event(), threading.Event()
+    original = EmojiPalette.from_csv.__func__
+
+    def slow_from_csv(cls, *args, **kwargs):
+        started.set()
+        release.wait(5)
+        return original(cls, *args, **kwargs)
+
+    monkeypatch.setattr(EmojiPalette, 'from_csv', classmethod(slow_from_csv))
+    builder = threading.Thread(target=registry.get, args=('squares',))
+    builder.start()
+    assert started.wait(5)
+    try:
+        # Would block on the registry lock while squares is being built
+        assert len(registry.loaded()) == 1
+        assert len(registry.get()) == 5
+    finally:
+        release.set()
+        builder.join(5)
+    assert len(registry.get('squares')) == 3
+
+@pytest.mark.parametrize('engine', ['cie76', 'hsv', 'cie94', 'ciede2000'])
+def test_masked_matching(palette_csv, engine):
+    """Test that a mask gives the same matches as a palette of only the allowed entries."""
+    palette = EmojiPalette.from_csv(palette_csv)
+    mask = np.array([True, False, True, False, True])
+    subset = EmojiPalette([e for e, keep in zip(palette.entries, mask) if keep])
+    rng = np.random.default_rng(3)
+    pixels = rng.integers(0, 256, (500, 3), dtype=np.uint8)
+
+    masked = palette.nearest_indices(pixels, engine, mask)
+    assert mask[masked].all()
+    assert np.array_equal(masked, np.flatnonzero(mask)[subset.nearest_indices(pixels, engine)])
+    with pytest.raises(ValueError):
+        palette.nearest_indices(pixels, engine, np.zeros(5, dtype=bool))
+
+def test_registry_select(tmp_path, palette_csv):
+    """Test include/exclude selections by emoji, palette name and built-in category."""
+    from utils.palette import PaletteRegistry, MaskedPalette
+    flags = str(tmp_path / 'with_flags.csv')
+    write_palette(flags, PALETTE_ROWS + [['🇫🇷', '127467', '#3b80f5'], ['🏴‍☠️', '127988', '#3c3c3c']])
+    greens = str(tmp_path / 'greens.csv')
+    write_palette(greens, [['🟩', '129001', '#37c136']])
+    registry = PaletteRegistry({'greens': greens}, default=PaletteManager(flags, poll_interval=0), poll_interval=0)
+    registry.default.reload(force=True)
+    palette = registry.get()
+
+    def allowed(**selection):
+        view = registry.select(palette, **selection)
+        return [e['Emoji'] for e, keep in zip(palette.entries, view.mask) if keep]
+
+    assert registry.select(palette) is palette
+    assert allowed(exclude=['flags']) == ['🟥', '🟩', '🟦', '⬛', '⬜']
+    assert allowed(include=['flags']) == ['🇫🇷', '🏴‍☠️']
+    assert allowed(include=['🟥', 'greens']) == ['🟥', '🟩']
+    assert allowed(include=['flags', '⬛'], exclude=['🇫🇷']) == ['⬛', '🏴‍☠️']
+
+    # Repeated selections are served from the cache, in any order
+    view = registry.select(palette, include=['🟥', 'greens'])
+    assert isinstance(view, MaskedPalette)
+    assert registry.select(palette, include=['greens', '🟥']) is view
+    assert registry.select(palette, include=['🟥']) is not view
+    assert view.nearest_indices(np.array([[221, 46, 68], [55, 193, 54]])).tolist() == [0, 1]
+    # Blue has to settle for an allowed entry
+    assert view.nearest_indices(np.array([[59, 128, 245]]))[0] in (0, 1)
+
+    with pytest.raises(ValueError):
+        registry.select(palette, exclude=['animals'])
+    with pytest.raises(ValueError):
+        registry.select(palette, include=['🍕'])
@@ -0,0 +1,77 @@
+import os
+import pytest
+from app import create_app
+from config.config import Config
+from utils.profiling import RequestProfiler
+
+@pytest.fixture
+def profiled_app(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'PROFILING_ENABLED', True)
+    monkeypatch.setattr(Config, 'PROFILE_DIR', str(tmp_path))
+    monkeypatch.setattr(Config, 'ADMIN_TOKEN', 'secret')
+    app = create_app()
+    app.config['TESTING'] = True
+    return app
+
+def busy():
+    return sum(i * i for i in range(20000))
+
+def test_profiler_saves_and_summarizes(tmp_path):
+    """Test that a profile is written and its hot functions can be listed."""
+    profiler = RequestProfiler(str(tmp_path), sample_rate=0, keep=5)
+    profile = profiler.begin()
+    busy()
+    name = profiler.end(profile, {'endpoint': 'test'})
+
+    assert os.path.exists(tmp_path / name)
+    recent = profiler.recent()
+    assert recent[0]['name'] == name
+    assert recent[0]['endpoint'] == 'test'
+    assert any('busy' in f['function'] or 'genexpr' in f['function'] for f in recent[0]['top_functions'])
+
+def test_profiler_keeps_recent_only(tmp_path):
+    """Test that old profiles are pruned."""
+    profiler = RequestProfiler(str(tmp_path), sample_rate=0, keep=2)
+    for i in range(4):
+        profiler.end(profiler.begin(), {'endpoint': f'e{i}'})
+    assert len([n for n in os.listdir(tmp_path) if n.endswith('.prof')]) == 2
+
+def test_profiler_names_unique(tmp_path):
+    """Test that profiles of the same endpoint within one second get distinct names."""
+    profiler = RequestProfiler(str(tmp_path), sample_rate=0, keep=5)
+    names = {profiler.end(profiler.begin(), {'endpoint': 'same'}) for _ in range(3)}
+    assert len(names) == 3
+    assert len([n for n in os.listdir(tmp_path) if n.endswith('.prof')]) == 3
+
+def test_profiler_one_at_a_time(tmp_path):
+    """Test that overlapping profiles are skipped instead of nested."""
+    profiler = RequestProfiler(str(tmp_path), sample_rate=0)
+    first = profiler.begin()
+    assert profiler.begin() is None
+    profiler.end(first, {})
+
+def test_profiling_disabled_by_default(client):
+    """Test that no profile is taken when profiling is off."""
+    response = client.get('/', headers={'X-Profile': '1'})
+    assert 'X-Profile-Name' not in response.headers
+
+def test_profile_requested_by_admin(profiled_app, tmp_path):
+    """Test that admins can profile a request and list it afterwards."""
+    client = profiled_app.test_client()
+
+    # Header alone is not enough
+    response = client.get('/', headers={'X-Profile': '1'})
+    assert 'X-Profile-Name' not in response.headers
+
+    response = client.get('/', headers={'X-Profile': '1', 'X-Admin-Token': 'secret'})
+    name = response.headers['X-Profile-Name']
+    assert (tmp_path / name).exists()
+
+    listing = client.get('/admin/profiles', headers={'X-Admin-Token': 'secret'}).get_json()
+    assert listing['profiles'][0]['name'] == name
+    assert listing['profiles'][0]['endpoint'] == 'index'
+    assert listing['profiles'][0]['top_functions']
+
+    download = client.get(f'/admin/profiles/{name}', headers={'X-Admin-Token': 'secret'})
+    assert download.status_code == 200
+    assert client.get('/admin/profiles/../app.py', headers={'X-Admin-Token': 'secret'}).status_code == 404
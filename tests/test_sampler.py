@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from io import BytesIO
+from PIL import Image
+from utils.sampler import crop_box, request_draft, sample_cells
+
+def test_crop_box_centered():
+    """Test that the crop keeps the largest centered area of the aspect ratio."""
+    assert crop_box(300, 100, 1.0) == (100, 0, 200, 100)
+    assert crop_box(100, 300, 1.0) == (0, 100, 100, 200)
+    assert crop_box(160, 90, 16 / 9) == (0, 0, 160, 90)
+    assert crop_box(100, 100, 2.0) == (0, 25, 100, 75)
+
+def test_sample_cells_crops_before_averaging():
+    """Test that cells only average pixels inside the crop."""
+    image = Image.new('RGB', (300, 100), color='red')
+    image.paste((0, 0, 255), (100, 0, 200, 100))
+    cells = sample_cells(image, 4, 4, 1.0)
+    assert cells.shape == (4, 4, 3)
+    assert (cells == [0, 0, 255]).all()
+    assert (sample_cells(image, 4, 4, 1.0, linear=True) == [0, 0, 255]).all()
+
+@pytest.mark.parametrize('size', [(64, 64), (70, 45)])
+def test_sample_cells_area_average(size):
+    """Test that each cell is the mean of its block, on integer and fractional reductions."""
+    pixels = np.zeros(size[::-1] + (3,), dtype=np.uint8)
+    pixels[:, : size[0] // 2] = 200
+    cells = sample_cells(Image.fromarray(pixels), 2, 1, size[0] / size[1])
+    assert cells.shape == (1, 2, 3)
+    assert abs(int(cells[0, 0, 0]) - 200) <= 1
+    assert int(cells[0, 1, 0]) <= 1
+
+def test_sample_cells_linear_light():
+    """Test that linear-light averaging of black and white gives the perceptual mid-gray."""
+    pixels = np.zeros((64, 64, 3), dtype=np.uint8)
+    pixels[::2, ::2] = 255
+    pixels[1::2, 1::2] = 255
+    image = Image.fromarray(pixels)
+    assert sample_cells(image, 8, 8, 1.0)[0, 0].tolist() == [128, 128, 128]
+    assert sample_cells(image, 8, 8, 1.0, linear=True)[0, 0].tolist() == [188, 188, 188]
+
+def test_sample_cells_converts_mode():
+    """Test that grayscale and palette images are sampled as RGB."""
+    assert sample_cells(Image.new('L', (37, 23), 200), 10, 5, 2.0)[0, 0].tolist() == [200, 200, 200]
+    assert sample_cells(Image.new('P', (50, 50)), 5, 5, 1.0).shape == (5, 5, 3)
+
+def test_request_draft_reduces_jpeg():
+    """Test that JPEG decoding is scaled down but keeps at least two pixels per cell."""
+    buffer = BytesIO()
+    Image.new('RGB', (1600, 1200), color='blue').save(buffer, 'JPEG')
+    buffer.seek(0)
+    image = Image.open(buffer)
+    request_draft(image, 20, 15, 4 / 3)
+    image.load()
+    assert image.width < 1600
+    assert image.width >= 40 and image.height >= 30
@@ -0,0 +1,30 @@
+from utils.startup import StartupTimer, memory_usage
+
+def test_memory_usage():
+    """Test that memory usage reports a positive RSS."""
+    usage = memory_usage()
+    assert usage['rss'] > 0
+
+def test_startup_timer_phases():
+    """Test that startup phases are recorded."""
+    timer = StartupTimer()
+    with timer.phase('palette'):
+        pass
+    summary = timer.summary()
+    assert 'palette' in summary['phases']
+    assert summary['total_seconds'] >= summary['phases']['palette']
+    assert summary['memory']['rss'] > 0
+
+def test_app_records_startup_stats(app):
+    """Test that the app factory records its startup timings."""
+    assert 'palette' in app.startup_stats['phases']
+
+def test_app_import_defers_pil():
+    """Test that creating the app doesn't import PIL until an image is converted."""
+    import os
+    import subprocess
+    import sys
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = "import sys, app; sys.exit('PIL' in sys.modules)"
+    result = subprocess.run([sys.executable, '-c', code], cwd=root, capture_output=True)
+    assert result.returncode == 0
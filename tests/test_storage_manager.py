@@ -0,0 +1,82 @@
+import hashlib
+import os
+import time
+import pytest
+from io import BytesIO
+from PIL import Image
+from utils.upload_store import UploadStore
+from utils.storage_manager import StorageManager
+
+def add_upload(store, color, age):
+    """Store a small image and backdate its last access by `age` seconds."""
+    buffer = BytesIO()
+    Image.new('RGB', (8, 8), color=color).save(buffer, 'PNG')
+    payload = buffer.getvalue()
+    upload_id, _ = store.put(BytesIO(payload), hashlib.sha256(payload).hexdigest(), 'png')
+    stamp = time.time() - age
+    for name in os.listdir(os.path.join(store.root, upload_id[:2])):
+        if name.startswith(upload_id):
+            os.utime(os.path.join(store.root, upload_id[:2], name), (stamp, stamp))
+    return upload_id
+
+@pytest.fixture
+def store(tmp_path):
+    return UploadStore(str(tmp_path))
+
+def test_sweep_reports_usage(store):
+    """Test that a sweep with no pressure keeps everything and reports usage."""
+    add_upload(store, 'red', 10)
+    manager = StorageManager(store, quota_bytes=0, ttl_seconds=0, sweep_interval=0)
+    assert manager.sweep() == 0
+    stats = manager.stats()
+    assert stats['uploads'] == 1
+    assert stats['files'] == 2
+    assert stats['bytes'] > 0
+    assert stats['sweeps'] == 1
+
+def test_sweep_evicts_expired(store):
+    """Test that uploads not accessed within the TTL are removed."""
+    old = add_upload(store, 'red', 1000)
+    fresh = add_upload(store, 'blue', 10)
+    manager = StorageManager(store, quota_bytes=0, ttl_seconds=500, sweep_interval=0)
+    assert manager.sweep() == 1
+    assert not store.exists(old)
+    assert store.exists(fresh)
+    assert manager.stats()['evictions'] == 1
+
+def test_sweep_evicts_least_recently_used(store):
+    """Test that quota pressure evicts the least recently accessed uploads first."""
+    oldest = add_upload(store, 'red', 300)
+    middle = add_upload(store, 'green', 200)
+    newest = add_upload(store, 'blue', 100)
+
+    # Reading an upload makes it the most recently used
+    store.load_normalized(oldest)
+
+    usage = StorageManager(store, quota_bytes=0, ttl_seconds=0, sweep_interval=0)
+    usage.sweep()
+    total = usage.stats()['bytes']
+
+    manager = StorageManager(store, quota_bytes=total - 1, ttl_seconds=0, sweep_interval=0)
+    assert manager.sweep() == 1
+    assert store.exists(oldest)
+    assert not store.exists(middle)
+    assert store.exists(newest)
+    assert manager.stats()['bytes'] < total
+
+def test_sweep_removes_stale_temp_files(store):
+    """Test that abandoned temporary files are cleaned up."""
+    bucket = os.path.join(store.root, 'ab')
+    os.makedirs(bucket)
+    stale = os.path.join(bucket, '.upload-abc')
+    open(stale, 'w').close()
+    os.utime(stale, (0, 0))
+    StorageManager(store, quota_bytes=0, ttl_seconds=0, sweep_interval=0).sweep()
+    assert not os.path.exists(stale)
+
+def test_storage_stats_route(app, client):
+    """Test the admin storage report."""
+    app.config['ADMIN_TOKEN'] = 'secret'
+    response = client.get('/admin/storage', headers={'X-Admin-Token': 'secret'})
+    assert response.status_code == 200
+    assert 'evictions' in response.get_json()['storage']
@@ -0,0 +1,35 @@
+import re
+import numpy as np
+from utils.text_export import encode_rows
+
+EMOJIS = ['🟥', '🟦', '⬜']
+
+def test_encode_rows_plain():
+    """Test that each row becomes one line of emoji."""
+    indices = np.array([[0, 1, 1], [2, 2, 0]])
+    assert list(encode_rows(indices, EMOJIS)) == ['🟥🟦🟦\n', '⬜⬜🟥\n']
+
+def test_encode_rows_rle():
+    """Test that only runs of three or more are compressed."""
+    indices = [np.array([0, 0, 1, 1, 1, 1, 2]), np.array([1] * 12)]
+    assert list(encode_rows(indices, EMOJIS, rle=True)) == ['🟥🟥{🟦|4}⬜\n', '{🟦|12}\n']
+
+def expand(packed):
+    return re.sub(r'\{([^{}|]+)\|(\d+)\}', lambda m: m.group(1) * int(m.group(2)), packed)
+
+def test_encode_rows_rle_roundtrip():
+    """Test that run-length text expands back to the plain rows."""
+    rng = np.random.default_rng(1)
+    indices = np.repeat(rng.integers(0, 3, (10, 20)), rng.integers(1, 5, 20), axis=1)
+    plain = ''.join(encode_rows(indices, EMOJIS))
+    packed = ''.join(encode_rows(indices, EMOJIS, rle=True))
+    assert len(packed.encode()) < len(plain.encode())
+    assert expand(packed) == plain
+
+def test_encode_rows_rle_multi_codepoint():
+    """Test that runs of emoji made of several code points expand back whole."""
+    emojis = ['❤️', '👍🏽', '1️⃣', '🇺🇸']
+    indices = np.array([[0, 0, 0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3, 0]])
+    packed = ''.join(encode_rows(indices, emojis, rle=True))
+    assert packed == '{❤️|4}{👍🏽|3}{1️⃣|3}{🇺🇸|3}❤️\n'
+    assert expand(packed) == ''.join(encode_rows(indices, emojis))
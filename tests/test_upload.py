@@ -71,3 +71,68 @@ def cleanup_uploads():
         for file in os.listdir(upload_dir):
             os.remove(os.path.join(upload_dir, file))
         os.rmdir(upload_dir)
+
+def test_upload_rejects_disguised_file(client):
+    """Test that a file with an image extension but non-image content is rejected."""
+    data = {
+        'file': (BytesIO(b'not an image'), 'fake.png')
+    }
+    response = client.post('/upload', data=data)
+    assert response.status_code == 400
+    assert b'Invalid file type' in response.data
+
+def test_upload_returns_digest(client):
+    """Test that the upload response carries the content hash computed while receiving."""
+    import hashlib
+    payload = create_test_image().getvalue()
+    expected = hashlib.sha256(payload).hexdigest()
+
+    response = client.post('/upload', data={'file': (BytesIO(payload), 'test.png')})
+    assert response.status_code == 200
+    assert response.get_json()['sha256'] == expected
+    assert response.get_json()['size'] == len(payload)
+
+def test_upload_duplicate_detected(client):
+    """Test that uploading the same image twice is reported as a duplicate."""
+    payload = create_test_image(size=(37, 41)).getvalue()
+    first = client.post('/upload', data={'file': (BytesIO(payload), 'a.png')}).get_json()
+    second = client.post('/upload', data={'file': (BytesIO(payload), 'b.png')}).get_json()
+    assert first['upload_id'] == second['upload_id']
+    assert second['duplicate'] is True
+
+def test_upload_refused_while_receiving(client, monkeypatch):
+    """Test that non-image content is refused before the body is spooled to disk."""
+    from utils import upload_stream
+    spooled = []
+    original_write = upload_stream.HashingSpool.write
+
+    def write(self, data):
+        result = original_write(self, data)
+        spooled.append(len(data))
+        return result
+
+    monkeypatch.setattr(upload_stream.HashingSpool, 'write', write)
+    data = {'file': (BytesIO(b'GIF89a' + b'x' * (2 * 1024 * 1024)), 'fake.png')}
+    response = client.post('/upload', data=data)
+    assert response.status_code == 400
+    assert b'Invalid file type' in response.data
+    assert sum(spooled) == 0
+
+def test_upload_over_budget(app, client):
+    """Test that an upload too large to normalize within the request budget is refused."""
+    app.admission.request_budget = 1
+    response = client.post('/upload', data={'file': (create_test_image(), 'big.png')})
+    assert response.status_code == 413
+    assert 'too expensive' in response.get_json()['message']
+
+def test_upload_lane_full(app, client, monkeypatch):
+    """Test that an upload arriving while the heavy lane is full gets 429."""
+    from utils.lanes import LaneFullError
+
+    def full(func, inline=False):
+        raise LaneFullError('Server is busy, please retry shortly', 0, 3)
+
+    monkeypatch.setattr(app.heavy_lane, 'run', full)
+    response = client.post('/upload', data={'file': (create_test_image(size=(43, 29)), 'test.png')})
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '3'
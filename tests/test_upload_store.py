@@ -0,0 +1,69 @@
+import hashlib
+import os
+import pytest
+from io import BytesIO
+from PIL import Image
+from utils.upload_store import UploadStore, InvalidUploadError
+
+def png_bytes(size=(40, 20), color='red'):
+    buffer = BytesIO()
+    Image.new('RGB', size, color=color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+@pytest.fixture
+def store(tmp_path):
+    return UploadStore(str(tmp_path), normalized_max_side=16, chunk_size=1024)
+
+def test_put_stores_by_content_hash(store):
+    """Test that uploads are stored under their SHA-256 with a normalized copy."""
+    payload = png_bytes()
+    digest = hashlib.sha256(payload).hexdigest()
+
+    upload_id, duplicate = store.put(BytesIO(payload), digest, 'png')
+    assert upload_id == digest
+    assert not duplicate
+    assert os.path.exists(store.original_path(upload_id, 'png'))
+
+    pixels = store.load_normalized(upload_id)
+    assert pixels.shape == (8, 16, 3)
+    assert tuple(pixels[0, 0]) == (255, 0, 0)
+
+def test_put_drafts_large_jpeg(store, monkeypatch):
+    """Test that JPEG uploads are decoded at a reduced scale before normalizing."""
+    buffer = BytesIO()
+    Image.new('RGB', (1600, 800), color='blue').save(buffer, 'JPEG')
+    payload = buffer.getvalue()
+    decoded = []
+    original_convert = Image.Image.convert
+
+    def convert(self, *args, **kwargs):
+        decoded.append(self.size)
+        return original_convert(self, *args, **kwargs)
+
+    monkeypatch.setattr(Image.Image, 'convert', convert)
+
+    upload_id, _ = store.put(BytesIO(payload), hashlib.sha256(payload).hexdigest(), 'jpeg')
+    assert store.load_normalized(upload_id).shape == (8, 16, 3)
+    assert decoded[0][0] < 1600
+
+def test_put_detects_duplicates(store):
+    """Test that the same content is only stored once."""
+    payload = png_bytes()
+    digest = hashlib.sha256(payload).hexdigest()
+    store.put(BytesIO(payload), digest, 'png')
+    upload_id, duplicate = store.put(BytesIO(payload), digest, 'png')
+    assert duplicate
+    assert len(os.listdir(os.path.join(store.root, upload_id[:2]))) == 2
+
+def test_put_rejects_undecodable_image(store):
+    """Test that bytes that cannot be decoded are not kept."""
+    payload = b'\x89PNG\r\n\x1a\n' + b'garbage'
+    digest = hashlib.sha256(payload).hexdigest()
+    with pytest.raises(InvalidUploadError):
+        store.put(BytesIO(payload), digest, 'png')
+    assert not os.listdir(os.path.join(store.root, digest[:2]))
+
+def test_load_normalized_unknown_id(store):
+    """Test lookups of invalid or missing upload ids."""
+    assert store.load_normalized('../etc/passwd') is None
+    assert store.load_normalized('0' * 64) is None
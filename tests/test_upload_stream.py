@@ -0,0 +1,57 @@
+import hashlib
+import os
+from io import BytesIO
+from utils.upload_stream import HashingSpool, sniff_image_type, save_stream
+
+PNG_HEADER = b'\x89PNG\r\n\x1a\n'
+
+def test_sniff_image_type():
+    """Test image type detection from magic bytes."""
+    assert sniff_image_type(PNG_HEADER + b'rest') == 'png'
+    assert sniff_image_type(b'\xff\xd8\xff\xe0rest') == 'jpeg'
+    assert sniff_image_type(b'GIF89a') is None
+    assert sniff_image_type(b'') is None
+
+def test_hashing_spool_hashes_chunks():
+    """Test that the spool hashes and sizes data written in chunks."""
+    payload = PNG_HEADER + os.urandom(5000)
+    spool = HashingSpool(threshold=1024)
+    for i in range(0, len(payload), 7):
+        spool.write(payload[i:i + 7])
+
+    assert spool.hexdigest() == hashlib.sha256(payload).hexdigest()
+    assert spool.size == len(payload)
+    assert spool.kind == 'png'
+
+    spool.seek(0)
+    assert spool.read() == payload
+
+def test_hashing_spool_rolls_to_disk():
+    """Test that data beyond the threshold is moved out of memory."""
+    spool = HashingSpool(threshold=100)
+    spool.write(b'x' * 50)
+    assert not spool._rolled
+    spool.write(b'x' * 100)
+    assert spool._rolled
+
+def test_save_stream(tmp_path):
+    """Test that a stream is saved completely without leaving temporary files."""
+    payload = os.urandom(10000)
+    target = tmp_path / 'out.bin'
+    save_stream(BytesIO(payload), str(target), chunk_size=1024)
+    assert target.read_bytes() == payload
+    assert os.listdir(tmp_path) == ['out.bin']
+
+def test_hashing_spool_refuses_unsupported_type():
+    """Test that a restricted spool stops at the first bytes of an unsupported type."""
+    import pytest
+    from utils.upload_stream import UnsupportedImageError
+    spool = HashingSpool(threshold=1024, allowed_kinds={'png'})
+    spool.write(b'GIF89a')
+    with pytest.raises(UnsupportedImageError):
+        spool.write(b'x' * 5000)
+    assert spool.size == 6
+
+    spool = HashingSpool(threshold=1024, allowed_kinds={'png'})
+    spool.write(PNG_HEADER + b'x' * 5000)
+    assert spool.size == 5008
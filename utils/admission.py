@@ -0,0 +1,108 @@
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from config.config import Config
+from utils.metrics import REGISTRY
+
+# Relative cost of one cell/palette comparison per matching engine
+ENGINE_WEIGHTS: Dict[str, float] = {
+    'cie76': 1.0,
+    'hsv': 1.5,
+    'cie94': 1.0,
+    # Re-ranking a fixed shortlist per cell dominates on small and mid-sized palettes
+    'ciede2000': 4.0,
+}
+
+# Decoding and resampling cost per source pixel, in the same units
+SOURCE_PIXEL_WEIGHT = 4.0
+
+class AdmissionError(Exception):
+    """Base class for requests refused by the AdmissionController."""
+
+    status_code = 503
+
+    def __init__(self, message: str, cost: float, retry_after: Optional[int] = None):
+        super().__init__(message)
+        self.cost = cost
+        self.retry_after = retry_after
+
+class OverBudgetError(AdmissionError):
+    """The request on its own costs more than a single request may."""
+
+    status_code = 413
+
+class OverloadedError(AdmissionError):
+    """Admitting the request would push the in-flight work over the concurrent budget."""
+
+    status_code = 429
+
+def estimate_cost(cells: int, palette_size: int, source_pixels: int = 0, engine: str = 'cie76') -> float:
+    """
+    Estimate the work needed to convert an image, in cell/palette comparisons.
+    Matching dominates: every cell is compared against every palette entry.
+    """
+    weight = ENGINE_WEIGHTS.get(engine)
+    if weight is None:
+        raise ValueError(f'Unknown matching engine: {engine}')
+    return cells * max(palette_size, 1) * weight + source_pixels * SOURCE_PIXEL_WEIGHT
+
+class AdmissionController:
+    """
+    Admits expensive requests against a per-request and a concurrent cost budget.
+    Budgets are per process; with several gunicorn workers the server as a whole
+    admits up to workers x concurrent_budget.
+    """
+
+    def __init__(self, request_budget: Optional[float] = None, concurrent_budget: Optional[float] = None,
+                 retry_after: Optional[int] = None):
+        self.request_budget = Config.ADMISSION_REQUEST_BUDGET if request_budget is None else request_budget
+        self.concurrent_budget = Config.ADMISSION_CONCURRENT_BUDGET if concurrent_budget is None else concurrent_budget
+        self.retry_after = Config.ADMISSION_RETRY_AFTER if retry_after is None else retry_after
+        self._in_flight = 0.0
+        self._requests = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def admit(self, cost: float):
+        """
+        Hold cost against the concurrent budget for the duration of the block.
+        Raises OverBudgetError or OverloadedError instead of admitting.
+        """
+        if self.request_budget and cost > self.request_budget:
+            REGISTRY.inc('emojiart_admission_rejections_total', reason='over_budget')
+            raise OverBudgetError(
+                f'Request too expensive: estimated cost {cost:.0f} exceeds the limit of {self.request_budget:.0f}',
+                cost)
+
+        with self._lock:
+            # A lone request is always admitted so the concurrent budget can't starve it
+            if self.concurrent_budget and self._requests and self._in_flight + cost > self.concurrent_budget:
+                overloaded = True
+            else:
+                overloaded = False
+                self._in_flight += cost
+                self._requests += 1
+                in_flight = self._in_flight
+        if overloaded:
+            REGISTRY.inc('emojiart_admission_rejections_total', reason='overloaded')
+            raise OverloadedError('Server is busy, please retry shortly', cost, self.retry_after)
+
+        REGISTRY.set_gauge('emojiart_admission_in_flight_cost', in_flight)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight -= cost
+                self._requests -= 1
+                in_flight = self._in_flight
+            REGISTRY.set_gauge('emojiart_admission_in_flight_cost', in_flight)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'in_flight_cost': self._in_flight,
+                'in_flight_requests': self._requests,
+                'request_budget': self.request_budget,
+                'concurrent_budget': self.concurrent_budget,
+            }
@@ -0,0 +1,66 @@
+from typing import TYPE_CHECKING, Callable, Iterator, Optional, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+from utils.color_utils import unique_colors
+
+def is_animated(image: 'Image.Image') -> bool:
+    return getattr(image, 'is_animated', False) and getattr(image, 'n_frames', 1) > 1
+
+def iter_frames(image: 'Image.Image') -> Iterator[Tuple[int, int, 'Image.Image']]:
+    """
+    Yield (index, duration_ms, frame) for each frame of an animated image.
+    Frames are decoded one at a time into the same image object, so memory
+    does not grow with the length of the animation.
+    """
+    for index in range(getattr(image, 'n_frames', 1)):
+        image.seek(index)
+        yield index, int(image.info.get('duration', 0) or 0), image
+
+class IncrementalGrid:
+    """
+    Emoji grid for a sequence of frames that only re-matches cells whose sampled
+    color moved more than threshold (on any channel) since that cell was last matched.
+    Comparing against the color at the last match, rather than the previous frame,
+    keeps slow fades from drifting unnoticed.
+    """
+
+    def __init__(self, match: Callable[[np.ndarray], np.ndarray], threshold: int = 0,
+                 quantize_bits: int = 0):
+        self.match = match
+        self.threshold = threshold
+        self.quantize_bits = quantize_bits
+        self.reference: Optional[np.ndarray] = None
+        self.indices: Optional[np.ndarray] = None
+
+    def update(self, pixels: np.ndarray) -> Tuple[np.ndarray, int]:
+        """
+        Match the cells of a (rows, cols, 3) frame that changed.
+        Returns (changed, matched): the (row, col) positions whose emoji changed and
+        the number of cells that were re-matched.
+        """
+        pixels = np.asarray(pixels)
+        if self.reference is None or self.reference.shape != pixels.shape:
+            stale = np.ones(pixels.shape[:2], dtype=bool)
+            previous = None
+            self.reference = pixels.copy()
+            self.indices = np.zeros(pixels.shape[:2], dtype=np.intp)
+        else:
+            delta = np.abs(pixels.astype(np.int16) - self.reference.astype(np.int16)).max(axis=-1)
+            stale = delta > self.threshold
+            previous = self.indices.copy()
+
+        matched = int(stale.sum())
+        if matched:
+            colors, inverse = unique_colors(pixels[stale], self.quantize_bits)
+            self.indices[stale] = self.match(colors)[inverse]
+            self.reference[stale] = pixels[stale]
+
+        if previous is None:
+            changed = np.argwhere(np.ones(pixels.shape[:2], dtype=bool))
+        else:
+            changed = np.argwhere(self.indices != previous)
+        return changed, matched
@@ -5,16 +5,47 @@ from datetime import datetime
 class BuildManager:
     BUILD_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config', 'build.json')
 
+    # (path, mtime_ns, size, generation) of the parsed file and its contents
+    _cached = (None, None)
+    # Bumped on every rewrite, which may land within the same mtime tick
+    _generation = 0
+
     @classmethod
     def get_build_info(cls):
-        if not os.path.exists(cls.BUILD_FILE):
-            return {"build_number": 1, "last_updated": datetime.now().isoformat()}
-        
+        """
+        Return the build info, parsing build.json only when the file changed
+        since the last call. Callers get their own copy of the top-level dict.
+        """
+        return cls.get_build()[1]
+
+    @classmethod
+    def get_build(cls):
+        """
+        Return (key, build info). The key identifies the state of build.json the
+        info was read from, so callers can cache anything derived from it.
+        """
+        try:
+            stat = os.stat(cls.BUILD_FILE)
+        except OSError:
+            return (cls.BUILD_FILE, None, None, cls._generation), cls._default()
+
+        key = (cls.BUILD_FILE, stat.st_mtime_ns, stat.st_size, cls._generation)
+        cached_key, cached_info = cls._cached
+        if cached_key == key:
+            return key, dict(cached_info)
+
         try:
             with open(cls.BUILD_FILE, 'r') as f:
-                return json.load(f)
+                build_info = json.load(f)
         except:
-            return {"build_number": 1, "last_updated": datetime.now().isoformat()}
+            return key, cls._default()
+
+        cls._cached = (key, build_info)
+        return key, dict(build_info)
+
+    @staticmethod
+    def _default():
+        return {"build_number": 1, "last_updated": datetime.now().isoformat()}
 
     @classmethod
     def increment_build(cls):
@@ -24,5 +55,8 @@ class BuildManager:
         
         with open(cls.BUILD_FILE, 'w') as f:
             json.dump(build_info, f, indent=4)
+
+        # The rewrite may land within the same mtime tick, so don't rely on the stat check
+        cls._generation += 1
         
         return build_info
@@ -1,6 +1,12 @@
 import re
-from typing import Tuple, Optional
+from typing import Sequence, Tuple, Optional
 import math
+import numpy as np
+
+# ASCII byte -> hex digit value, 255 for anything that is not a hex digit
+_HEX_DIGITS = np.full(256, 255, dtype=np.uint8)
+for _value, _digit in enumerate('0123456789abcdef'):
+    _HEX_DIGITS[ord(_digit)] = _HEX_DIGITS[ord(_digit.upper())] = _value
 
 def hex_to_rgb(hex_color: str) -> Optional[Tuple[int, int, int]]:
     """Convert hex color to RGB tuple."""
@@ -20,6 +26,22 @@ def hex_to_rgb(hex_color: str) -> Optional[Tuple[int, int, int]]:
     except ValueError:
         return None
 
+def hex_array_to_rgb(hex_colors: Sequence[str]) -> np.ndarray:
+    """
+    Convert a sequence of '#rrggbb' colors to an (N, 3) uint8 array in one pass.
+    Raises ValueError if any color is not in that form.
+    """
+    if any(len(color) != 7 for color in hex_colors):
+        raise ValueError('Expected #rrggbb hex colors')
+    joined = ''.join(hex_colors)
+    if not joined.isascii():
+        raise ValueError('Expected #rrggbb hex colors')
+    chars = np.frombuffer(joined.encode('ascii'), dtype=np.uint8).reshape(-1, 7)
+    digits = _HEX_DIGITS[chars[:, 1:]]
+    if (chars[:, 0] != ord('#')).any() or (digits > 15).any():
+        raise ValueError('Expected #rrggbb hex colors')
+    return digits[:, 0::2] * 16 + digits[:, 1::2]
+
 def rgb_to_xyz(rgb: Tuple[int, int, int]) -> Tuple[float, float, float]:
     """Convert RGB to XYZ color space."""
     r, g, b = rgb
@@ -66,6 +88,139 @@ def xyz_to_lab(xyz: Tuple[float, float, float]) -> Tuple[float, float, float]:
     
     return (L, a, b)
 
+def rgb_array_to_lab(rgb: np.ndarray) -> np.ndarray:
+    """
+    Convert an (..., 3) array of 0-255 RGB values to CIE Lab.
+    Vectorized equivalent of xyz_to_lab(rgb_to_xyz(rgb)) for whole palettes or images.
+    """
+    c = np.asarray(rgb, dtype=np.float64) / 255
+
+    # Gamma correction
+    c = np.where(c > 0.04045, ((c + 0.055) / 1.055) ** 2.4, c / 12.92) * 100
+
+    # Convert to XYZ, normalized by the D65 illuminant reference values
+    matrix = np.array([
+        [0.4124, 0.3576, 0.1805],
+        [0.2126, 0.7152, 0.0722],
+        [0.0193, 0.1192, 0.9505],
+    ])
+    xyz = (c @ matrix.T) / np.array([95.047, 100.0, 108.883])
+
+    f = np.where(xyz > 0.008856, np.cbrt(xyz), (7.787 * xyz) + (16/116))
+    fx, fy, fz = f[..., 0], f[..., 1], f[..., 2]
+
+    return np.stack([(116 * fy) - 16, 500 * (fx - fy), 200 * (fy - fz)], axis=-1)
+
+def rgb_array_to_hsv(rgb: np.ndarray) -> np.ndarray:
+    """
+    Convert an (..., 3) array of 0-255 RGB values to HSV in the 0-1 range.
+    Vectorized equivalent of colorsys.rgb_to_hsv, with the same arithmetic so results match exactly.
+    """
+    c = np.asarray(rgb, dtype=np.float64) / 255
+    r, g, b = c[..., 0], c[..., 1], c[..., 2]
+    maxc = c.max(axis=-1)
+    minc = c.min(axis=-1)
+    rangec = maxc - minc
+    gray = rangec == 0
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s = np.where(gray, 0.0, rangec / maxc)
+        rc = (maxc - r) / rangec
+        gc = (maxc - g) / rangec
+        bc = (maxc - b) / rangec
+    h = np.where(r == maxc, bc - gc, np.where(g == maxc, 2.0 + rc - bc, 4.0 + gc - rc))
+    h = np.where(gray, 0.0, (h / 6.0) % 1.0)
+
+    return np.stack([h, s, maxc], axis=-1)
+
+def delta_e_cie94(lab1: np.ndarray, lab2: np.ndarray) -> np.ndarray:
+    """
+    CIE94 color difference (graphic arts weights) between broadcastable (..., 3) Lab arrays.
+    lab1 is the reference color: its chroma scales the chroma and hue terms.
+    """
+    lab1 = np.asarray(lab1, dtype=np.float64)
+    lab2 = np.asarray(lab2, dtype=np.float64)
+    dL = lab1[..., 0] - lab2[..., 0]
+    C1 = np.hypot(lab1[..., 1], lab1[..., 2])
+    C2 = np.hypot(lab2[..., 1], lab2[..., 2])
+    dC = C1 - C2
+    da = lab1[..., 1] - lab2[..., 1]
+    db = lab1[..., 2] - lab2[..., 2]
+    # Rounding can push dH^2 slightly below zero for nearly identical hues
+    dH_sq = np.maximum(da ** 2 + db ** 2 - dC ** 2, 0)
+
+    SC = 1 + 0.045 * C1
+    SH = 1 + 0.015 * C1
+    return np.sqrt(dL ** 2 + (dC / SC) ** 2 + dH_sq / SH ** 2)
+
+def delta_e_ciede2000(lab1: np.ndarray, lab2: np.ndarray) -> np.ndarray:
+    """CIEDE2000 color difference between broadcastable (..., 3) Lab arrays (kL = kC = kH = 1)."""
+    lab1 = np.asarray(lab1, dtype=np.float64)
+    lab2 = np.asarray(lab2, dtype=np.float64)
+    L1, a1, b1 = lab1[..., 0], lab1[..., 1], lab1[..., 2]
+    L2, a2, b2 = lab2[..., 0], lab2[..., 1], lab2[..., 2]
+
+    C_bar = (np.hypot(a1, b1) + np.hypot(a2, b2)) / 2
+    C_bar7 = C_bar ** 7
+    G = 0.5 * (1 - np.sqrt(C_bar7 / (C_bar7 + 25.0 ** 7)))
+    a1p = (1 + G) * a1
+    a2p = (1 + G) * a2
+    C1p = np.hypot(a1p, b1)
+    C2p = np.hypot(a2p, b2)
+    h1p = np.arctan2(b1, a1p) % (2 * np.pi)
+    h2p = np.arctan2(b2, a2p) % (2 * np.pi)
+
+    chroma_product = C1p * C2p
+    achromatic = chroma_product == 0
+
+    dLp = L2 - L1
+    dCp = C2p - C1p
+    dhp = h2p - h1p
+    dhp = np.where(dhp > np.pi, dhp - 2 * np.pi, np.where(dhp < -np.pi, dhp + 2 * np.pi, dhp))
+    dhp = np.where(achromatic, 0.0, dhp)
+    dHp = 2 * np.sqrt(chroma_product) * np.sin(dhp / 2)
+
+    Lp_bar = (L1 + L2) / 2
+    Cp_bar = (C1p + C2p) / 2
+    h_sum = h1p + h2p
+    hp_bar = np.where(np.abs(h1p - h2p) <= np.pi, h_sum / 2,
+                      np.where(h_sum < 2 * np.pi, (h_sum + 2 * np.pi) / 2, (h_sum - 2 * np.pi) / 2))
+    hp_bar = np.where(achromatic, h_sum, hp_bar)
+
+    T = (1 - 0.17 * np.cos(hp_bar - np.radians(30)) + 0.24 * np.cos(2 * hp_bar)
+         + 0.32 * np.cos(3 * hp_bar + np.radians(6)) - 0.20 * np.cos(4 * hp_bar - np.radians(63)))
+    d_theta = np.radians(30) * np.exp(-((np.degrees(hp_bar) - 275) / 25) ** 2)
+    Cp_bar7 = Cp_bar ** 7
+    R_C = 2 * np.sqrt(Cp_bar7 / (Cp_bar7 + 25.0 ** 7))
+    L_term = (Lp_bar - 50) ** 2
+    S_L = 1 + 0.015 * L_term / np.sqrt(20 + L_term)
+    S_C = 1 + 0.045 * Cp_bar
+    S_H = 1 + 0.015 * Cp_bar * T
+    R_T = -np.sin(2 * d_theta) * R_C
+
+    dL_term = dLp / S_L
+    dC_term = dCp / S_C
+    dH_term = dHp / S_H
+    return np.sqrt(dL_term ** 2 + dC_term ** 2 + dH_term ** 2 + R_T * dC_term * dH_term)
+
+def unique_colors(pixels: np.ndarray, quantize_bits: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find the distinct colors of an (..., 3) uint8 RGB array.
+    Returns (colors, inverse): a (U, 3) uint8 array of unique colors and, for every
+    pixel in flattened order, the index of its color, so colors[inverse] rebuilds the pixels.
+    With quantize_bits set, that many low bits of each channel are dropped first and
+    each color is represented by its bucket's center (at most 2**(quantize_bits-1) off per channel).
+    """
+    rgb = np.asarray(pixels, dtype=np.uint8).reshape(-1, 3)
+    if quantize_bits:
+        rgb = (rgb & (0xFF << quantize_bits & 0xFF)) | (1 << (quantize_bits - 1))
+
+    # Pack each pixel into a 24-bit key so np.unique works on one integer per pixel
+    keys = (rgb[:, 0].astype(np.uint32) << 16) | (rgb[:, 1].astype(np.uint32) << 8) | rgb[:, 2]
+    unique, inverse = np.unique(keys, return_inverse=True)
+    colors = np.stack([(unique >> 16) & 0xFF, (unique >> 8) & 0xFF, unique & 0xFF], axis=-1).astype(np.uint8)
+    return colors, inverse.reshape(-1)
+
 def color_distance(color1: str, color2: str) -> Optional[float]:
     """
     Calculate the perceptual distance between two colors using CIE Lab color space.
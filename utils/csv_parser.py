@@ -1,13 +1,23 @@
 import csv
+import io
 import re
 import logging
-from typing import List, Dict, Optional, Tuple
+from itertools import islice
+from typing import Any, Iterator, List, Dict, Optional, Tuple
 import os
 from config.config import Config
 import unicodedata
 
 logger = logging.getLogger(__name__)
 
+# Rows read and validated together; only one batch of raw rows is held at a time
+LOAD_BATCH_ROWS = 8192
+
+# Invalid rows quoted per reason in a LoadReport
+REPORT_SAMPLES = 5
+
+_HEX_COLOR = re.compile(Config.HEX_COLOR_PATTERN)
+
 class CSVValidationError(Exception):
     """Custom exception for CSV validation errors."""
     pass
@@ -36,7 +46,7 @@ def is_valid_emoji(emoji: str) -> Tuple[bool, str]:
 
 def is_valid_hex_color(color: str) -> bool:
     """Validate if the string is a valid hex color code."""
-    return bool(re.match(Config.HEX_COLOR_PATTERN, color))
+    return bool(_HEX_COLOR.match(color))
 
 def validate_row(row: Dict[str, str], row_number: int) -> Optional[Dict[str, str]]:
     """
@@ -77,37 +87,162 @@ def validate_row(row: Dict[str, str], row_number: int) -> Optional[Dict[str, str
         logger.error(f"Error validating row {row_number}: {str(e)}")
         return None
 
-def parse_emoji_csv() -> List[Dict[str, str]]:
+class LoadReport:
     """
-    Parse and validate the emoji CSV file.
-    Returns a list of validated emoji data dictionaries.
+    Outcome of loading an emoji CSV: rows read and loaded, plus invalid rows
+    counted per reason with the first few (row number, value) samples of each.
     """
-    csv_path = Config.EMOJI_CSV_PATH
-    
+
+    def __init__(self):
+        self.rows = 0
+        self.loaded = 0
+        self.errors: Dict[str, int] = {}
+        self.samples: Dict[str, List[Tuple[int, str]]] = {}
+
+    @property
+    def invalid(self) -> int:
+        return sum(self.errors.values())
+
+    def add(self, reason: str, row_number: int, value: str):
+        self.errors[reason] = self.errors.get(reason, 0) + 1
+        samples = self.samples.setdefault(reason, [])
+        if len(samples) < REPORT_SAMPLES:
+            samples.append((row_number, value))
+
+    def summary(self) -> str:
+        return '; '.join(f"{reason}: {count} (e.g. " +
+                         ', '.join(f"row {row} {value!r}" for row, value in self.samples[reason]) + ')'
+                         for reason, count in sorted(self.errors.items(), key=lambda item: -item[1]))
+
+    def to_dict(self) -> Dict:
+        return {
+            'rows': self.rows,
+            'loaded': self.loaded,
+            'invalid': self.invalid,
+            'errors': dict(self.errors),
+            'samples': {reason: list(samples) for reason, samples in self.samples.items()},
+        }
+
+def _is_non_negative_int(value: str) -> bool:
+    try:
+        return int(value) >= 0
+    except ValueError:
+        return False
+
+def _validate_batch(rows: List[List[str]], row_numbers: List[int], report: LoadReport) -> List[Dict[str, str]]:
+    """
+    Validate a batch of raw CSV rows column by column, with the same rules as validate_row.
+    Invalid rows are counted in report under the first rule they break.
+    """
+    complete = [len(row) >= 3 for row in rows]
+    if not all(complete):
+        for row, row_number, ok in zip(rows, row_numbers, complete):
+            if not ok:
+                report.add('missing field', row_number, ','.join(row))
+        rows = [row for row, ok in zip(rows, complete) if ok]
+        row_numbers = [n for n, ok in zip(row_numbers, complete) if ok]
+    if not rows:
+        return []
+
+    emojis, codes, colors = list(zip(*rows))[:3]
+    # Same checks as is_valid_emoji, is_valid_hex_color and validate_row's ASCII code check;
+    # the common all-digit code skips int()
+    emoji_ok = [not emoji.strip().isascii() for emoji in emojis]
+    code_ok = [(code.isascii() and code.isdigit()) or _is_non_negative_int(code) for code in codes]
+    color_ok = [_HEX_COLOR.match(color) is not None for color in colors]
+
+    valid = []
+    for i, (e_ok, c_ok, h_ok) in enumerate(zip(emoji_ok, code_ok, color_ok)):
+        if e_ok and c_ok and h_ok:
+            valid.append({'Emoji': emojis[i], 'ASCII Code': codes[i], 'Hex Color': colors[i]})
+        elif not e_ok:
+            report.add('empty emoji' if not emojis[i].strip() else 'ASCII-only emoji', row_numbers[i], emojis[i])
+        elif not c_ok:
+            report.add('invalid ASCII code', row_numbers[i], codes[i])
+        else:
+            report.add('invalid hex color', row_numbers[i], colors[i])
+    return valid
+
+class _HashingReader(io.RawIOBase):
+    """Raw reader that feeds every byte read from the underlying file into a hash."""
+
+    def __init__(self, raw, digest):
+        self.raw = raw
+        self.digest = digest
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> Optional[int]:
+        count = self.raw.readinto(buffer)
+        if count:
+            self.digest.update(memoryview(buffer)[:count])
+        return count
+
+def iter_emoji_csv(csv_path: Optional[str] = None, report: Optional[LoadReport] = None,
+                   batch_rows: int = LOAD_BATCH_ROWS, digest: Optional[Any] = None) -> Iterator[List[Dict[str, str]]]:
+    """
+    Read and validate an emoji CSV in batches, yielding the valid rows of each batch.
+    Reads Config.EMOJI_CSV_PATH unless another path is given. Invalid rows are
+    counted in report rather than logged one by one.
+    digest, a hashlib object, is updated with the file's bytes as they are parsed,
+    so it describes exactly the content the rows came from.
+    """
+    csv_path = csv_path or Config.EMOJI_CSV_PATH
+    report = report if report is not None else LoadReport()
+
     if not os.path.exists(csv_path):
         error_msg = f"Emoji CSV file not found at: {csv_path}"
         logger.error(error_msg)
         raise FileNotFoundError(error_msg)
 
+    raw = open(csv_path, 'rb', buffering=0)
+    source = raw if digest is None else _HashingReader(raw, digest)
+    with raw, io.TextIOWrapper(io.BufferedReader(source, Config.UPLOAD_CHUNK_SIZE),
+                               encoding='utf-8', newline='') as csvfile:
+        reader = csv.reader(csvfile)
+
+        # Validate headers
+        headers = next((row for row in reader if row), None)
+        if headers != Config.EMOJI_CSV_HEADERS:
+            error_msg = f"Invalid CSV headers. Expected: {Config.EMOJI_CSV_HEADERS}, Got: {headers}"
+            logger.error(error_msg)
+            raise CSVValidationError(error_msg)
+
+        while True:
+            batch = list(islice(reader, batch_rows))
+            if not batch:
+                break
+            # Line numbers, as validate_row reports them (header is row 1; blank lines are skipped)
+            rows = []
+            row_numbers = []
+            for row in batch:
+                if row:
+                    rows.append(row)
+                    row_numbers.append(report.rows + len(rows) + 1)
+            report.rows += len(rows)
+            valid = _validate_batch(rows, row_numbers, report)
+            report.loaded += len(valid)
+            yield valid
+
+def parse_emoji_csv(csv_path: Optional[str] = None, report: Optional[LoadReport] = None,
+                    digest: Optional[Any] = None) -> List[Dict[str, str]]:
+    """
+    Parse and validate the emoji CSV file.
+    Reads Config.EMOJI_CSV_PATH unless another path is given; digest is passed on to iter_emoji_csv.
+    Returns a list of validated emoji data dictionaries; invalid rows are skipped and
+    summarized in a single warning (and in report, if one is given).
+    """
+    report = report if report is not None else LoadReport()
     emoji_data = []
-    
+
     try:
-        with open(csv_path, 'r', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            
-            # Validate headers
-            headers = reader.fieldnames
-            if headers != ['Emoji', 'ASCII Code', 'Hex Color']:
-                error_msg = f"Invalid CSV headers. Expected: ['Emoji', 'ASCII Code', 'Hex Color'], Got: {headers}"
-                logger.error(error_msg)
-                raise CSVValidationError(error_msg)
-            
-            # Process rows
-            for row_number, row in enumerate(reader, start=2):  # Start at 2 to account for header row
-                validated_row = validate_row(row, row_number)
-                if validated_row:
-                    emoji_data.append(validated_row)
+        for batch in iter_emoji_csv(csv_path, report, digest=digest):
+            emoji_data.extend(batch)
 
+        if report.invalid:
+            logger.warning("Skipped %d of %d rows in %s: %s", report.invalid, report.rows,
+                           csv_path or Config.EMOJI_CSV_PATH, report.summary())
         if not emoji_data:
             logger.warning("No valid emoji data found in CSV file")
         else:
@@ -115,6 +250,8 @@ def parse_emoji_csv() -> List[Dict[str, str]]:
 
         return emoji_data
 
+    except (FileNotFoundError, CSVValidationError):
+        raise
     except (csv.Error, UnicodeDecodeError) as e:
         error_msg = f"Error reading CSV file: {str(e)}"
         logger.error(error_msg)
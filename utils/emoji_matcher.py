@@ -1,5 +1,18 @@
 import colorsys
-from typing import Dict, List, Tuple
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.color_utils import rgb_array_to_hsv
+from utils.csv_parser import parse_emoji_csv
+
+# Default number of colors remembered by each matcher
+DEFAULT_CACHE_SIZE = 4096
+
+# Color/emoji distance pairs computed per block; small enough for the temporaries to stay in cache
+NEAREST_CHUNK_PAIRS = 1 << 16
 
 class EmojiMatcher:
     # Built-in emoji data with their approximate colors
@@ -39,10 +52,48 @@ class EmojiMatcher:
         {"emoji": "🥝", "color": "#90EE90"}   # Kiwi
     ]
 
-    def __init__(self):
-        """Initialize the EmojiMatcher with built-in emoji data."""
-        self.emoji_data = self.DEFAULT_EMOJI_DATA
-        self._cache = {}  # Cache for color matches
+    def __init__(self, emoji_data: Optional[Sequence[Dict]] = None, cache_size: int = DEFAULT_CACHE_SIZE,
+                 quantize_bits: int = 0, rgb: Optional[np.ndarray] = None):
+        """
+        Initialize the EmojiMatcher with the given emoji data (dicts with 'emoji' and
+        'color'), or the built-in set. rgb may pass the colors already parsed, as an
+        (N, 3) array in emoji_data order. Matches are kept in a thread-safe LRU
+        cache of cache_size colors. With quantize_bits set, that many low bits of
+        each channel are dropped, so nearby colors share a cache entry and are
+        matched by their bucket's center.
+        """
+        if not 0 <= quantize_bits < 8:
+            raise ValueError(f"quantize_bits must be between 0 and 7: {quantize_bits}")
+        self.emoji_data = list(emoji_data) if emoji_data is not None else self.DEFAULT_EMOJI_DATA
+        self.cache_size = cache_size
+        self.quantize_bits = quantize_bits
+        self._cache: 'OrderedDict[int, Dict]' = OrderedDict()  # LRU of packed RGB -> emoji
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        if rgb is None:
+            rgb = np.array([self.hex_to_rgb(e['color']) for e in self.emoji_data], dtype=np.uint8)
+        # HSV coordinates of every emoji, precomputed once
+        hsv = rgb_array_to_hsv(np.asarray(rgb).reshape(-1, 3))
+        self._h = np.ascontiguousarray(hsv[:, 0])
+        self._s = np.ascontiguousarray(hsv[:, 1])
+        self._v = np.ascontiguousarray(hsv[:, 2])
+
+    @classmethod
+    def from_csv(cls, csv_path: Optional[str] = None, **kwargs) -> 'EmojiMatcher':
+        """Build a matcher over the emoji CSV palette (Config.EMOJI_CSV_PATH unless another path is given)."""
+        rows = parse_emoji_csv(csv_path)
+        return cls([{'emoji': row['Emoji'], 'color': row['Hex Color']} for row in rows], **kwargs)
+
+    @classmethod
+    def from_palette(cls, palette, **kwargs) -> 'EmojiMatcher':
+        """Build a matcher over an EmojiPalette snapshot, reusing its parsed colors."""
+        return cls([{'emoji': e['Emoji'], 'color': e['Hex Color']} for e in palette.entries],
+                   rgb=palette.rgb, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.emoji_data)
 
     def hex_to_rgb(self, hex_color: str) -> Tuple[int, int, int]:
         """Convert hex color to RGB tuple."""
@@ -78,22 +129,149 @@ class EmojiMatcher:
         # Weight hue more heavily for better color matching
         return (h_diff * 5) + (s_diff * 3) + v_diff
 
+    def _key(self, color: str) -> int:
+        """Pack a hex color into a 24-bit cache key, after quantization."""
+        r, g, b = self.hex_to_rgb(color)
+        key = (r << 16) | (g << 8) | b
+        if self.quantize_bits:
+            mask = (0xFF >> self.quantize_bits << self.quantize_bits) * 0x010101
+            key &= mask
+        return key
+
+    def _key_colors(self, keys: Sequence[int]) -> np.ndarray:
+        """RGB colors matched for the given keys: the color itself, or its bucket's center."""
+        keys = np.asarray(keys, dtype=np.int64)
+        rgb = np.stack([(keys >> 16) & 0xFF, (keys >> 8) & 0xFF, keys & 0xFF], axis=-1)
+        if self.quantize_bits:
+            rgb = rgb | (1 << (self.quantize_bits - 1))
+        return rgb
+
+    def _nearest(self, rgb: np.ndarray, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Index of the closest emoji for each row of an (N, 3) RGB array, by weighted HSV distance.
+        If mask is given, only emoji where it is True are considered.
+        """
+        hsv = rgb_array_to_hsv(rgb)
+        penalty = None if mask is None else np.where(mask, 0, np.inf)
+        result = np.empty(len(hsv), dtype=np.intp)
+        chunk = max(1, NEAREST_CHUNK_PAIRS // max(len(self.emoji_data), 1))
+        for start in range(0, len(hsv), chunk):
+            block = hsv[start:start + chunk]
+            # (h_diff * 5) + (s_diff * 3) + v_diff, as in color_distance, computed in place
+            distances = np.subtract(block[:, 0, None], self._h)
+            np.abs(distances, out=distances)
+            scratch = np.subtract(1, distances)
+            np.minimum(distances, scratch, out=distances)
+            distances *= 5
+            np.subtract(block[:, 1, None], self._s, out=scratch)
+            np.abs(scratch, out=scratch)
+            scratch *= 3
+            distances += scratch
+            np.subtract(block[:, 2, None], self._v, out=scratch)
+            np.abs(scratch, out=scratch)
+            distances += scratch
+            if penalty is not None:
+                distances += penalty
+            result[start:start + chunk] = distances.argmin(axis=1)
+        return result
+
+    def nearest_indices(self, pixels: np.ndarray, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Return the index into emoji_data of the closest emoji for each RGB pixel.
+        Accepts any (..., 3) array and returns an array of the leading shape. Bypasses the cache.
+        mask, a boolean array over emoji_data, restricts the emoji considered.
+        """
+        if not self.emoji_data:
+            raise ValueError('No emoji data to match against')
+        pixels = np.asarray(pixels)
+        return self._nearest(pixels.reshape(-1, 3), mask).reshape(pixels.shape[:-1])
+
+    def _lookup(self, key: int) -> Optional[Dict]:
+        # Caller holds the lock
+        emoji = self._cache.get(key)
+        if emoji is None:
+            self._misses += 1
+        else:
+            self._hits += 1
+            self._cache.move_to_end(key)
+        return emoji
+
+    def _store(self, key: int, emoji: Dict):
+        # Caller holds the lock
+        self._cache[key] = emoji
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+            self._evictions += 1
+
     def find_closest_emoji(self, color: str) -> Dict:
         """Find the closest matching emoji for a given color."""
+        try:
+            key = self._key(color)
+        except ValueError as e:
+            raise ValueError(f"Error finding closest emoji: {str(e)}")
+
         # Check cache first
-        if color in self._cache:
-            return self._cache[color]
+        with self._lock:
+            cached = self._lookup(key)
+        if cached is not None:
+            return cached
 
+        closest_emoji = self.emoji_data[int(self._nearest(self._key_colors([key]))[0])]
+        with self._lock:
+            self._store(key, closest_emoji)
+        return closest_emoji
+
+    def find_closest_emojis(self, colors: Sequence[str]) -> List[Dict]:
+        """
+        Find the closest matching emoji for each of the given colors.
+        Cache misses are resolved together in one vectorized pass.
+        """
         try:
-            # Calculate distances to all emojis
-            distances = [(self.color_distance(color, emoji['color']), emoji)
-                        for emoji in self.emoji_data]
-            
-            # Find emoji with minimum distance
-            closest_emoji = min(distances, key=lambda x: x[0])[1]
-            
-            # Cache the result
-            self._cache[color] = closest_emoji
-            return closest_emoji
+            keys = [self._key(color) for color in colors]
         except ValueError as e:
             raise ValueError(f"Error finding closest emoji: {str(e)}")
+
+        results: List[Optional[Dict]] = [None] * len(keys)
+        missing: Dict[int, List[int]] = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in missing:
+                    # Repeated within the batch: counts as a hit once resolved
+                    self._hits += 1
+                    missing[key].append(i)
+                    continue
+                emoji = self._lookup(key)
+                if emoji is None:
+                    missing[key] = [i]
+                else:
+                    results[i] = emoji
+
+        if missing:
+            unique = list(missing)
+            indices = self._nearest(self._key_colors(unique))
+            with self._lock:
+                for key, index in zip(unique, indices.tolist()):
+                    emoji = self.emoji_data[index]
+                    self._store(key, emoji)
+                    for i in missing[key]:
+                        results[i] = emoji
+        return results
+
+    def cache_info(self) -> Dict:
+        """Hit/miss statistics and current size of the match cache."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'size': len(self._cache),
+                'max_size': self.cache_size,
+                'hit_rate': self._hits / lookups if lookups else 0.0,
+            }
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+            self._hits = self._misses = self._evictions = 0
@@ -0,0 +1,110 @@
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, TypeVar
+
+from flask import g, has_app_context
+
+from config.config import Config
+from utils.admission import OverloadedError
+from utils.metrics import REGISTRY
+
+T = TypeVar('T')
+
+class LaneFullError(OverloadedError):
+    """Every worker and queue slot of the heavy lane is taken."""
+
+class HeavyLane:
+    """
+    Bounded executor for CPU-heavy request work.
+    At most `workers` jobs run at once and `queue_size` more wait; anything beyond
+    that is refused immediately, so a burst of conversions can tie up at most
+    workers + queue_size request threads and the rest stay free for light endpoints.
+    """
+
+    def __init__(self, workers: Optional[int] = None, queue_size: Optional[int] = None,
+                 retry_after: Optional[int] = None):
+        self.workers = workers or Config.HEAVY_LANE_WORKERS
+        self.queue_size = Config.HEAVY_LANE_QUEUE if queue_size is None else queue_size
+        self.retry_after = Config.ADMISSION_RETRY_AFTER if retry_after is None else retry_after
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_pid: Optional[int] = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Created per process so a preloading gunicorn master never hands its pool to a fork
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='heavy-lane')
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def run(self, func: Callable[[], T], inline: bool = False, wait: Optional[float] = 0) -> T:
+        """
+        Run func on the lane and wait for its result, raising LaneFullError if the lane is full.
+        wait is how many seconds to wait for a slot first (None waits as long as it takes).
+        The caller's context (including Flask's request and g) is carried over to the worker.
+        With inline set the job still takes a slot but runs on the calling thread.
+        """
+        acquired = self._slots.acquire(blocking=False) if wait == 0 else self._slots.acquire(timeout=wait)
+        if not acquired:
+            with self._lock:
+                self._rejected += 1
+            REGISTRY.inc('emojiart_admission_rejections_total', reason='lane_full')
+            raise LaneFullError('Server is busy, please retry shortly', 0, self.retry_after)
+
+        with self._lock:
+            self._queued += 1
+        self._publish()
+        submitted = time.perf_counter()
+        context = contextvars.copy_context()
+
+        def job():
+            waited = time.perf_counter() - submitted
+            with self._lock:
+                self._queued -= 1
+                self._in_flight += 1
+            self._publish()
+            REGISTRY.observe('emojiart_stage_seconds', waited, stage='queue')
+            if has_app_context():
+                g.setdefault('server_timing', []).append(('queue', waited))
+            try:
+                return func()
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+                    self._completed += 1
+                self._publish()
+
+        try:
+            if inline:
+                return context.run(job)
+            return self._get_executor().submit(context.run, job).result()
+        finally:
+            self._slots.release()
+
+    def _publish(self):
+        with self._lock:
+            queued, in_flight = self._queued, self._in_flight
+        REGISTRY.set_gauge('emojiart_heavy_lane_queued', queued)
+        REGISTRY.set_gauge('emojiart_heavy_lane_in_flight', in_flight)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            capacity = self.workers + self.queue_size
+            return {
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'queued': self._queued,
+                'in_flight': self._in_flight,
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'saturation': round((self._queued + self._in_flight) / capacity, 3),
+            }
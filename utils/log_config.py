@@ -0,0 +1,111 @@
+import logging
+import os
+import queue
+import weakref
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, List, Optional
+
+from config.config import Config
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+class StructuredFormatter(logging.Formatter):
+    """Formatter that appends fields passed through `extra` as key=value pairs."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = [f"{key}={value}" for key, value in record.__dict__.items()
+                  if key not in _STANDARD_ATTRS and not key.startswith('_')]
+        if fields:
+            line = f"{line} {' '.join(fields)}"
+        return line
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of INFO-and-below records per route.
+    Records carry the route as a structured field (extra={'route': ...});
+    a rate of 0.01 keeps one record in a hundred. Warnings and errors are never dropped.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.intervals = {route: max(1, round(1 / rate)) if rate > 0 else 0
+                          for route, rate in rates.items()}
+        self._counters: Dict[str, int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO:
+            return True
+        route = getattr(record, 'route', None)
+        interval = self.intervals.get(route)
+        if interval is None:
+            return True
+        if interval == 0:
+            return False
+        # Races between threads only skew the sample slightly
+        count = self._counters.get(route, 0)
+        self._counters[route] = count + 1
+        return count % interval == 0
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler that enqueues records untouched.
+    The stock handler formats the message on the calling thread; records stay
+    in-process here, so formatting is left entirely to the writer thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+class BackgroundLogWriter:
+    """
+    Moves log I/O off request threads: loggers only append to a queue and a
+    listener thread formats records and writes them to the real handlers.
+    After a fork the child gets a fresh queue and its own listener thread.
+    """
+
+    def __init__(self, handlers: List[logging.Handler], sample_rates: Optional[Dict[str, float]] = None):
+        self.handlers = handlers
+        self.queue_handler = DeferredQueueHandler(queue.SimpleQueue())
+        if sample_rates:
+            self.queue_handler.addFilter(SamplingFilter(sample_rates))
+        self._listener: Optional[QueueListener] = None
+        self.start()
+
+        ref = weakref.ref(self)
+        os.register_at_fork(after_in_child=lambda: ref() and ref()._after_fork())
+
+    def start(self):
+        self._listener = QueueListener(self.queue_handler.queue, *self.handlers, respect_handler_level=True)
+        self._listener.start()
+
+    def stop(self):
+        """Flush queued records and stop the writer thread."""
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+
+    def _after_fork(self):
+        # The parent's listener thread does not exist here; records queued before the fork stay with the parent
+        self.queue_handler.queue = queue.SimpleQueue()
+        self.start()
+
+def configure_logging(app) -> BackgroundLogWriter:
+    """Attach a rotating log file to the app logger through a background writer."""
+    os.makedirs(Config.LOG_DIR, exist_ok=True)
+    file_handler = RotatingFileHandler(
+        os.path.join(Config.LOG_DIR, 'emojiart.log'),
+        maxBytes=Config.LOG_MAX_BYTES,
+        backupCount=Config.LOG_BACKUP_COUNT,
+        encoding='utf-8'
+    )
+    file_handler.setFormatter(StructuredFormatter(
+        '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
+    ))
+    file_handler.setLevel(logging.INFO)
+
+    writer = BackgroundLogWriter([file_handler], Config.LOG_SAMPLE_RATES)
+    app.logger.addHandler(writer.queue_handler)
+    app.logger.setLevel(logging.INFO)
+    return writer
@@ -0,0 +1,267 @@
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from flask import g, has_app_context
+
+from config.config import Config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help)
+METRICS = {
+    'emojiart_stage_seconds': ('histogram', 'Time spent in each processing stage'),
+    'emojiart_request_seconds': ('histogram', 'Request latency by endpoint'),
+    'emojiart_requests_total': ('counter', 'Requests by endpoint and status code'),
+    'emojiart_cells_matched_total': ('counter', 'Grid cells matched to an emoji'),
+    'emojiart_colors_matched_total': ('counter', 'Distinct colors searched in the palette'),
+    'emojiart_palette_entries': ('gauge', 'Entries in the current palette'),
+    'emojiart_palette_version': ('gauge', 'Version of the current palette'),
+    'emojiart_startup_seconds': ('gauge', 'Time taken to create the app'),
+    'emojiart_upload_bytes': ('gauge', 'Bytes held in the upload store'),
+    'emojiart_upload_files': ('gauge', 'Files held in the upload store'),
+    'emojiart_upload_evictions_total': ('counter', 'Uploads evicted by the storage sweeper'),
+    'emojiart_admission_rejections_total': ('counter', 'Image conversions refused by admission control'),
+    'emojiart_admission_in_flight_cost': ('gauge', 'Estimated cost of image conversions in progress'),
+    'emojiart_heavy_lane_queued': ('gauge', 'Heavy jobs waiting for a lane worker'),
+    'emojiart_heavy_lane_in_flight': ('gauge', 'Heavy jobs running on the lane'),
+    'emojiart_progressive_results_total': ('counter', 'Deadline-bound conversions by whether they finished'),
+    'emojiart_mosaic_tiles_total': ('counter', 'Stored mosaic tiles served, by tile cache result'),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# Counters and histograms of exited workers, merged by MetricsRegistry.retire()
+RETIRED_FILE = 'metrics-retired.json'
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+class MetricsRegistry:
+    """
+    In-process counters, gauges and histograms rendered in Prometheus text format.
+    When a directory is configured each process also writes its values there,
+    and render() merges every process's file, so a scrape of any gunicorn
+    worker reports totals for the whole server. Counters and histograms of
+    workers that exited are kept in one retired file so the totals don't drop.
+    """
+
+    def __init__(self, directory: Optional[str] = None, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.directory = directory
+        self.buckets = tuple(buckets)
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._gauges: Dict[str, Dict[Labels, float]] = {}
+        # name -> labels -> [bucket counts..., +Inf count, sum]
+        self._histograms: Dict[str, Dict[Labels, List[float]]] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_pid: Optional[int] = None
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        key = _labels(labels)
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _labels(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            counts = series.get(key)
+            if counts is None:
+                counts = series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[len(self.buckets)] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def timer(self, stage: str):
+        """
+        Time a processing stage into emojiart_stage_seconds.
+        Inside a request the duration is also added to that response's Server-Timing header.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe('emojiart_stage_seconds', elapsed, stage=stage)
+            if has_app_context():
+                g.setdefault('server_timing', []).append((stage, elapsed))
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                'counters': {n: [[list(k), v] for k, v in s.items()] for n, s in self._counters.items()},
+                'gauges': {n: [[list(k), v] for k, v in s.items()] for n, s in self._gauges.items()},
+                'histograms': {n: [[list(k), list(v)] for k, v in s.items()] for n, s in self._histograms.items()},
+            }
+
+    def reset(self):
+        """
+        Forget counters and histograms, e.g. in a freshly forked worker whose
+        parent reports its own. Gauges stay: they describe state the fork inherited.
+        """
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def flush(self):
+        """Write this process's values to the shared directory, if one is configured."""
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        target = os.path.join(self.directory, f'metrics-{os.getpid()}.json')
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.metrics-')
+        with os.fdopen(fd, 'w') as out:
+            json.dump(self.snapshot(), out)
+        os.replace(tmp_path, target)
+
+    def retire(self, pid: int):
+        """
+        Fold the counters and histograms a dead process wrote into the retired
+        totals and remove its file. Its gauges are dropped.
+        """
+        if not self.directory:
+            return
+        path = os.path.join(self.directory, f'metrics-{pid}.json')
+        if not os.path.exists(path):
+            return
+        retired_path = os.path.join(self.directory, RETIRED_FILE)
+        counters: Dict[str, Dict[Labels, float]] = {}
+        histograms: Dict[str, Dict[Labels, List[float]]] = {}
+        for source in (retired_path, path):
+            try:
+                with open(source) as f:
+                    _merge(json.load(f), counters, {}, histograms)
+            except (OSError, ValueError):
+                continue
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.metrics-')
+        with os.fdopen(fd, 'w') as out:
+            json.dump({
+                'counters': {n: [[list(k), v] for k, v in s.items()] for n, s in counters.items()},
+                'gauges': {},
+                'histograms': {n: [[list(k), v] for k, v in s.items()] for n, s in histograms.items()},
+            }, out)
+        os.replace(tmp_path, retired_path)
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def _collect(self) -> List[Tuple[Optional[int], Dict]]:
+        if not self.directory:
+            return [(os.getpid(), self.snapshot())]
+        self.flush()
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            try:
+                name = os.path.basename(path)
+                pid = None if name == RETIRED_FILE else int(name[len('metrics-'):-len('.json')])
+                with open(path) as f:
+                    snapshots.append((pid, json.load(f)))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self) -> str:
+        """Render all processes' metrics in the Prometheus text exposition format."""
+        counters: Dict[str, Dict[Labels, float]] = {}
+        gauges: Dict[str, Dict[Labels, float]] = {}
+        histograms: Dict[str, Dict[Labels, List[float]]] = {}
+        multiprocess = bool(self.directory)
+
+        for pid, snapshot in self._collect():
+            _merge(snapshot, counters, gauges, histograms, pid if multiprocess else None)
+
+        lines = []
+        for name in sorted(set(counters) | set(gauges) | set(histograms)):
+            kind, help_text = METRICS.get(name, ('untyped', name))
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for key, value in sorted(counters.get(name, {}).items()):
+                lines.append(f'{name}{_format_labels(key)} {value}')
+            for key, value in sorted(gauges.get(name, {}).items()):
+                lines.append(f'{name}{_format_labels(key)} {value}')
+            for key, counts in sorted(histograms.get(name, {}).items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{name}_bucket{_format_labels(key + (("le", le),))} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(key)} {counts[-1]}')
+                lines.append(f'{name}_count{_format_labels(key)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+    def start(self, interval: float = 1.0):
+        """Periodically flush this process's values (no-op without a directory or if already running)."""
+        if not self.directory:
+            return
+        if self._thread is not None and self._thread.is_alive() and self._thread_pid == os.getpid():
+            return
+        self._thread = threading.Thread(target=self._run, args=(interval,), name='metrics-flusher', daemon=True)
+        self._thread_pid = os.getpid()
+        self._thread.start()
+
+    def _run(self, interval: float):
+        while True:
+            time.sleep(interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error('Metrics flush failed: %s', e)
+
+def _merge(snapshot: Dict, counters: Dict, gauges: Dict, histograms: Dict, pid: Optional[int] = None):
+    """Add one process's snapshot into the merged series; gauges get a pid label when one is given."""
+    # Counters and histograms add up across workers; gauges are per worker
+    for name, series in snapshot['counters'].items():
+        merged = counters.setdefault(name, {})
+        for key, value in series:
+            key = tuple(map(tuple, key))
+            merged[key] = merged.get(key, 0) + value
+    for name, series in snapshot['gauges'].items():
+        merged = gauges.setdefault(name, {})
+        for key, value in series:
+            key = tuple(map(tuple, key))
+            if pid is not None:
+                key = tuple(sorted(key + (('pid', str(pid)),)))
+            merged[key] = value
+    for name, series in snapshot['histograms'].items():
+        merged = histograms.setdefault(name, {})
+        for key, counts in series:
+            key = tuple(map(tuple, key))
+            if key in merged:
+                merged[key] = [a + b for a, b in zip(merged[key], counts)]
+            else:
+                merged[key] = list(counts)
+
+def _format_labels(key: Labels) -> str:
+    if not key:
+        return ''
+    escaped = ','.join('{}="{}"'.format(k, v.replace('\\', '\\\\').replace('"', '\\"')) for k, v in key)
+    return '{' + escaped + '}'
+
+def server_timing_header(timings: List[Tuple[str, float]]) -> str:
+    """Format (stage, seconds) pairs as a Server-Timing header value."""
+    return ', '.join(f'{stage};dur={seconds * 1000:.2f}' for stage, seconds in timings)
+
+# Process-wide registry
+REGISTRY = MetricsRegistry(Config.METRICS_DIR)
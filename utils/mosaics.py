@@ -0,0 +1,160 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from config.config import Config
+from utils.color_utils import unique_colors
+from utils.metrics import REGISTRY
+
+MOSAIC_ID_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+class MosaicStore:
+    """
+    Sampled cell colors of large mosaics, stored on disk and matched lazily in square tiles.
+    A mosaic is content-addressed by its cells, so converting the same image at the same
+    grid size twice stores it once. Files sit in the upload folder next to the uploads,
+    so the storage sweeper's quota and TTL cover them too.
+    Matched tiles are kept in a per-process LRU keyed by mosaic, palette and matching
+    options; a viewport only matches the tiles it overlaps that are not cached yet.
+    """
+
+    def __init__(self, root: str, tile_size: Optional[int] = None, cache_tiles: Optional[int] = None):
+        self.root = root
+        self.tile_size = tile_size or Config.MOSAIC_TILE_SIZE
+        self.cache_tiles = Config.MOSAIC_TILE_CACHE if cache_tiles is None else cache_tiles
+        self._tiles: 'OrderedDict[Tuple, np.ndarray]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def is_valid_id(mosaic_id: str) -> bool:
+        return bool(mosaic_id) and bool(MOSAIC_ID_PATTERN.match(mosaic_id))
+
+    def path(self, mosaic_id: str) -> str:
+        # Same fan-out as UploadStore, so the storage sweeper finds mosaics with the uploads
+        return os.path.join(self.root, mosaic_id[:2], f"{mosaic_id}.cells.npy")
+
+    def put(self, cells: np.ndarray) -> str:
+        """Store the (rows, cols, 3) uint8 cell colors of a mosaic and return its id."""
+        cells = np.ascontiguousarray(cells, dtype=np.uint8)
+        digest = hashlib.sha256(repr(cells.shape).encode())
+        digest.update(cells.tobytes())
+        mosaic_id = digest.hexdigest()
+
+        target = self.path(mosaic_id)
+        if os.path.exists(target):
+            self._touch(target)
+            return mosaic_id
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), prefix='.upload-', suffix='.npy')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                np.save(out, cells)
+            os.replace(tmp_path, target)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return mosaic_id
+
+    @staticmethod
+    def _touch(path: str):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def load(self, mosaic_id: str) -> Optional[np.ndarray]:
+        """Return the stored cell colors of a mosaic (memory-mapped), or None if it is not stored."""
+        if not self.is_valid_id(mosaic_id):
+            return None
+        path = self.path(mosaic_id)
+        try:
+            cells = np.load(path, mmap_mode='r')
+        except FileNotFoundError:
+            return None
+        self._touch(path)
+        return cells
+
+    def window(self, mosaic_id: str, x: int, y: int, width: int, height: int, palette,
+               engine: str = 'cie76', quantize_bits: int = 0) -> Optional[np.ndarray]:
+        """
+        Palette indices for the cells in columns x..x+width and rows y..y+height of a mosaic,
+        clipped to its bounds. Returns None if the mosaic is not stored.
+        Tiles missing from the cache are matched together, so colors they share are matched once.
+        """
+        cells = self.load(mosaic_id)
+        if cells is None:
+            return None
+        rows, cols = cells.shape[:2]
+        x0, y0 = min(x, cols), min(y, rows)
+        x1, y1 = min(x + width, cols), min(y + height, rows)
+        result = np.empty((y1 - y0, x1 - x0), dtype=np.int32)
+        if result.size == 0:
+            return result
+
+        size = self.tile_size
+        palette_key = (palette.digest, palette.version, palette.mask_key, engine, quantize_bits)
+        wanted = [(ty, tx) for ty in range(y0 // size, (y1 - 1) // size + 1)
+                  for tx in range(x0 // size, (x1 - 1) // size + 1)]
+
+        tiles: Dict[Tuple[int, int], np.ndarray] = {}
+        with self._lock:
+            for position in wanted:
+                key = (mosaic_id, palette_key, position)
+                tile = self._tiles.get(key)
+                if tile is not None:
+                    self._tiles.move_to_end(key)
+                    tiles[position] = tile
+        missing = [position for position in wanted if position not in tiles]
+        REGISTRY.inc('emojiart_mosaic_tiles_total', len(tiles), result='hit')
+        REGISTRY.inc('emojiart_mosaic_tiles_total', len(missing), result='miss')
+
+        if missing:
+            blocks = [np.asarray(cells[ty * size:(ty + 1) * size, tx * size:(tx + 1) * size]) for ty, tx in missing]
+            colors, inverse = unique_colors(np.concatenate([b.reshape(-1, 3) for b in blocks]), quantize_bits)
+            if len(palette):
+                indices = palette.nearest_indices(colors, engine)[inverse].astype(np.int32)
+            else:
+                # Empty palette: callers render every cell with their fallback emoji
+                indices = np.zeros(len(inverse), dtype=np.int32)
+            offset = 0
+            with self._lock:
+                for position, block in zip(missing, blocks):
+                    tile = indices[offset:offset + block.shape[0] * block.shape[1]].reshape(block.shape[:2]).copy()
+                    offset += tile.size
+                    tile.flags.writeable = False
+                    tiles[position] = tile
+                    self._tiles[(mosaic_id, palette_key, position)] = tile
+                while len(self._tiles) > self.cache_tiles:
+                    self._tiles.popitem(last=False)
+            REGISTRY.inc('emojiart_cells_matched_total', offset)
+            REGISTRY.inc('emojiart_colors_matched_total', len(colors))
+
+        with self._lock:
+            self._hits += len(wanted) - len(missing)
+            self._misses += len(missing)
+
+        for (ty, tx), tile in tiles.items():
+            top, left = ty * size, tx * size
+            r0, c0 = max(y0, top), max(x0, left)
+            r1, c1 = min(y1, top + tile.shape[0]), min(x1, left + tile.shape[1])
+            result[r0 - y0:r1 - y0, c0 - x0:c1 - x0] = tile[r0 - top:r1 - top, c0 - left:c1 - left]
+        return result
+
+    def cache_info(self) -> Dict:
+        with self._lock:
+            return {
+                'tiles': len(self._tiles),
+                'max_tiles': self.cache_tiles,
+                'hits': self._hits,
+                'misses': self._misses,
+            }
@@ -0,0 +1,481 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, FrozenSet, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config.config import Config
+from utils.csv_parser import parse_emoji_csv, CSVValidationError
+from utils.color_utils import hex_to_rgb, hex_array_to_rgb, rgb_array_to_lab, delta_e_ciede2000
+from utils.emoji_matcher import EmojiMatcher
+from utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on the number of pixel/palette distance pairs computed at once
+NEAREST_CHUNK_PAIRS = 1 << 22
+
+# Matching engines accepted by EmojiPalette.nearest_indices
+ENGINES = ('cie76', 'hsv', 'cie94', 'ciede2000')
+
+# CIE94 nearest entries re-ranked by CIEDE2000 for each pixel
+CIEDE2000_CANDIDATES = 64
+
+# Name of the palette loaded from Config.EMOJI_CSV_PATH, used when a request names none
+DEFAULT_PALETTE = 'default'
+
+PALETTE_NAME_PATTERN = re.compile(r'^[a-z0-9_-]+$')
+
+# Include/exclude masks kept per palette snapshot
+MASK_CACHE_SIZE = 256
+
+def is_flag(emoji: str) -> bool:
+    """Country and subdivision flags (regional indicator pairs, tag sequences) and the other flag emoji."""
+    return emoji.startswith(('🏁', '🚩', '🎌', '🏴', '🏳')) or '\U0001F1E6' <= emoji[:1] <= '\U0001F1FF'
+
+# Categories usable in include/exclude besides the names of palettes
+BUILTIN_CATEGORIES: Dict[str, Callable[[str], bool]] = {
+    'flags': is_flag,
+}
+
+def _bare(emoji: str) -> str:
+    # Emoji are compared without variation selectors, so ❤ and ❤️ are the same emoji
+    return emoji.replace('\ufe0f', '')
+
+class EmojiPalette:
+    """
+    Immutable, versioned snapshot of the emoji palette.
+    Holds the validated CSV rows plus the color arrays used for matching.
+    A request that grabs a snapshot keeps using it even if a newer one is swapped in.
+    """
+
+    # Identifies the entries a palette may match, beyond digest and version (see MaskedPalette)
+    mask_key: Optional[bytes] = None
+
+    def __init__(self, entries: Sequence[Dict[str, str]], version: int = 0,
+                 source: Optional[str] = None, digest: Optional[str] = None):
+        self.entries = tuple(entries)
+        self.version = version
+        self.source = source
+        self.digest = digest
+
+        colors = [e['Hex Color'] for e in self.entries]
+        try:
+            rgb = hex_array_to_rgb(colors)
+        except ValueError:
+            # Entries that did not come through the CSV validation may use other spellings
+            rgb = np.array([hex_to_rgb(c) for c in colors], dtype=np.uint8).reshape(-1, 3)
+        lab = rgb_array_to_lab(rgb)
+        lab_sq = np.einsum('ij,ij->i', lab, lab)
+        # CIE94 weights depend only on the pixel (the reference color), so its squared
+        # distance expands into a dot product between per-pixel and per-entry terms
+        L, a, b = lab[:, 0], lab[:, 1], lab[:, 2]
+        chroma = np.hypot(a, b)
+        cie94_terms = np.stack([L ** 2, L, chroma ** 2, chroma, a ** 2 + b ** 2, a, b])
+        for array in (rgb, lab, lab_sq, cie94_terms):
+            array.flags.writeable = False
+        self.rgb = rgb
+        self.lab = lab
+        self._lab_sq = lab_sq
+        self._cie94_terms = cie94_terms
+        # Built on first use by engines other than CIE76
+        self._matcher: Optional[EmojiMatcher] = None
+        self._matcher_lock = threading.Lock()
+        self._masks: 'OrderedDict[Hashable, MaskedPalette]' = OrderedDict()
+        self._masks_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def matcher(self) -> EmojiMatcher:
+        """EmojiMatcher over this snapshot's entries for HSV matching, built on first use."""
+        if self._matcher is None:
+            with self._matcher_lock:
+                if self._matcher is None:
+                    self._matcher = EmojiMatcher.from_palette(self)
+        return self._matcher
+
+    def _cie94_scores(self, lab: np.ndarray) -> np.ndarray:
+        """
+        Squared CIE94 distance from each Lab pixel (as the reference) to every entry,
+        less a per-pixel constant, so it ranks entries exactly.
+        """
+        L, a, b = lab[:, 0], lab[:, 1], lab[:, 2]
+        chroma = np.hypot(a, b)
+        sc = 1 + 0.045 * chroma
+        sh = 1 + 0.015 * chroma
+        # dL^2 + dC^2 / SC^2 + (da^2 + db^2 - dC^2) / SH^2, with dC = C1 - C2
+        wc = 1 / sc ** 2 - 1 / sh ** 2
+        wh = 1 / sh ** 2
+        pixel_terms = np.stack([np.ones_like(L), -2 * L, wc, -2 * wc * chroma, wh, -2 * wh * a, -2 * wh * b], axis=1)
+        return pixel_terms @ self._cie94_terms
+
+    def nearest_indices(self, pixels: np.ndarray, engine: str = 'cie76',
+                        mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Return the index of the closest palette entry for each RGB pixel.
+        engine is one of 'cie76' (Lab distance), 'cie94', 'ciede2000' (which re-ranks the
+        CIEDE2000_CANDIDATES nearest CIE94 entries) or 'hsv' (EmojiMatcher's weighted HSV distance).
+        mask, a boolean array over the entries, restricts matching to the entries it allows
+        without touching the precomputed arrays.
+        Accepts any (..., 3) array and returns an array of the leading shape.
+        """
+        if engine not in ENGINES:
+            raise ValueError(f'Unknown matching engine: {engine}')
+        if not self.entries:
+            raise ValueError('Palette is empty')
+        if mask is not None and not mask.any():
+            raise ValueError('No palette entries left to match')
+        if engine == 'hsv':
+            return self.matcher().nearest_indices(pixels, mask)
+
+        pixels = np.asarray(pixels)
+        lab = rgb_array_to_lab(pixels.reshape(-1, 3))
+        result = np.empty(len(lab), dtype=np.intp)
+        allowed = len(self.entries) if mask is None else int(mask.sum())
+        k = min(CIEDE2000_CANDIDATES, allowed)
+        # Masked-out entries are pushed out of reach rather than removed
+        penalty = None if mask is None else np.where(mask, 0, np.inf)
+
+        chunk = max(1, NEAREST_CHUNK_PAIRS // len(self.entries))
+        for start in range(0, len(lab), chunk):
+            block = lab[start:start + chunk]
+            if engine == 'cie76':
+                # |p - q|^2 = |p|^2 - 2 p.q + |q|^2; |p|^2 is constant per pixel so it can be dropped
+                distances = self._lab_sq - 2 * (block @ self.lab.T)
+                if penalty is not None:
+                    distances += penalty
+                result[start:start + chunk] = distances.argmin(axis=1)
+                continue
+
+            scores = self._cie94_scores(block)
+            if penalty is not None:
+                scores += penalty
+            if engine == 'cie94':
+                result[start:start + chunk] = scores.argmin(axis=1)
+                continue
+
+            # CIEDE2000 is too expensive for every pair; CIE94 shortlists the candidates
+            if k < len(self.entries):
+                candidates = np.argpartition(scores, k - 1, axis=1)[:, :k]
+            else:
+                candidates = np.broadcast_to(np.arange(k), scores.shape)
+            distances = delta_e_ciede2000(block[:, None, :], self.lab[candidates])
+            result[start:start + chunk] = np.take_along_axis(candidates, distances.argmin(axis=1)[:, None], axis=1)[:, 0]
+
+        return result.reshape(pixels.shape[:-1])
+
+    def masked(self, key: Hashable, build: Callable[[], np.ndarray]) -> 'MaskedPalette':
+        """
+        The view of this palette restricted by the mask build() returns, cached under key,
+        so a selection that repeats costs a dictionary lookup.
+        """
+        with self._masks_lock:
+            view = self._masks.get(key)
+            if view is not None:
+                self._masks.move_to_end(key)
+                return view
+        view = MaskedPalette(self, build())
+        with self._masks_lock:
+            self._masks[key] = view
+            while len(self._masks) > MASK_CACHE_SIZE:
+                self._masks.popitem(last=False)
+        return view
+
+    @classmethod
+    def from_csv(cls, csv_path: str, version: int = 0,
+                 intern: Optional[Callable[[Dict[str, str]], Dict[str, str]]] = None) -> 'EmojiPalette':
+        """
+        Parse the CSV file at csv_path and build a snapshot from it.
+        intern, if given, maps each parsed entry to the instance to keep (see PaletteRegistry).
+        """
+        with REGISTRY.timer('palette_load'):
+            # Hashed while it is parsed, so the digest always matches the entries
+            digest = hashlib.sha256()
+            entries = parse_emoji_csv(csv_path, digest=digest)
+            if intern is not None:
+                entries = [intern(entry) for entry in entries]
+        with REGISTRY.timer('palette_index'):
+            return cls(entries, version=version, source=csv_path, digest=digest.hexdigest())
+
+class MaskedPalette:
+    """
+    An EmojiPalette restricted to the entries a boolean mask allows.
+    It shares the palette's entries, arrays and matcher. Matching never picks
+    a masked-out entry, and indices still refer to the full palette's entries.
+    """
+
+    def __init__(self, palette: EmojiPalette, mask: np.ndarray):
+        mask = np.asarray(mask, dtype=bool)
+        mask.flags.writeable = False
+        self.palette = palette
+        self.mask = mask
+        self.entries = palette.entries
+        self.version = palette.version
+        self.source = palette.source
+        self.digest = palette.digest
+        self.mask_key = np.packbits(mask).tobytes()
+        self.allowed = int(mask.sum())
+
+    def __len__(self) -> int:
+        return len(self.palette)
+
+    def nearest_indices(self, pixels: np.ndarray, engine: str = 'cie76') -> np.ndarray:
+        return self.palette.nearest_indices(pixels, engine, self.mask)
+
+class PaletteManager:
+    """
+    Owns the current EmojiPalette and replaces it when the CSV file changes.
+    Reloads are built on a background thread and swapped in with a single
+    reference assignment, so readers never see a half-built palette.
+    """
+
+    def __init__(self, csv_path: Optional[str] = None, poll_interval: Optional[float] = None,
+                 intern: Optional[Callable[[Dict[str, str]], Dict[str, str]]] = None):
+        self.csv_path = csv_path or Config.EMOJI_CSV_PATH
+        self.poll_interval = Config.EMOJI_PALETTE_POLL_INTERVAL if poll_interval is None else poll_interval
+        self.intern = intern
+        self._snapshot = EmojiPalette([])
+        self._fingerprint: Optional[Tuple[int, int]] = None
+        self._listeners: List[Callable[[EmojiPalette], None]] = []
+        self._reload_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._force = False
+        self._thread: Optional[threading.Thread] = None
+        self._thread_pid: Optional[int] = None
+
+    @property
+    def current(self) -> EmojiPalette:
+        """The palette snapshot new work should use."""
+        return self._snapshot
+
+    def add_listener(self, callback: Callable[[EmojiPalette], None]):
+        """Register a callback invoked with the new snapshot after every swap."""
+        self._listeners.append(callback)
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.csv_path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        Rebuild the palette if the CSV file changed (or unconditionally when force is set).
+        Returns True if a new snapshot was swapped in. On error the current snapshot is kept.
+        """
+        with self._reload_lock:
+            fingerprint = self._stat()
+            if not force and fingerprint == self._fingerprint:
+                return False
+
+            current = self._snapshot
+            try:
+                candidate = EmojiPalette.from_csv(self.csv_path, version=current.version + 1, intern=self.intern)
+            except (FileNotFoundError, CSVValidationError) as e:
+                logger.error('Failed to load emoji palette: %s', e)
+                self._fingerprint = fingerprint
+                return False
+            except Exception as e:
+                logger.error('Unexpected error loading emoji palette: %s', e)
+                self._fingerprint = fingerprint
+                return False
+
+            self._fingerprint = fingerprint
+            if not force and candidate.digest == current.digest:
+                # Touched but not modified
+                return False
+
+            self._snapshot = candidate
+
+        logger.info('Swapped in emoji palette', extra={'version': candidate.version, 'entries': len(candidate)})
+        for callback in list(self._listeners):
+            try:
+                callback(candidate)
+            except Exception as e:
+                logger.error('Palette listener failed: %s', e)
+        return True
+
+    def request_reload(self):
+        """Ask the background thread to rebuild the palette now, without blocking the caller."""
+        self._force = True
+        self.start()
+        self._wakeup.set()
+
+    def start(self):
+        """Start the watcher thread for this process (no-op if it is already running)."""
+        if self._thread is not None and self._thread.is_alive() and self._thread_pid == os.getpid():
+            return
+        self._thread = threading.Thread(target=self._run, name='palette-watcher', daemon=True)
+        self._thread_pid = os.getpid()
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            timeout = self.poll_interval if self.poll_interval > 0 else None
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+            force, self._force = self._force, False
+            self.reload(force=force)
+
+class PaletteUnavailableError(Exception):
+    """A configured palette could not be built from its file."""
+    pass
+
+def parse_palette_paths(spec: str) -> Dict[str, str]:
+    """Parse 'name=path,name=path' into a dict, as used by Config.EMOJI_PALETTES."""
+    paths = {}
+    for item in spec.split(','):
+        if not item.strip():
+            continue
+        name, sep, path = item.partition('=')
+        name = name.strip()
+        if not sep or not path.strip() or not PALETTE_NAME_PATTERN.match(name) or name == DEFAULT_PALETTE:
+            raise ValueError(f'Invalid palette definition: {item!r}')
+        paths[name] = path.strip()
+    return paths
+
+class PaletteRegistry:
+    """
+    Named palettes side by side, each with its own PaletteManager.
+    The default palette is the one loaded at startup; the others are built the first
+    time a request names them and then watched for changes like the default.
+    Entries are interned across palettes, so an emoji that appears in several
+    palettes is held once; the intern table is trimmed to the live snapshots after each swap.
+    """
+
+    def __init__(self, paths: Optional[Dict[str, str]] = None, default: Optional[PaletteManager] = None,
+                 poll_interval: Optional[float] = None):
+        self.paths = parse_palette_paths(Config.EMOJI_PALETTES) if paths is None else dict(paths)
+        self.poll_interval = Config.EMOJI_PALETTE_POLL_INTERVAL if poll_interval is None else poll_interval
+        self._interned: Dict[Tuple[str, str, str], Dict[str, str]] = {}
+        self._intern_lock = threading.Lock()
+        self.default = default or PaletteManager(poll_interval=self.poll_interval)
+        self.default.intern = self.intern
+        self.default.add_listener(self._prune_interned)
+        self._managers: Dict[str, PaletteManager] = {DEFAULT_PALETTE: self.default}
+        # Guards _managers and _building only; palettes are built under their own lock
+        self._lock = threading.Lock()
+        self._building: Dict[str, threading.Lock] = {}
+
+    def intern(self, entry: Dict[str, str]) -> Dict[str, str]:
+        """Return the shared instance of an entry equal to this one."""
+        key = (entry['Emoji'], entry['ASCII Code'], entry['Hex Color'])
+        with self._intern_lock:
+            return self._interned.setdefault(key, entry)
+
+    def _prune_interned(self, _palette: Optional[EmojiPalette] = None):
+        # Entries only held by replaced snapshots are dropped; requests still using those keep their own references
+        live = {}
+        for manager in self.loaded():
+            for entry in manager.current.entries:
+                live[(entry['Emoji'], entry['ASCII Code'], entry['Hex Color'])] = entry
+        with self._intern_lock:
+            self._interned = {key: entry for key, entry in self._interned.items() if key in live}
+
+    def names(self) -> List[str]:
+        return [DEFAULT_PALETTE] + sorted(self.paths)
+
+    def manager(self, name: Optional[str] = None) -> PaletteManager:
+        """
+        The PaletteManager of a named palette, building the palette on first use.
+        Raises ValueError for an unknown name and PaletteUnavailableError if the
+        palette's file can't be loaded; the build is retried on the next request.
+        """
+        name = name or DEFAULT_PALETTE
+        manager = self._managers.get(name)
+        if manager is not None:
+            return manager
+        if name not in self.paths:
+            raise ValueError(f'Unknown palette: {name}')
+
+        with self._lock:
+            building = self._building.setdefault(name, threading.Lock())
+        # Concurrent first requests for one palette wait for a single build; other palettes are unaffected
+        with building:
+            manager = self._managers.get(name)
+            if manager is None:
+                candidate = PaletteManager(self.paths[name], poll_interval=self.poll_interval, intern=self.intern)
+                if not candidate.reload(force=True):
+                    raise PaletteUnavailableError(f'Palette {name} could not be loaded')
+                candidate.add_listener(self._prune_interned)
+                with self._lock:
+                    manager = self._managers[name] = candidate
+                self._prune_interned()
+        if manager.poll_interval > 0:
+            manager.start()
+        return manager
+
+    def get(self, name: Optional[str] = None) -> EmojiPalette:
+        """The current snapshot of a named palette (the default one if name is empty)."""
+        return self.manager(name).current
+
+    def select(self, palette: EmojiPalette, include: Iterable[str] = (), exclude: Iterable[str] = ()):
+        """
+        Restrict palette to the entries matched by include (all of them if it is empty)
+        and not by exclude. Items are emoji or category names: 'flags' or the name of a palette.
+        Returns palette itself when nothing is filtered, else a cached MaskedPalette.
+        """
+        include, exclude = frozenset(include), frozenset(exclude)
+        if not include and not exclude:
+            return palette
+        # Valid emoji are never pure ASCII, so ASCII items are category names
+        categories = sorted(item for item in include | exclude if item.isascii())
+        for category in categories:
+            if category not in BUILTIN_CATEGORIES and category != DEFAULT_PALETTE and category not in self.paths:
+                raise ValueError(f'Unknown emoji category: {category}')
+        # A category palette that reloads gives a new key
+        versions = tuple((c, self.get(c).version) for c in categories if c not in BUILTIN_CATEGORIES)
+        key = (include, exclude, versions)
+        view = palette.masked(key, lambda: self._compile(palette, include, exclude))
+        if len(palette) and not view.allowed:
+            raise ValueError('No emoji left after include/exclude')
+        return view
+
+    def _compile(self, palette: EmojiPalette, include: FrozenSet[str], exclude: FrozenSet[str]) -> np.ndarray:
+        emojis = [_bare(e['Emoji']) for e in palette.entries]
+
+        def matches(items: FrozenSet[str]) -> np.ndarray:
+            wanted = {_bare(item) for item in items if not item.isascii()}
+            tests = []
+            for item in items:
+                if item in BUILTIN_CATEGORIES:
+                    tests.append(BUILTIN_CATEGORIES[item])
+                elif item.isascii():
+                    wanted.update(_bare(e['Emoji']) for e in self.get(item).entries)
+            return np.fromiter((e in wanted or any(test(e) for test in tests) for e in emojis),
+                               dtype=bool, count=len(emojis))
+
+        mask = matches(include) if include else np.ones(len(emojis), dtype=bool)
+        if exclude:
+            mask &= ~matches(exclude)
+        return mask
+
+    def loaded(self) -> List[PaletteManager]:
+        with self._lock:
+            return list(self._managers.values())
+
+    def start(self):
+        """Start the watcher threads of every palette built so far in this process."""
+        for manager in self.loaded():
+            if manager.poll_interval > 0:
+                manager.start()
+
+    def request_reload(self):
+        """Ask every built palette to rebuild in the background."""
+        for manager in self.loaded():
+            manager.request_reload()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            managers = dict(self._managers)
+        return {
+            name: ({'loaded': True, 'version': managers[name].current.version, 'entries': len(managers[name].current)}
+                   if name in managers else {'loaded': False})
+            for name in self.names()
+        }
@@ -0,0 +1,117 @@
+import cProfile
+import io
+import itertools
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+from config.config import Config
+
+logger = logging.getLogger(__name__)
+
+PROFILE_NAME_PATTERN = re.compile(r'^[\w.-]+\.prof$')
+
+# Suffix for profile names, so requests to one endpoint within the same second don't collide
+_sequence = itertools.count(1)
+
+class RequestProfiler:
+    """
+    Runs selected requests under cProfile and keeps the most recent profiles on disk.
+    Each profile is written as <name>.prof (loadable with pstats or snakeviz)
+    next to a <name>.json file describing the request.
+    """
+
+    def __init__(self, directory: Optional[str] = None, sample_rate: Optional[float] = None,
+                 keep: Optional[int] = None):
+        self.directory = directory or Config.PROFILE_DIR
+        self.sample_rate = Config.PROFILING_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.keep = keep or Config.PROFILE_KEEP
+        # Only one profile at a time, so concurrent requests don't distort each other
+        self._active = threading.Lock()
+
+    def should_sample(self) -> bool:
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def begin(self) -> Optional[cProfile.Profile]:
+        """Start profiling the current thread, or return None if another profile is running."""
+        if not self._active.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another tool already owns the profiling hook
+            self._active.release()
+            return None
+        return profile
+
+    def end(self, profile: cProfile.Profile, info: Dict) -> Optional[str]:
+        """Stop profiling, save the profile with its request info and return its name."""
+        profile.disable()
+        self._active.release()
+
+        os.makedirs(self.directory, exist_ok=True)
+        name = '{}-{}-{}-{}'.format(time.strftime('%Y%m%dT%H%M%S'), re.sub(r'[^\w.-]', '_', info.get('endpoint') or 'unknown'),
+                                    os.getpid(), next(_sequence))
+        try:
+            profile.dump_stats(os.path.join(self.directory, f'{name}.prof'))
+            with open(os.path.join(self.directory, f'{name}.json'), 'w') as f:
+                json.dump(info, f)
+        except OSError as e:
+            logger.error('Could not save profile: %s', e)
+            return None
+        self._prune()
+        return f'{name}.prof'
+
+    def _profiles(self) -> List[os.DirEntry]:
+        try:
+            entries = [e for e in os.scandir(self.directory) if PROFILE_NAME_PATTERN.match(e.name)]
+        except FileNotFoundError:
+            return []
+        return sorted(entries, key=lambda e: e.stat().st_mtime, reverse=True)
+
+    def _prune(self):
+        for entry in self._profiles()[self.keep:]:
+            for path in (entry.path, entry.path[:-len('.prof')] + '.json'):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+
+    def path_for(self, name: str) -> Optional[str]:
+        if not PROFILE_NAME_PATTERN.match(name):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.exists(path) else None
+
+    def recent(self, limit: int = 20, top: int = 10) -> List[Dict]:
+        """Describe the most recent profiles with their top functions by own time."""
+        summaries = []
+        for entry in self._profiles()[:limit]:
+            try:
+                with open(entry.path[:-len('.prof')] + '.json') as f:
+                    info = json.load(f)
+            except (OSError, ValueError):
+                info = {}
+            summaries.append({'name': entry.name, **info, 'top_functions': top_functions(entry.path, top)})
+        return summaries
+
+def top_functions(path: str, limit: int = 10) -> List[Dict]:
+    """Return the functions with the most own time in a saved profile."""
+    stats = pstats.Stats(path, stream=io.StringIO())
+    rows = []
+    for (filename, line, function), (_, calls, own, cumulative, _) in stats.stats.items():
+        rows.append({
+            'function': f'{os.path.basename(filename)}:{line}({function})',
+            'calls': calls,
+            'own_seconds': round(own, 6),
+            'cumulative_seconds': round(cumulative, 6),
+        })
+    rows.sort(key=lambda r: r['own_seconds'], reverse=True)
+    return rows[:limit]
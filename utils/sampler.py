@@ -0,0 +1,72 @@
+from typing import TYPE_CHECKING, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# sRGB byte value -> linear light, for averaging in linear space
+_SRGB_TO_LINEAR = np.where(np.arange(256) / 255 > 0.04045,
+                           ((np.arange(256) / 255 + 0.055) / 1.055) ** 2.4,
+                           np.arange(256) / 255 / 12.92).astype(np.float32)
+
+def crop_box(width: int, height: int, aspect_ratio: float) -> Tuple[int, int, int, int]:
+    """Largest centered (left, upper, right, lower) box of the given width/height ratio."""
+    if width / height > aspect_ratio:
+        new_width = max(1, int(height * aspect_ratio))
+        new_height = height
+    else:
+        new_width = width
+        new_height = max(1, int(width / aspect_ratio))
+    left = (width - new_width) // 2
+    upper = (height - new_height) // 2
+    return (left, upper, left + new_width, upper + new_height)
+
+def request_draft(image: 'Image.Image', cols: int, rows: int, aspect_ratio: float):
+    """
+    Let formats that support it (JPEG) decode at a reduced scale, as long as the
+    cropped area keeps at least two source pixels per cell. Must run before image.load().
+    """
+    left, upper, right, lower = crop_box(image.width, image.height, aspect_ratio)
+    scale_x = image.width / (right - left)
+    scale_y = image.height / (lower - upper)
+    image.draft('RGB', (int(cols * 2 * scale_x) + 1, int(rows * 2 * scale_y) + 1))
+
+def _area_resize(image: 'Image.Image', cols: int, rows: int, box: Tuple[int, int, int, int]) -> 'Image.Image':
+    from PIL import Image
+
+    width = box[2] - box[0]
+    height = box[3] - box[1]
+    if width % cols == 0 and height % rows == 0:
+        # Integer block averaging, cheaper than the general filter
+        return image.reduce((width // cols, height // rows), box=box)
+    return image.resize((cols, rows), Image.Resampling.BOX, box=box)
+
+def sample_cells(image: 'Image.Image', cols: int, rows: int, aspect_ratio: float,
+                 linear: bool = False) -> np.ndarray:
+    """
+    Crop the image to the aspect ratio around its center and return a (rows, cols, 3)
+    uint8 array with the average color of each cell's source pixels.
+    With linear set, the average is taken in linear light rather than on sRGB values,
+    which keeps fine light/dark detail from averaging too dark.
+    """
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    box = crop_box(image.width, image.height, aspect_ratio)
+
+    if not linear:
+        return np.asarray(_area_resize(image, cols, rows, box))
+
+    from PIL import Image
+
+    # Only the cropped pixels are converted, one channel at a time to bound the float copies.
+    # Reducing before converting would average sRGB values, which is what linear avoids.
+    cropped = image.crop(box)
+    full = (0, 0, cropped.width, cropped.height)
+    channels = [np.asarray(_area_resize(Image.fromarray(_SRGB_TO_LINEAR[np.asarray(cropped.getchannel(c))], 'F'),
+                                        cols, rows, full))
+                for c in range(3)]
+    averaged = np.stack(channels, axis=-1)
+    srgb = np.where(averaged > 0.0031308, 1.055 * np.power(np.maximum(averaged, 0), 1 / 2.4) - 0.055,
+                    averaged * 12.92)
+    return np.clip(np.rint(srgb * 255), 0, 255).astype(np.uint8)
@@ -0,0 +1,51 @@
+import os
+import resource
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+def memory_usage() -> Dict[str, int]:
+    """
+    Return the memory footprint of the current process in bytes.
+    On Linux this includes PSS and private bytes, which show how much of the
+    RSS is actually shared copy-on-write with the gunicorn master.
+    """
+    usage = {}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            fields = {}
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == 'kB':
+                    fields[parts[0].rstrip(':')] = int(parts[1]) * 1024
+        usage['rss'] = fields['Rss']
+        usage['pss'] = fields['Pss']
+        usage['private'] = fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)
+    except (OSError, KeyError, ValueError):
+        # ru_maxrss is kilobytes on Linux, bytes on macOS
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        usage['rss'] = maxrss if os.uname().sysname == 'Darwin' else maxrss * 1024
+    return usage
+
+class StartupTimer:
+    """Records how long each startup phase takes."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - start
+
+    def summary(self) -> Dict:
+        return {
+            'pid': os.getpid(),
+            'total_seconds': time.perf_counter() - self.started,
+            'phases': dict(self.phases),
+            'memory': memory_usage(),
+        }
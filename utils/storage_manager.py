@@ -0,0 +1,153 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from config.config import Config
+from utils.upload_store import UploadStore
+from utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Interrupted writes leave temporary files behind; anything this old is abandoned
+STALE_TEMP_SECONDS = 3600
+
+class StorageManager:
+    """
+    Keeps the upload store within a byte quota and a time-to-live.
+    Sweeps run on a background thread: expired uploads are removed first,
+    then the least recently accessed ones until the store fits the quota.
+    Last access is the mtime of the normalized copy, which UploadStore
+    refreshes on every read, so it is shared between workers.
+    """
+
+    def __init__(self, store: UploadStore, quota_bytes: Optional[int] = None,
+                 ttl_seconds: Optional[float] = None, sweep_interval: Optional[float] = None):
+        self.store = store
+        self.quota_bytes = Config.UPLOAD_QUOTA_BYTES if quota_bytes is None else quota_bytes
+        self.ttl_seconds = Config.UPLOAD_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.sweep_interval = Config.UPLOAD_SWEEP_INTERVAL if sweep_interval is None else sweep_interval
+        self._stats = {
+            'bytes': 0,
+            'files': 0,
+            'uploads': 0,
+            'evictions': 0,
+            'evicted_bytes': 0,
+            'sweeps': 0,
+            'last_sweep_seconds': 0.0,
+        }
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_pid: Optional[int] = None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats)
+
+    def _scan(self) -> Tuple[Dict[str, List[os.DirEntry]], List[os.DirEntry]]:
+        """Group stored files by upload id; also return stale temporary files."""
+        groups: Dict[str, List[os.DirEntry]] = {}
+        stale = []
+        now = time.time()
+        try:
+            buckets = [e for e in os.scandir(self.store.root) if e.is_dir()]
+        except FileNotFoundError:
+            return groups, stale
+
+        for bucket in buckets:
+            for entry in os.scandir(bucket.path):
+                if entry.name.startswith('.upload-'):
+                    try:
+                        if now - entry.stat().st_mtime > STALE_TEMP_SECONDS:
+                            stale.append(entry)
+                    except FileNotFoundError:
+                        pass
+                    continue
+                upload_id = entry.name.split('.', 1)[0]
+                groups.setdefault(upload_id, []).append(entry)
+        return groups, stale
+
+    @staticmethod
+    def _remove(entries: List[os.DirEntry]) -> int:
+        removed = 0
+        for entry in entries:
+            try:
+                size = entry.stat().st_size
+                os.unlink(entry.path)
+                removed += size
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def sweep(self) -> int:
+        """Evict expired and least recently used uploads. Returns the number evicted."""
+        started = time.perf_counter()
+        groups, stale = self._scan()
+        self._remove(stale)
+
+        uploads = []
+        total = 0
+        for upload_id, entries in groups.items():
+            try:
+                stats = [e.stat() for e in entries]
+            except FileNotFoundError:
+                continue
+            size = sum(s.st_size for s in stats)
+            last_access = max(s.st_mtime for s in stats)
+            uploads.append((last_access, upload_id, size, entries))
+            total += size
+
+        uploads.sort()
+        cutoff = time.time() - self.ttl_seconds if self.ttl_seconds > 0 else None
+        evictions = 0
+        evicted_bytes = 0
+        kept_uploads = 0
+        kept_files = 0
+        for last_access, upload_id, size, entries in uploads:
+            expired = cutoff is not None and last_access < cutoff
+            over_quota = self.quota_bytes > 0 and total > self.quota_bytes
+            if not (expired or over_quota):
+                kept_uploads += 1
+                kept_files += len(entries)
+                continue
+            evicted_bytes += self._remove(entries)
+            total -= size
+            evictions += 1
+
+        with self._lock:
+            self._stats['bytes'] = total
+            self._stats['files'] = kept_files
+            self._stats['uploads'] = kept_uploads
+            self._stats['evictions'] += evictions
+            self._stats['evicted_bytes'] += evicted_bytes
+            self._stats['sweeps'] += 1
+            self._stats['last_sweep_seconds'] = time.perf_counter() - started
+
+        REGISTRY.set_gauge('emojiart_upload_bytes', total)
+        REGISTRY.set_gauge('emojiart_upload_files', kept_files)
+        REGISTRY.inc('emojiart_upload_evictions_total', evictions)
+
+        if evictions:
+            logger.info('Evicted uploads', extra={
+                'evictions': evictions, 'evicted_bytes': evicted_bytes, 'remaining_bytes': total
+            })
+        return evictions
+
+    def start(self):
+        """Start the sweeper thread for this process (no-op if it is already running)."""
+        if self.sweep_interval <= 0:
+            return
+        if self._thread is not None and self._thread.is_alive() and self._thread_pid == os.getpid():
+            return
+        self._thread = threading.Thread(target=self._run, name='upload-sweeper', daemon=True)
+        self._thread_pid = os.getpid()
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error('Upload sweep failed: %s', e)
+            time.sleep(self.sweep_interval)
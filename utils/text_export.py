@@ -0,0 +1,24 @@
+from typing import Iterable, Iterator, Sequence
+
+import numpy as np
+
+# Shortest run of one emoji written as a run-length token
+RLE_MIN_RUN = 3
+
+def encode_rows(indices: Iterable[np.ndarray], emojis: Sequence[str], rle: bool = False) -> Iterator[str]:
+    """
+    Yield a grid of palette indices as plain text, one line per row.
+    With rle set, runs of RLE_MIN_RUN or more of the same emoji are written as the emoji
+    and the run length inside braces, e.g. {🟦|12}. The braces delimit the whole emoji,
+    so runs of multi-codepoint emoji ({❤️|5}, {👍🏽|3}) decode without grapheme
+    segmentation; no emoji contains a brace or a bar.
+    """
+    for row in indices:
+        row = np.asarray(row)
+        if not rle:
+            yield ''.join([emojis[i] for i in row.tolist()]) + '\n'
+            continue
+        starts = np.flatnonzero(np.r_[True, row[1:] != row[:-1]])
+        lengths = np.diff(np.r_[starts, len(row)])
+        yield ''.join([emojis[i] * n if n < RLE_MIN_RUN else f'{{{emojis[i]}|{n}}}'
+                       for i, n in zip(row[starts].tolist(), lengths.tolist())]) + '\n'
@@ -0,0 +1,122 @@
+import os
+import re
+import tempfile
+from typing import Optional, Tuple
+
+import numpy as np
+
+from config.config import Config
+from utils.upload_stream import save_stream
+
+UPLOAD_ID_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+# File extension used for each sniffed image type
+EXTENSIONS = {
+    'png': 'png',
+    'jpeg': 'jpg',
+}
+
+class InvalidUploadError(Exception):
+    """Raised when uploaded bytes cannot be decoded as an image."""
+    pass
+
+def image_size(stream) -> Tuple[int, int]:
+    """(width, height) of an uploaded image, read from its header only; the stream is rewound."""
+    from PIL import Image
+
+    try:
+        with Image.open(stream) as image:
+            return image.size
+    except Exception as e:
+        raise InvalidUploadError(f"Could not decode image: {str(e)}")
+    finally:
+        stream.seek(0)
+
+class UploadStore:
+    """
+    Content-addressed storage for uploaded images.
+    Each upload is stored once under its SHA-256, next to a normalized,
+    downscaled RGB copy saved as a raw array so it can be re-matched
+    without decoding the original again.
+    """
+
+    def __init__(self, root: str, normalized_max_side: Optional[int] = None,
+                 chunk_size: Optional[int] = None):
+        self.root = root
+        self.normalized_max_side = normalized_max_side or Config.UPLOAD_NORMALIZED_MAX_SIDE
+        self.chunk_size = chunk_size or Config.UPLOAD_CHUNK_SIZE
+
+    @staticmethod
+    def is_valid_id(upload_id: str) -> bool:
+        return bool(upload_id) and bool(UPLOAD_ID_PATTERN.match(upload_id))
+
+    def _directory(self, upload_id: str) -> str:
+        # Fan out by hash prefix so no single directory grows too large
+        return os.path.join(self.root, upload_id[:2])
+
+    def original_path(self, upload_id: str, kind: str) -> str:
+        return os.path.join(self._directory(upload_id), f"{upload_id}.{EXTENSIONS[kind]}")
+
+    def normalized_path(self, upload_id: str) -> str:
+        return os.path.join(self._directory(upload_id), f"{upload_id}.npy")
+
+    def exists(self, upload_id: str) -> bool:
+        return self.is_valid_id(upload_id) and os.path.exists(self.normalized_path(upload_id))
+
+    def put(self, stream, digest: str, kind: str) -> Tuple[str, bool]:
+        """
+        Store an upload whose digest and type were computed while it was received.
+        Returns (upload_id, duplicate); duplicates are not written again.
+        """
+        upload_id = digest
+        if self.exists(upload_id):
+            self.touch(upload_id)
+            return upload_id, True
+
+        os.makedirs(self._directory(upload_id), exist_ok=True)
+        original = self.original_path(upload_id, kind)
+        save_stream(stream, original, self.chunk_size)
+        try:
+            self._normalize(original, self.normalized_path(upload_id))
+        except Exception as e:
+            os.unlink(original)
+            raise InvalidUploadError(f"Could not decode image: {str(e)}")
+        return upload_id, False
+
+    def _normalize(self, source: str, target: str):
+        from PIL import Image
+
+        with Image.open(source) as image:
+            # JPEGs decode straight to a scale near the target instead of at full size
+            image.draft('RGB', (self.normalized_max_side, self.normalized_max_side))
+            image = image.convert('RGB')
+            image.thumbnail((self.normalized_max_side, self.normalized_max_side))
+            pixels = np.asarray(image)
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), prefix='.upload-', suffix='.npy')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                np.save(out, pixels)
+            os.replace(tmp_path, target)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def touch(self, upload_id: str):
+        """Record an access; the storage sweeper evicts the least recently touched uploads first."""
+        try:
+            os.utime(self.normalized_path(upload_id))
+        except OSError:
+            pass
+
+    def load_normalized(self, upload_id: str) -> Optional[np.ndarray]:
+        """Return the normalized RGB pixels of an upload, or None if it is not stored."""
+        if not self.is_valid_id(upload_id):
+            return None
+        try:
+            pixels = np.load(self.normalized_path(upload_id), mmap_mode='r')
+        except FileNotFoundError:
+            return None
+        self.touch(upload_id)
+        return pixels
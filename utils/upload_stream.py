@@ -0,0 +1,97 @@
+import hashlib
+import os
+import tempfile
+from typing import Collection, Optional
+
+from flask import Request, current_app
+
+# Leading bytes that identify the image formats we accept
+IMAGE_SIGNATURES = {
+    'png': (b'\x89PNG\r\n\x1a\n',),
+    'jpeg': (b'\xff\xd8\xff',),
+}
+SNIFF_BYTES = 16
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """Return the image type identified by the magic bytes, or None if unrecognised."""
+    for kind, signatures in IMAGE_SIGNATURES.items():
+        if any(head.startswith(signature) for signature in signatures):
+            return kind
+    return None
+
+class UnsupportedImageError(Exception):
+    """Raised while an upload is received, once its first bytes rule out every accepted image type."""
+    # Not a ValueError: werkzeug's form parser silently swallows those and reports no files
+    pass
+
+class HashingSpool:
+    """
+    File container for multipart uploads that hashes bytes as they are written.
+    Data is kept in memory up to `threshold` bytes and spooled to a temporary
+    file beyond that, so a large upload never sits in worker memory. The first
+    bytes are kept so the type can be checked without reading the file again.
+    With allowed_kinds set, receiving stops with UnsupportedImageError as soon as
+    the first SNIFF_BYTES show another type, before the rest is spooled.
+    """
+
+    def __init__(self, threshold: int, directory: Optional[str] = None,
+                 allowed_kinds: Optional[Collection[str]] = None):
+        self._file = tempfile.SpooledTemporaryFile(max_size=threshold, dir=directory)
+        self._hash = hashlib.sha256()
+        self.allowed_kinds = allowed_kinds
+        self.size = 0
+        self.head = b''
+
+    def write(self, data) -> int:
+        if len(self.head) < SNIFF_BYTES:
+            self.head += bytes(data[:SNIFF_BYTES - len(self.head)])
+            if (self.allowed_kinds is not None and len(self.head) == SNIFF_BYTES
+                    and self.kind not in self.allowed_kinds):
+                self._file.close()
+                raise UnsupportedImageError('Upload is not a supported image type')
+        self._hash.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+    @property
+    def kind(self) -> Optional[str]:
+        return sniff_image_type(self.head)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def __iter__(self):
+        return iter(self._file)
+
+class StreamingUploadRequest(Request):
+    """
+    Request class that receives uploaded files into HashingSpool containers.
+    Endpoints listed in the UPLOAD_SNIFFED_ENDPOINTS config (endpoint -> accepted types)
+    refuse other content while the body is still being received.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        allowed_kinds = current_app.config.get('UPLOAD_SNIFFED_ENDPOINTS', {}).get(self.endpoint)
+        return HashingSpool(current_app.config['UPLOAD_SPOOL_THRESHOLD'], allowed_kinds=allowed_kinds)
+
+def save_stream(stream, file_path: str, chunk_size: int):
+    """
+    Copy a stream to file_path in fixed-size chunks.
+    The data is written to a temporary file in the same directory and renamed
+    into place, so readers never see a partially written upload.
+    """
+    directory = os.path.dirname(file_path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+    try:
+        stream.seek(0)
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in iter(lambda: stream.read(chunk_size), b''):
+                out.write(chunk)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise